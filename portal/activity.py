@@ -0,0 +1,218 @@
+"""
+Live-updates feed.
+
+Attendance, submission, assignment and material writes append
+``ActivityEvent`` rows (via signals in ``portal.models``), one per profile
+that should see the event. The student dashboard, ``/api/live-updates/``
+and the teacher dashboard poll then read a feed with ``feed``, a single
+keyset range read on (recipient, created_at, id).
+
+Events that only exist in the past - e.g. rows written by ``bulk_create``
+or before this table existed - can be replayed with
+``manage.py backfill_activity``.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .models import ActivityEvent, Assignment, Course, Enrollment, Profile
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+DEFAULT_FEED_SIZE = 10
+MAX_FEED_SIZE = 50
+BATCH_SIZE = 1000
+
+# Fields whose change on an existing row is an event of its own.
+TRACKED_FIELDS = {
+    'Attendance': ('status',),
+    'Submission': ('marks_obtained',),
+    'Assignment': ('is_draft',),
+}
+
+
+def record(recipient_ids, kind, title, detail='', course_id=None, score=None, status=None, at=None):
+    """Append one event to the feed of every profile in ``recipient_ids``."""
+    ids = list(dict.fromkeys(pid for pid in recipient_ids if pid is not None))
+    if not ids:
+        return 0
+    fields = dict(kind=kind, title=title[:255], detail=detail[:255], course_id=course_id, score=score, status=status)
+    if at is not None:
+        fields['created_at'] = at
+    ActivityEvent.objects.bulk_create(
+        [ActivityEvent(recipient_id=pid, **fields) for pid in ids],
+        batch_size=BATCH_SIZE,
+    )
+    return len(ids)
+
+
+def course_student_ids(course_id):
+    return list(Enrollment.objects.filter(course_id=course_id).values_list('student_id', flat=True))
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def encode_cursor(event):
+    micros = (event.created_at - EPOCH) // timedelta(microseconds=1)
+    return f"{micros}_{event.pk}"
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)`` for a cursor string, or None if malformed."""
+    try:
+        micros, pk = str(cursor).split('_', 1)
+        created_at = EPOCH + timedelta(microseconds=int(micros))
+        return created_at, int(pk)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def feed(profile, before=None, limit=DEFAULT_FEED_SIZE):
+    """Newest events for ``profile``, strictly older than the ``before`` cursor.
+
+    Returns ``(events, next_before)``; ``next_before`` is None on the last page.
+    """
+    limit = max(1, min(int(limit or DEFAULT_FEED_SIZE), MAX_FEED_SIZE))
+    qs = ActivityEvent.objects.filter(recipient=profile)
+    position = decode_cursor(before) if before else None
+    if position:
+        created_at, pk = position
+        qs = qs.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+    page = list(qs.order_by('-created_at', '-id')[:limit + 1])
+    next_before = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_before
+
+
+# ---------------------------------------------------------------------------
+# Writing (called from the signal receivers in portal.models)
+# ---------------------------------------------------------------------------
+
+def remember_previous(instance):
+    """Stash the tracked field values an existing row had before this save."""
+    fields = TRACKED_FIELDS.get(type(instance).__name__)
+    if not fields or instance.pk is None:
+        instance._activity_previous = None
+        return
+    instance._activity_previous = type(instance).objects.filter(pk=instance.pk).values(*fields).first()
+
+
+def _changed(instance, field, created):
+    if created:
+        return True
+    previous = getattr(instance, '_activity_previous', None)
+    return previous is not None and previous.get(field) != getattr(instance, field)
+
+
+def _course_info(course_id):
+    return Course.objects.filter(pk=course_id).values('name', 'code', 'teacher_id').first()
+
+
+def _username(profile_id):
+    return Profile.objects.filter(pk=profile_id).values_list('user__username', flat=True).first() or ''
+
+
+def attendance_saved(att, created, at=None):
+    if not _changed(att, 'status', created):
+        return
+    course = _course_info(att.course_id)
+    if course is None:
+        return
+    label = 'Present' if att.status else 'Absent'
+    record([att.student_id], 'attendance', f"Attendance recorded for {course['name']}",
+           detail=f"Date: {att.date.strftime('%d %b %Y')}" if att.date else '',
+           course_id=att.course_id, status=att.status, at=at)
+    record([course['teacher_id']], 'attendance', f"Attendance recorded for {course['code']}",
+           detail=f"{_username(att.student_id)} - {label}", course_id=att.course_id, status=att.status, at=at)
+
+
+def attendance_marked(course_id, day, statuses, at=None):
+    """Feed events for a roster written in bulk: ``statuses`` maps student id to the new status.
+
+    Each student gets their own event; the teacher gets one summary event
+    instead of one per student.
+    """
+    course = _course_info(course_id)
+    if course is None or not statuses:
+        return 0
+    fields = dict(kind='attendance', course_id=course_id)
+    if at is not None:
+        fields['created_at'] = at
+    title = f"Attendance recorded for {course['name']}"[:255]
+    detail = f"Date: {day.strftime('%d %b %Y')}"
+    events = [ActivityEvent(recipient_id=sid, title=title, detail=detail, status=status, **fields)
+              for sid, status in statuses.items()]
+    present = sum(1 for status in statuses.values() if status)
+    if course['teacher_id'] is not None:
+        events.append(ActivityEvent(recipient_id=course['teacher_id'], title=f"Attendance recorded for {course['code']}",
+                                    detail=f"{present} present, {len(statuses) - present} absent", **fields))
+    ActivityEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+    return len(events)
+
+
+def submission_saved(sub, created, at=None):
+    assignment = (Assignment.objects.filter(pk=sub.assignment_id)
+                  .values('title', 'max_marks', 'course_id', 'course__name', 'course__teacher_id').first())
+    if assignment is None:
+        return
+    if created:
+        record([assignment['course__teacher_id']], 'submission',
+               f"{_username(sub.student_id)} submitted {assignment['title']}",
+               course_id=assignment['course_id'], at=at)
+    if sub.marks_obtained is not None and _changed(sub, 'marks_obtained', created):
+        score = round(sub.marks_obtained / assignment['max_marks'] * 100, 2) if assignment['max_marks'] else None
+        record([sub.student_id], 'performance', f"Marks received for {assignment['title']}",
+               detail=f"Course: {assignment['course__name']}", course_id=assignment['course_id'],
+               score=score, at=at)
+
+
+def submissions_graded(assignment, marks, at=None):
+    """Feed events for submissions graded in bulk: ``marks`` maps student id to the new marks.
+
+    Each student gets a performance event; the teacher gets one summary event.
+    """
+    course = _course_info(assignment.course_id)
+    if course is None or not marks:
+        return 0
+    fields = dict(course_id=assignment.course_id)
+    if at is not None:
+        fields['created_at'] = at
+    title = f"Marks received for {assignment.title}"[:255]
+    detail = f"Course: {course['name']}"[:255]
+    events = [
+        ActivityEvent(recipient_id=sid, kind='performance', title=title, detail=detail,
+                      score=round(m / assignment.max_marks * 100, 2) if assignment.max_marks else None, **fields)
+        for sid, m in marks.items()
+    ]
+    if course['teacher_id'] is not None:
+        average = sum(marks.values()) / len(marks)
+        events.append(ActivityEvent(recipient_id=course['teacher_id'], kind='submission',
+                                    title=f"{assignment.title} auto-graded"[:255],
+                                    detail=f"{len(marks)} submissions, average {average:.1f}/{assignment.max_marks}", **fields))
+    ActivityEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+    return len(events)
+
+
+def assignment_saved(asg, created, at=None):
+    # Drafts are announced when they are published, not when first saved.
+    if asg.is_draft or not _changed(asg, 'is_draft', created):
+        return
+    course = _course_info(asg.course_id)
+    if course is None:
+        return
+    due = f"Due date: {asg.due_date.strftime('%d %b %Y')} | " if asg.due_date else ''
+    record(course_student_ids(asg.course_id), 'assignment', f"New assignment: {asg.title}",
+           detail=f"{due}Course: {course['name']}", course_id=asg.course_id, at=at)
+    record([course['teacher_id']], 'assignment', f"Assignment created: {asg.title}",
+           detail=f"For {course['code']}", course_id=asg.course_id, at=at)
+
+
+def material_saved(material, created, at=None):
+    if not created:
+        return
+    course = _course_info(material.course_id)
+    if course is None:
+        return
+    record(course_student_ids(material.course_id), 'material', f"New study material: {material.title}",
+           detail=f"Course: {course['name']}", course_id=material.course_id, at=at)
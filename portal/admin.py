@@ -5,8 +5,10 @@ from django.utils import timezone
 
 from .models import (
     Profile, Course, Enrollment, Attendance, Assignment, Submission,
-    Notification, Schedule, Tag, StudyMaterial, Certificate
+    Notification, NotificationMessage, NotificationArchive, ChatThread, ChatMessage, ActivityEvent, StudentCourseSummary, StudyHour, Schedule, Tag, StudyMaterial, Certificate
 )
+from .notification_service import course_recipients, role_recipients, dispatch
+from .recurrence import regenerate_many
 
 
 # Admin site branding
@@ -61,7 +63,58 @@ class SubmissionAdmin(admin.ModelAdmin):
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ['user', 'title', 'created_at', 'is_read']
     list_filter = ['is_read', 'created_at']
-    search_fields = ['user__username', 'title']
+    search_fields = ['user__username', 'message__title']
+    list_select_related = ['user', 'message']
+    raw_id_fields = ['message']
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ['user', 'title', 'created_at']
+    search_fields = ['user__username', 'message__title']
+    list_select_related = ['user', 'message']
+    raw_id_fields = ['user', 'message']
+
+
+@admin.register(StudentCourseSummary)
+class StudentCourseSummaryAdmin(admin.ModelAdmin):
+    list_display = ['student', 'course', 'present', 'total', 'graded_count', 'marks_sum', 'last_activity']
+    list_select_related = ['student__user', 'course']
+    raw_id_fields = ['student', 'course']
+
+
+@admin.register(ChatThread)
+class ChatThreadAdmin(admin.ModelAdmin):
+    list_display = ['user_a', 'user_b', 'last_message_at']
+    raw_id_fields = ['user_a', 'user_b']
+
+
+@admin.register(ChatMessage)
+class ChatMessageAdmin(admin.ModelAdmin):
+    list_display = ['thread', 'sender', 'created_at']
+    search_fields = ['body']
+    raw_id_fields = ['thread', 'sender']
+
+
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'kind', 'title', 'created_at']
+    list_filter = ['kind']
+    raw_id_fields = ['recipient', 'course']
+
+
+@admin.register(StudyHour)
+class StudyHourAdmin(admin.ModelAdmin):
+    list_display = ['user', 'hour', 'events', 'active_seconds', 'sessions']
+    date_hierarchy = 'hour'
+    raw_id_fields = ['user']
+
+
+@admin.register(NotificationMessage)
+class NotificationMessageAdmin(admin.ModelAdmin):
+    list_display = ['title', 'sender', 'recipient_count', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['title', 'body']
 
 
 def export_schedules_csv(modeladmin, request, queryset):
@@ -91,42 +144,34 @@ def export_schedules_csv(modeladmin, request, queryset):
 def notify_selected_students(modeladmin, request, queryset):
     """Admin action: create Notification records for students affected by selected schedules."""
     created = 0
-    for sched in queryset:
-        targets = []
+    for sched in queryset.select_related('course'):
         if sched.course:
-            enrollments = Enrollment.objects.filter(course=sched.course).select_related('student__user')
-            for e in enrollments:
-                if getattr(e.student, 'user', None):
-                    targets.append(e.student.user)
-            # include the course teacher if available
-            teacher_profile = getattr(sched.course, 'teacher', None)
-            if teacher_profile and getattr(teacher_profile, 'user', None):
-                targets.append(teacher_profile.user)
+            # enrolled students plus the course teacher
+            targets = course_recipients(sched.course, include_teacher=True)
         elif sched.is_public:
             # Broadcast to all students and teachers
-            targets = [p.user for p in Profile.objects.filter(role__in=['student', 'teacher']) if getattr(p, 'user', None)]
+            targets = role_recipients(['student', 'teacher'])
+        else:
+            continue
 
         title = f"Schedule: {sched.title}"
         message = f"{sched.title} on {sched.date}"
         if sched.start_time:
             message += f" at {sched.start_time}"
 
-        for u in targets:
-            try:
-                Notification.objects.create(user=u, title=title, message=message)
-                created += 1
-            except Exception:
-                continue
+        created += dispatch(targets, title, message, sender=request.user)
     modeladmin.message_user(request, f"Notifications created for {created} recipients.")
 
 
 def mark_active(modeladmin, request, queryset):
     queryset.update(is_active=True)
+    regenerate_many(queryset)
     modeladmin.message_user(request, "Selected schedules marked active.")
 
 
 def mark_inactive(modeladmin, request, queryset):
     queryset.update(is_active=False)
+    regenerate_many(queryset)
     modeladmin.message_user(request, "Selected schedules marked inactive.")
 
 
@@ -1,110 +1,436 @@
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from .models import Profile, Attendance, Assignment, Notification, Course, Enrollment, StudyMaterial, Feedback
+from .models import Profile, Attendance, Assignment, Notification, Course, Enrollment, StudyMaterial, Feedback, Schedule, StudentCourseSummary
+from .models import ScheduleOccurrence
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.db.models import Q, Count, Avg
+from . import activity, cache_versions, notification_service, series, study_activity
+from .conditional import conditional_json, table_stamp, version_stamp
+from .student_stats import StudentStats
 import datetime
 import json
+import traceback
+
+
+def _is_student(user):
+    return hasattr(user, 'profile') and getattr(user.profile, 'role', None) == 'student'
+
+
+# ---------------------------------------------------------------------------
+# Student dashboard sections
+# ---------------------------------------------------------------------------
+#
+# Each ``_*_section(stats)`` builds the payload of one student endpoint from a
+# ``StudentStats``, which loads the student's enrollments (with course and
+# teacher) once for every section that needs them. The endpoints below and
+# ``get_student_bootstrap`` share these builders, so a section has the same
+# shape whichever way it is fetched.
+
+def _course_ids(stats):
+    return [e.course_id for e in stats.enrollments]
+
+
+def _tasks_section(stats):
+    now_date = timezone.now().date()
+    assignments = Assignment.objects.filter(
+        course_id__in=_course_ids(stats)
+    ).select_related('course').order_by('-due_date')[:10]
+
+    tasks = []
+    for assignment in assignments:
+        due_date = assignment.due_date
+        if isinstance(due_date, datetime.datetime):
+            due_date = due_date.date()
+
+        due_str = due_date.strftime('%Y-%m-%d') if due_date else 'N/A'
+        is_pending = due_date and due_date >= now_date if due_date else False
+        days_left = (due_date - now_date).days if due_date else None
+
+        tasks.append({
+            'id': assignment.id,
+            'title': assignment.title,
+            'due': due_str,
+            'status': 'pending' if is_pending else 'overdue',
+            'priority': 'high' if days_left is not None and days_left <= 3 else 'medium',
+            'course': assignment.course.name if assignment.course else 'Unknown'
+        })
+    return {'tasks': tasks, 'count': len(tasks)}
+
+
+def _materials_section(stats):
+    materials = StudyMaterial.objects.filter(
+        course_id__in=_course_ids(stats)
+    ).select_related('course').order_by('-uploaded_at')[:10]
+
+    materials_list = []
+    for material in materials:
+        materials_list.append({
+            'id': material.id,
+            'title': material.title,
+            'course': material.course.name if material.course else 'Unknown',
+            'uploaded_at': material.uploaded_at.strftime('%Y-%m-%d %H:%M') if material.uploaded_at else 'N/A',
+            'file_type': material.file.name.split('.')[-1].upper() if material.file else 'LINK',
+            'download_url': material.file.url if material.file else None
+        })
+    return {'materials': materials_list}
+
+
+def _notification_to_dict(notif):
+    return {
+        'id': notif.id,
+        'title': notif.title,
+        'message': notif.body,
+        'type': 'info',
+        'created_at': notif.created_at.strftime('%Y-%m-%d %H:%M') if notif.created_at else 'N/A',
+        'is_read': notif.is_read,
+    }
+
+
+def _notifications_section(stats):
+    """First-load payload of ``get_student_notifications``."""
+    user = stats.student.user
+    notif_list = [_notification_to_dict(n) for n in Notification.objects.filter(user=user).order_by('-created_at')[:10]]
+    return {
+        'notifications': notif_list,
+        'unread_count': notification_service.unread_count(user),
+        'total_count': len(notif_list),
+        'cursor': notification_service.latest_notification_id(user.pk),
+        'read_version': notification_service.read_version(user.pk),
+    }
+
+
+def _courses_section(stats):
+    courses_list = []
+    for enrollment in stats.enrollments:
+        course = enrollment.course
+        courses_list.append({
+            'id': course.id,
+            'name': course.name,
+            'code': course.code,
+            'credits': course.credits,
+            'semester': course.semester,
+            'teacher': course.teacher.user.get_full_name() or course.teacher.user.username,
+            'exam_date': 'TBD'  # Can be extended if Exam model exists
+        })
+    return {'courses': courses_list}
+
+
+def _attendance_section(stats, history_range=None, points=None):
+    # Overall totals
+    total = stats.attendance_total
+    present = stats.attendance_present
+    percent = round(stats.attendance_percentage, 1)
+
+    # Per-course breakdown (match frontend expectation)
+    attendance_data = [{
+        'course_id': c.course.id,
+        'course_name': c.course.name,
+        'course_code': c.course.code,
+        'present': c.present,
+        'total': c.total,
+        'percentage': round(c.percentage, 1)
+    } for c in stats.courses]
+
+    # Weekly breakdown, last 5 weeks by default (keeps compatibility); W1 is the current week
+    start, end = history_range or series.parse_range('5w')
+    weeks = series.series(Attendance.objects.filter(student=stats.student), 'date', start, end, 'week', points,
+                          total=Count('pk'), present=Count('pk', filter=Q(status=True)))
+    weekly_data = []
+    for i, week in enumerate(weeks):
+        week_pct = round((week['present'] / week['total']) * 100, 1) if week['total'] > 0 else 0
+        weekly_data.append({'week': f'W{len(weeks) - i}', 'start': week['start'].isoformat(),
+                            'present': week['present'], 'total': week['total'], 'percent': week_pct})
+
+    return {
+        'courses': attendance_data,
+        'overall': {'present': present, 'total': total, 'percentage': percent},
+        'weekly': weekly_data,
+        'historyPercents': [w['percent'] for w in weekly_data]
+    }
+
+
+UPCOMING_SCHEDULES_LIMIT = 50
+
+
+def _schedules_section(stats):
+    occurrences = (ScheduleOccurrence.objects.upcoming_for_student(stats.student, course_ids=_course_ids(stats))
+                   .select_related('schedule__course')[:UPCOMING_SCHEDULES_LIMIT])
+
+    schedules_list = []
+    for occurrence in occurrences:
+        sched = occurrence.schedule
+        schedules_list.append({
+            'id': sched.id,
+            'occurrence_id': occurrence.id,
+            'title': sched.title,
+            'description': sched.description,
+            'date': occurrence.date.isoformat(),
+            'start_time': occurrence.start_time.isoformat() if occurrence.start_time else None,
+            'end_time': occurrence.end_time.isoformat() if occurrence.end_time else None,
+            'location': sched.location,
+            'course': sched.course.code if sched.course else 'General',
+            'is_public': sched.is_public,
+            'color': sched.color,
+            'attachment_url': sched.attachment.url if sched.attachment else None,
+        })
+    return {'schedules': schedules_list, 'count': len(schedules_list)}
+
+
+def _latest_uploads_section(stats):
+    materials = StudyMaterial.objects.filter(
+        course_id__in=_course_ids(stats)
+    ).select_related('course').order_by('-uploaded_at')[:5]
+    return [{
+        'id': material.id,
+        'title': material.title,
+        'course': material.course.name if material.course else 'Unknown'
+    } for material in materials]
+
+
+def _live_updates_section(stats, before=None):
+    events, next_before = activity.feed(stats.student, before=before)
+    today = timezone.localdate()
+    updates = []
+    for event in events:
+        ts = timezone.localtime(event.created_at)
+        updates.append({
+            # The dashboard script styles materials as 'course' updates
+            'type': 'course' if event.kind == 'material' else event.kind,
+            'title': event.title,
+            'timestamp': ts.strftime('%I:%M %p'),
+            'is_new': ts.date() == today,
+        })
+    return {'updates': updates, 'next_before': next_before}
+
+
+# Version stamps (see portal.conditional): what each section reads besides
+# the student's enrollments, which ENROLLMENT_SECTIONS also depend on.
+
+# Assignment and StudyMaterial have no auto_now column, so in-place edits are
+# caught by the table version the save signals bump (see cache_versions).
+
+def _tasks_stamp(student):
+    return [table_stamp(Assignment.objects.filter(course__enrollment__student=student)),
+            *cache_versions.versions([cache_versions.table_scope(Assignment)])]
+
+
+def _materials_stamp(student):
+    return [table_stamp(StudyMaterial.objects.filter(course__enrollment__student=student)),
+            *cache_versions.versions([cache_versions.table_scope(StudyMaterial)])]
+
+
+def _attendance_stamp(student):
+    return [table_stamp(StudentCourseSummary.objects.filter(student=student), 'updated_at')]
+
+
+def _schedules_stamp(student):
+    # occurrences are only rewritten with their schedule, which bumps its table version
+    return version_stamp(Schedule)
+
+
+def _notifications_stamp(student):
+    uid = student.user_id
+    return [notification_service.latest_notification_id(uid), notification_service.read_version(uid)]
+
+
+def _live_updates_stamp(student):
+    return [table_stamp(student.activity_events.all())]
+
+
+SECTION_STAMPS = {
+    'tasks': _tasks_stamp,
+    'materials': _materials_stamp,
+    'courses': lambda student: [],
+    'attendance': _attendance_stamp,
+    'schedules': _schedules_stamp,
+    'notifications': _notifications_stamp,
+    'latest_uploads': _materials_stamp,
+    'live_updates': _live_updates_stamp,
+}
+ENROLLMENT_SECTIONS = {'tasks', 'materials', 'courses', 'schedules', 'latest_uploads'}
+
+
+def _sections_stamp(student, names):
+    parts = []
+    if ENROLLMENT_SECTIONS.intersection(names):
+        parts.append(table_stamp(Enrollment.objects.filter(student=student)))
+    for name in names:
+        parts.extend(SECTION_STAMPS[name](student))
+    return parts
+
+
+def _student_stamp(section):
+    """``conditional_json`` stamp for a single-section student endpoint."""
+    return lambda request: _sections_stamp(request.user.profile, [section])
+
+
+def _bootstrap_stamp(request):
+    requested = request.GET.get('sections')
+    names = [n.strip() for n in requested.split(',') if n.strip()] if requested else list(SECTION_STAMPS)
+    return _sections_stamp(request.user.profile, [n for n in dict.fromkeys(names) if n in SECTION_STAMPS])
+
+
+BOOTSTRAP_SECTIONS = {
+    'tasks': _tasks_section,
+    'materials': _materials_section,
+    'courses': _courses_section,
+    'attendance': _attendance_section,
+    'schedules': _schedules_section,
+    'notifications': _notifications_section,
+    'latest_uploads': _latest_uploads_section,
+    'live_updates': _live_updates_section,
+}
+
+
+def _enrolled_course_ids(stats):
+    return cache_versions.cached(
+        f'student:enrolled:{stats.student.pk}', [cache_versions.student_scope(stats.student.pk)],
+        lambda: _course_ids(stats),
+    )
+
+
+def _section_scopes(name, stats):
+    """Cache scopes of a section (see portal.cache_versions)."""
+    scopes = [cache_versions.student_scope(stats.student.pk)]
+    if name == 'attendance':
+        return scopes
+    scopes += [cache_versions.course_scope(cid) for cid in _enrolled_course_ids(stats)]
+    if name == 'schedules':
+        scopes.append(cache_versions.table_scope(Schedule))
+    return scopes
+
+
+def _cached_section(name, stats):
+    """A student section from the version-keyed cache, built on a miss.
+
+    Writes to the student's enrollments, attendance and submissions, and to
+    the courses they are enrolled in, make it stale immediately. The
+    notifications section is keyed on the newest notification id and the
+    read-state version instead.
+    """
+    student = stats.student
+    key = f'student:{name}:{student.pk}'
+    if name == 'notifications':
+        uid = student.user_id
+        key += f':{notification_service.latest_notification_id(uid)}-{notification_service.read_version(uid)}'
+        scopes = []
+    else:
+        scopes = _section_scopes(name, stats)
+    return cache_versions.cached(key, scopes, lambda: BOOTSTRAP_SECTIONS[name](stats), daily=True)
+
+
+@login_required
+@conditional_json(_bootstrap_stamp)
+def get_student_bootstrap(request):
+    """Student dashboard sections in one response.
+
+    ``sections`` (comma separated, default: all of ``BOOTSTRAP_SECTIONS``)
+    selects what to return; each section has the shape of its own endpoint
+    and comes from the same cache (see ``_cached_section``). A section that
+    fails is returned as ``{'error': ...}`` and does not fail the others.
+    Polls with an unchanged ETag (the stamps of the requested sections) get
+    a 304.
+    """
+    if not _is_student(request.user):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    requested = request.GET.get('sections')
+    names = [n.strip() for n in requested.split(',') if n.strip()] if requested else list(BOOTSTRAP_SECTIONS)
+    unknown = [n for n in names if n not in BOOTSTRAP_SECTIONS]
+    if unknown:
+        return JsonResponse({
+            'error': f"Unknown sections: {', '.join(unknown)}",
+            'available': list(BOOTSTRAP_SECTIONS),
+        }, status=400)
+
+    stats = StudentStats(request.user.profile)
+    payload = {}
+    for name in dict.fromkeys(names):
+        try:
+            payload[name] = _cached_section(name, stats)
+        except Exception as e:
+            traceback.print_exc()
+            payload[name] = {'error': str(e)}
+
+    response = JsonResponse(payload)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 
 @login_required
+@conditional_json(_student_stamp('tasks'))
 def get_student_tasks(request):
     """API endpoint to fetch student tasks/assignments."""
     try:
-        if not hasattr(request.user, 'profile') or getattr(request.user.profile, 'role', None) != 'student':
+        if not _is_student(request.user):
             return JsonResponse({'error': 'Access denied'}, status=403)
-        
-        student = request.user.profile
-        now = timezone.now()
-        now_date = now.date()
-        
-        # Get pending assignments
-        enrollments = Enrollment.objects.filter(student=student).values_list('course', flat=True)
-        assignments = Assignment.objects.filter(
-            course_id__in=enrollments
-        ).order_by('-due_date')[:10]
-        
-        tasks = []
-        for assignment in assignments:
-            due_date = assignment.due_date
-            if isinstance(due_date, datetime.datetime):
-                due_date = due_date.date()
-            
-            due_str = due_date.strftime('%Y-%m-%d') if due_date else 'N/A'
-            is_pending = due_date and due_date >= now_date if due_date else False
-            days_left = (due_date - now_date).days if due_date else None
-            
-            tasks.append({
-                'id': assignment.id,
-                'title': assignment.title,
-                'due': due_str,
-                'status': 'pending' if is_pending else 'overdue',
-                'priority': 'high' if days_left is not None and days_left <= 3 else 'medium',
-                'course': assignment.course.name if assignment.course else 'Unknown'
-            })
-        
-        return JsonResponse({'tasks': tasks, 'count': len(tasks)})
+        return JsonResponse(_cached_section('tasks', StudentStats(request.user.profile)))
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return JsonResponse({'error': str(e)}, status=500)
 
 
 @login_required
+@conditional_json(_student_stamp('materials'))
 def get_student_materials(request):
     """API endpoint to fetch latest study materials."""
     try:
-        if not hasattr(request.user, 'profile') or getattr(request.user.profile, 'role', None) != 'student':
+        if not _is_student(request.user):
             return JsonResponse({'error': 'Access denied'}, status=403)
-        
-        student = request.user.profile
-        enrollments = Enrollment.objects.filter(student=student).values_list('course', flat=True)
-        materials = StudyMaterial.objects.filter(
-            course_id__in=enrollments
-        ).order_by('-uploaded_at')[:10]
-        
-        materials_list = []
-        for material in materials:
-            materials_list.append({
-                'id': material.id,
-                'title': material.title,
-                'course': material.course.name if material.course else 'Unknown',
-                'uploaded_at': material.uploaded_at.strftime('%Y-%m-%d %H:%M') if material.uploaded_at else 'N/A',
-                'file_type': material.file.name.split('.')[-1].upper() if material.file else 'LINK',
-                'download_url': material.file.url if material.file else material.url
-            })
-        
-        return JsonResponse({'materials': materials_list})
+        return JsonResponse(_cached_section('materials', StudentStats(request.user.profile)))
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _time_range(start, end):
+    if not start:
+        return 'All day'
+    text = f'{start.hour}:{start.minute:02d}'
+    return f'{text}-{end.hour}:{end.minute:02d}' if end else text
+
+
 @login_required
 def get_student_timetable(request):
-    """API endpoint to fetch student timetable."""
+    """API endpoint to fetch student timetable.
+
+    The class occurrences of the student's courses in the week holding
+    ``date`` (YYYY-MM-DD, default today), read from ScheduleOccurrence.
+    """
     try:
         if not hasattr(request.user, 'profile') or getattr(request.user.profile, 'role', None) != 'student':
             return JsonResponse({'error': 'Access denied'}, status=403)
-        
+
+        try:
+            day = datetime.date.fromisoformat(request.GET['date']) if request.GET.get('date') else timezone.localdate()
+        except ValueError:
+            return JsonResponse({'error': 'date must be YYYY-MM-DD'}, status=400)
+        week_start = day - datetime.timedelta(days=day.weekday())
+
         student = request.user.profile
-        enrollments = Enrollment.objects.filter(student=student).select_related('course')
-        
-        # Generate a sample timetable (customize based on your schedule model)
+        course_ids = Enrollment.objects.filter(student=student).values_list('course_id', flat=True)
+        occurrences = (ScheduleOccurrence.objects
+                       .between(week_start, week_start + datetime.timedelta(days=6))
+                       .filter(course_id__in=list(course_ids))
+                       .select_related('schedule', 'course__teacher__user'))
+
         timetable = []
-        courses = [e.course for e in enrollments]
-        
-        # Example schedule
-        schedule_template = [
-            {'day': 'Mon', 'time': '9:00-10:30', 'subject': 'Data Structures', 'staff': 'Dr. Asha'},
-            {'day': 'Tue', 'time': '11:00-12:30', 'subject': 'Operating Systems', 'staff': 'Mr. Ravi'},
-            {'day': 'Wed', 'time': '2:00-3:30', 'subject': 'Database Systems', 'staff': 'Ms. Nisha'},
-        ]
-        
-        for schedule in schedule_template:
-            timetable.append(schedule)
-        
-        return JsonResponse({'timetable': timetable})
+        for occurrence in occurrences:
+            teacher = occurrence.course.teacher.user
+            instructor = teacher.get_full_name() or teacher.username
+            timetable.append({
+                'day': occurrence.date.strftime('%a'),
+                'date': occurrence.date.isoformat(),
+                'time': _time_range(occurrence.start_time, occurrence.end_time),
+                'subject': occurrence.course.name,
+                'title': occurrence.schedule.title,
+                'location': occurrence.schedule.location,
+                'instructor': instructor,
+                'staff': instructor,
+            })
+
+        return JsonResponse({'timetable': timetable, 'week_start': week_start.isoformat()})
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -137,44 +463,67 @@ def get_student_events(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+SINCE_PAGE_SIZE = 50
+
+
 @login_required
 def get_student_notifications(request):
-    """API endpoint to fetch student notifications."""
+    """API endpoint to fetch student notifications.
+
+    Without parameters the 10 most recent notifications are returned. Pollers
+    pass back ``since`` (the ``cursor`` of the previous response) and
+    ``read_version``; they then get the next ``SINCE_PAGE_SIZE`` newer
+    notifications, oldest first, plus the ids that are still unread when the
+    read state changed. ``has_more`` says further pages follow, and ``cursor``
+    is the id of the last notification returned. Every response carries an
+    ETag of its cursor and the read-state version, so a poll that is caught
+    up and unchanged is answered with 304 after a single indexed lookup.
+    """
     try:
         if not hasattr(request.user, 'profile') or getattr(request.user.profile, 'role', None) != 'student':
             return JsonResponse({'error': 'Access denied'}, status=403)
-        
-        # Get notifications for the user
-        try:
-            notifications = Notification.objects.filter(
-                user=request.user
-            ).order_by('-created_at')[:10]
-        except Exception as e:
-            print(f"Error fetching notifications: {e}")
-            notifications = []
-        
-        notif_list = []
-        for notif in notifications:
+
+        latest_id = notification_service.latest_notification_id(request.user.pk)
+        version = notification_service.read_version(request.user.pk)
+        etag = f'"n{latest_id}-r{version}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        since = request.GET.get('since')
+        qs = Notification.objects.filter(user=request.user)
+        cursor, has_more = latest_id, False
+        if since is not None:
             try:
-                notif_list.append({
-                    'id': notif.id,
-                    'title': getattr(notif, 'title', 'Notification'),
-                    'message': getattr(notif, 'message', str(notif)),
-                    'type': getattr(notif, 'type', 'info'),
-                    'created_at': notif.created_at.strftime('%Y-%m-%d %H:%M') if notif.created_at else 'N/A',
-                    'is_read': getattr(notif, 'is_read', False)
-                })
-            except Exception as e:
-                print(f"Error processing notification {notif.id}: {e}")
-                continue
-        
-        unread_count = len([n for n in notif_list if not n['is_read']])
-        
-        return JsonResponse({
-            'notifications': notif_list, 
-            'unread_count': unread_count,
-            'total_count': len(notif_list)
-        })
+                since = int(since)
+            except ValueError:
+                return JsonResponse({'error': 'since must be an integer'}, status=400)
+            notifications = list(qs.filter(id__gt=since).order_by('id')[:SINCE_PAGE_SIZE + 1])
+            if len(notifications) > SINCE_PAGE_SIZE:
+                notifications = notifications[:SINCE_PAGE_SIZE]
+                cursor, has_more = notifications[-1].id, True
+        else:
+            notifications = qs.order_by('-created_at')[:10]
+
+        notif_list = [_notification_to_dict(n) for n in notifications]
+        payload = {
+            'notifications': notif_list,
+            'unread_count': notification_service.unread_count(request.user),
+            'total_count': len(notif_list),
+            'cursor': cursor,
+            'has_more': has_more,
+            'read_version': version,
+        }
+        if since is not None and request.GET.get('read_version') != str(version):
+            payload['unread_ids'] = list(
+                qs.filter(is_read=False).select_related(None).order_by('-id').values_list('id', flat=True)[:200]
+            )
+
+        response = JsonResponse(payload)
+        # a client part-way through the pages must not get a 304 for the rest
+        response['ETag'] = f'"n{cursor}-r{version}"'
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -187,206 +536,74 @@ def get_student_notifications(request):
 
 
 @login_required
+@conditional_json(_student_stamp('courses'))
 def get_student_courses(request):
     """API endpoint to fetch student enrolled courses."""
     try:
-        if not hasattr(request.user, 'profile') or getattr(request.user.profile, 'role', None) != 'student':
+        if not _is_student(request.user):
             return JsonResponse({'error': 'Access denied'}, status=403)
-        
-        student = request.user.profile
-        
-        # Get all courses the student is enrolled in
-        enrollments = Enrollment.objects.filter(student=student).select_related('course')
-        
-        courses_list = []
-        for enrollment in enrollments:
-            course = enrollment.course
-            courses_list.append({
-                'id': course.id,
-                'name': course.name,
-                'code': course.code,
-                'credits': course.credits,
-                'semester': course.semester,
-                'teacher': course.teacher.user.get_full_name() or course.teacher.user.username,
-                'exam_date': 'TBD'  # Can be extended if Exam model exists
-            })
-        
-        return JsonResponse({'courses': courses_list})
+        return JsonResponse(_cached_section('courses', StudentStats(request.user.profile)))
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return JsonResponse({'error': str(e)}, status=500)
 
 
 @login_required
+@conditional_json(_student_stamp('attendance'))
 def get_student_attendance(request):
     """API endpoint to fetch real-time attendance data.
 
     This endpoint returns both a course-wise breakdown used by the
     dashboard front-end (``courses`` + ``overall``) and the weekly
     history (``weekly`` / ``historyPercents``) so older clients remain
-    compatible.
+    compatible. ``range`` and ``points`` select the history window
+    (default ``5w``).
     """
     try:
-        if not hasattr(request.user, 'profile') or getattr(request.user.profile, 'role', None) != 'student':
+        if not _is_student(request.user):
             return JsonResponse({'error': 'Access denied'}, status=403)
-
-        student = request.user.profile
-
-        # Aggregate overall totals
-        attendance_records = Attendance.objects.filter(student=student).aggregate(
-            total=Count('id'),
-            present=Count('id', filter=Q(status=True))
-        )
-
-        total = attendance_records.get('total', 0) or 0
-        present = attendance_records.get('present', 0) or 0
-        percent = round((present / total) * 100, 1) if total > 0 else 0
-
-        # Per-course breakdown (match frontend expectation)
-        enrollments = Enrollment.objects.filter(student=student).select_related('course')
-        attendance_data = []
-        for enrollment in enrollments:
-            course = enrollment.course
-            records = Attendance.objects.filter(student=student, course=course)
-            present_count = records.filter(status=True).count()
-            total_count = records.count()
-            pct = round((present_count / total_count) * 100, 1) if total_count > 0 else 0
-            attendance_data.append({
-                'course_id': course.id,
-                'course_name': course.name,
-                'course_code': course.code,
-                'present': present_count,
-                'total': total_count,
-                'percentage': pct
-            })
-
-        # Weekly breakdown for the last 5 weeks (keeps compatibility)
-        now = timezone.now().date()
-        weekly_data = []
-        for i in range(5, 0, -1):
-            week_start = now - datetime.timedelta(weeks=i)
-            week_end = week_start + datetime.timedelta(days=7)
-            week_records = Attendance.objects.filter(student=student, date__gte=week_start, date__lt=week_end)
-            week_total = week_records.count()
-            week_present = week_records.filter(status=True).count()
-            week_pct = round((week_present / week_total) * 100, 1) if week_total > 0 else 0
-            weekly_data.append({'week': f'W{i}', 'present': week_present, 'total': week_total or 0, 'percent': week_pct})
-
-        return JsonResponse({
-            'courses': attendance_data,
-            'overall': {'present': present, 'total': total, 'percentage': percent},
-            'weekly': weekly_data,
-            'historyPercents': [w['percent'] for w in weekly_data]
-        })
+        try:
+            start, end, _, points = series.from_request(request, '5w', bucket='week')
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        stats = StudentStats(request.user.profile)
+        if 'range' in request.GET or 'points' in request.GET:
+            return JsonResponse(_attendance_section(stats, (start, end), points))
+        return JsonResponse(_cached_section('attendance', stats))
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return JsonResponse({'error': str(e)}, status=500)
 
 
-
 @login_required
+@conditional_json(_student_stamp('latest_uploads'))
 def get_latest_uploads(request):
     """API endpoint for fetching latest material uploads."""
     if getattr(request.user.profile, 'role', None) != 'student':
         return JsonResponse({'error': 'Access denied'}, status=403)
-    
-    student = request.user.profile
+
     try:
-        enrollments = Enrollment.objects.filter(student=student).values_list('course', flat=True)
-        materials = StudyMaterial.objects.filter(
-            course_id__in=enrollments
-        ).order_by('-uploaded_at')[:5]
-        
-        uploads = []
-        for material in materials:
-            uploads.append({
-                'id': material.id,
-                'title': material.title,
-                'course': material.course.name if material.course else 'Unknown'
-            })
-        
-        return JsonResponse(uploads, safe=False)
+        return JsonResponse(_cached_section('latest_uploads', StudentStats(request.user.profile)), safe=False)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
 @login_required
+@conditional_json(_student_stamp('live_updates'))
 def get_live_updates(request):
     """API endpoint to fetch live updates for the student dashboard.
-    Returns updates for attendance, assignments, exams, and course content.
+    Returns the newest entries of the student's activity feed (attendance,
+    marks, new assignments and course materials). Pass ``before`` (the
+    ``next_before`` of a previous response) to page further back.
     """
     if getattr(request.user.profile, 'role', None) != 'student':
         return JsonResponse({'error': 'Access denied'}, status=403)
 
-    student = request.user.profile
-    now = timezone.now()
-    updates = []
-
-    # Get enrolled courses
-    enrolled_courses = Course.objects.filter(
-        enrollment__student=student
-    )
-
-    # Recent attendance records (last 24 hours)
-    recent_attendance = Attendance.objects.filter(
-        student=student,
-        date__gte=now.date()
-    ).select_related('course')
-
-    for attendance in recent_attendance:
-        updates.append({
-            'type': 'attendance',
-            'title': f'Attendance recorded for {attendance.course.name}',
-            'timestamp': attendance.date.strftime('%I:%M %p'),
-            'is_new': True
-        })
-
-    # New assignments (added in last 24 hours)
-    new_assignments = Assignment.objects.filter(
-        course__in=enrolled_courses,
-        created_at__gte=now - datetime.timedelta(days=1)
-    ).select_related('course')
-
-    for assignment in new_assignments:
-        updates.append({
-            'type': 'assignment',
-            'title': f'New assignment: {assignment.title}',
-            'timestamp': assignment.created_at.strftime('%I:%M %p'),
-            'is_new': True
-        })
-
-    # Recent exam schedules or results (if any)
-    # This is a placeholder - add actual exam model queries when implemented
-    # updates.append({
-    #     'type': 'exam',
-    #     'title': 'Mid-term results published',
-    #     'timestamp': '2 hours ago',
-    #     'is_new': False
-    # })
-
-    # New course content or materials
-    recent_materials = StudyMaterial.objects.filter(
-        course__in=enrolled_courses,
-        uploaded_at__gte=now - datetime.timedelta(days=1)
-    ).select_related('course')
-
-    for material in recent_materials:
-        updates.append({
-            'type': 'course',
-            'title': f'New material added to {material.course.name}: {material.title}',
-            'timestamp': material.uploaded_at.strftime('%I:%M %p'),
-            'is_new': True
-        })
-
-    # Sort updates by timestamp (newest first) and limit to 10
-    updates.sort(key=lambda x: x['timestamp'], reverse=True)
-    updates = updates[:10]
-
-    return JsonResponse({
-        'updates': updates
-    })
+    stats = StudentStats(request.user.profile)
+    before = request.GET.get('before')
+    if before:
+        return JsonResponse(_live_updates_section(stats, before=before))
+    return JsonResponse(_cached_section('live_updates', stats))
 
 
 @login_required
@@ -396,23 +613,23 @@ def get_analytics(request):
     Payload example:
     {
       peak_hours: '9 AM - 11 AM',
-      avg_session: '1.5 hours',
+      avg_session: 1.5,
       weekly_total: 28.5,
       learning_style: { labels: [...], values: [...] },
       ai_tips: [{title, description}, ...],
       achievements: [{title, progress, status}, ...]
     }
+
+    ``peak_hours``, ``avg_session`` and ``weekly_total`` (hours) come from
+    the user's StudyHour rollups (see portal.study_activity).
     """
     if getattr(request.user.profile, 'role', None) != 'student':
         return JsonResponse({'error': 'Access denied'}, status=403)
 
-    student = request.user.profile
     now = timezone.now()
 
-    # Example heuristics — replace with real analytics when available
-    peak_hours = '9 AM - 11 AM'
-    avg_session = 1.5
-    weekly_total = 28.5
+    # Peak hours, session length and weekly hours from the hourly rollups
+    study = study_activity.analytics(request.user, now=now)
 
     # Learning style mock (visual, auditory, kinesthetic)
     learning_style = {
@@ -434,9 +651,9 @@ def get_analytics(request):
     ]
 
     data = {
-        'peak_hours': peak_hours,
-        'avg_session': avg_session,
-        'weekly_total': weekly_total,
+        'peak_hours': study['peak_hours'],
+        'avg_session': study['avg_session'],
+        'weekly_total': study['weekly_total'],
         'learning_style': learning_style,
         'ai_tips': ai_tips,
         'achievements': achievements,
@@ -447,7 +664,7 @@ def get_analytics(request):
 
 
 @login_required
-@login_required
+@conditional_json(_student_stamp('schedules'))
 def get_student_schedules(request):
     """API endpoint to fetch upcoming schedules for students.
     
@@ -455,33 +672,10 @@ def get_student_schedules(request):
     Sorted by date ascending (nearest first).
     """
     try:
-        if not hasattr(request.user, 'profile') or getattr(request.user.profile, 'role', None) != 'student':
+        if not _is_student(request.user):
             return JsonResponse({'error': 'Access denied'}, status=403)
-        
-        from .models import Schedule
-        
-        student = request.user.profile
-        schedules = Schedule.objects.upcoming_for_student(student)
-        
-        schedules_list = []
-        for sched in schedules:
-            schedules_list.append({
-                'id': sched.id,
-                'title': sched.title,
-                'description': sched.description,
-                'date': sched.date.isoformat(),
-                'start_time': sched.start_time.isoformat() if sched.start_time else None,
-                'end_time': sched.end_time.isoformat() if sched.end_time else None,
-                'location': sched.location,
-                'course': sched.course.code if sched.course else 'General',
-                'is_public': sched.is_public,
-                'color': sched.color,
-                'attachment_url': sched.attachment.url if sched.attachment else None,
-            })
-        
-        return JsonResponse({'schedules': schedules_list, 'count': len(schedules_list)})
+        return JsonResponse(_cached_section('schedules', StudentStats(request.user.profile)))
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -499,17 +693,18 @@ def get_schedule_notifications(request):
             return JsonResponse({'error': 'Access denied'}, status=403)
         
         # Fetch schedule/event notifications for this user (received broadcasts)
-        notifications = Notification.objects.filter(
+        schedule_notifications = Notification.objects.filter(
             user=request.user,
-            title__icontains='Schedule'
-        ).order_by('-created_at')[:20]
+            message__title__icontains='Schedule'
+        )
+        notifications = schedule_notifications.order_by('-created_at')[:20]
         
         notif_list = []
         for notif in notifications:
             notif_list.append({
                 'id': notif.id,
                 'title': notif.title,
-                'message': notif.message,
+                'message': notif.body,
                 'created_at': notif.created_at.isoformat(),
                 'is_read': notif.is_read,
             })
@@ -517,7 +712,8 @@ def get_schedule_notifications(request):
         return JsonResponse({
             'notifications': notif_list,
             'count': len(notif_list),
-            'unread_count': Notification.objects.filter(user=request.user, title__icontains='Schedule', is_read=False).count()
+            # schedule notifications only; the cached counter covers all of the user's notifications
+            'unread_count': schedule_notifications.filter(is_read=False).count()
         })
     except Exception as e:
         import traceback
@@ -0,0 +1,151 @@
+"""
+Question trees of assignments, saved and copied in bulk.
+
+``save_questions`` turns the ``questions`` JSON of the create-assignment
+form into Question and Option rows with two ``bulk_create`` calls in one
+transaction. A malformed entry saves nothing instead of leaving half a
+quiz behind; the create view parses with ``parse_questions`` first and
+saves the tree with ``save_tree`` inside its own transaction. ``clone`` copies an assignment into other courses with its
+questions, options and attachments, again one ``bulk_create`` per table for
+all the copies together. Attachment copies point at the same stored file
+rather than duplicating it, so attachment files must never be deleted
+while another attachment row still names them.
+
+Assignments themselves are created one at a time so that their signals
+(live-updates feed, cache versions) fire as for any other new assignment.
+"""
+
+from django.db import connection, transaction
+
+from .models import Assignment, AssignmentAttachment, Option, Question
+
+
+BATCH_SIZE = 500
+
+
+def _assign_pks(objs, queryset):
+    """Fill in the primary keys of ``objs`` after ``bulk_create`` on backends that do not return them (MySQL).
+
+    ``queryset`` must select exactly the rows just inserted; their ids
+    ascend in insertion order within the transaction.
+    """
+    if not objs or objs[0].pk is not None:
+        return
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    if len(ids) != len(objs):
+        raise RuntimeError(f'Expected {len(objs)} new {queryset.model.__name__} rows, found {len(ids)}')
+    for obj, pk in zip(objs, ids):
+        obj.pk = pk
+
+
+def _bulk_create(model, objs, queryset):
+    model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    if not connection.features.can_return_rows_from_bulk_insert:
+        _assign_pks(objs, queryset)
+    return objs
+
+
+def parse_questions(qlist):
+    """``(Question, [Option])`` pairs, unsaved, from the form's questions JSON. Raises ValueError when malformed.
+
+    MCQ entries carry ``options`` (texts) and ``correct_answer`` (the index of
+    the correct one); true/false entries carry ``correct_answer`` as
+    ``"true"``/``"false"`` or a boolean.
+    """
+    if not isinstance(qlist, list):
+        raise ValueError('questions must be a list')
+    tree = []
+    for qdata in qlist:
+        if not isinstance(qdata, dict):
+            raise ValueError('each question must be an object')
+        try:
+            q_order = int(qdata.get('order') or 0)
+        except (TypeError, ValueError):
+            q_order = 0
+        try:
+            qpoints = float(qdata.get('points') or 0)
+        except (TypeError, ValueError):
+            qpoints = 0
+        qtype = qdata.get('type') or 'mcq'
+        question = Question(order=q_order, qtype=qtype, text=qdata.get('text') or '', points=qpoints)
+
+        options = []
+        if qtype == 'mcq':
+            try:
+                correct = int(qdata.get('correct_answer')) if qdata.get('correct_answer') is not None else None
+            except (TypeError, ValueError):
+                correct = None
+            options = [Option(order=idx, text=str(opt_text)[:1000], is_correct=(correct == idx))
+                       for idx, opt_text in enumerate(qdata.get('options') or [])]
+        elif qtype == 'true_false':
+            ca = qdata.get('correct_answer')
+            options = [
+                Option(order=0, text='True', is_correct=(ca == 'true' or ca is True)),
+                Option(order=1, text='False', is_correct=(ca == 'false' or ca is False)),
+            ]
+        tree.append((question, options))
+    return tree
+
+
+def save_questions(assignment, qlist):
+    """Save the questions JSON of ``assignment`` (which has none yet); returns the number of questions."""
+    return save_tree(assignment, parse_questions(qlist))
+
+
+def save_tree(assignment, tree):
+    """Save an already parsed ``parse_questions`` tree of ``assignment``; returns the number of questions."""
+    with transaction.atomic():
+        _save_tree([(assignment, tree)])
+    return len(tree)
+
+
+def _save_tree(targets):
+    """Insert the ``(assignment, [(Question, [Option])])`` trees of several new assignments together."""
+    questions, options = [], []
+    for assignment, tree in targets:
+        for question, question_options in tree:
+            question.assignment = assignment
+            questions.append(question)
+    _bulk_create(Question, questions, Question.objects.filter(assignment__in=[a for a, _ in targets]))
+    for assignment, tree in targets:
+        for question, question_options in tree:
+            for option in question_options:
+                option.question = question
+                options.append(option)
+    _bulk_create(Option, options, Option.objects.filter(question__in=questions))
+
+
+def clone(assignment, courses, uploaded_by=None):
+    """Copy ``assignment`` into every course of ``courses``; returns the new assignments.
+
+    Questions, options and attachments are copied in bulk for all the courses
+    at once. Attachments share the original files.
+    """
+    source_tree = [
+        (question, list(question.options.all()))
+        for question in Question.objects.filter(assignment=assignment).prefetch_related('options')
+    ]
+    attachments = list(AssignmentAttachment.objects.filter(assignment=assignment))
+
+    with transaction.atomic():
+        copies = [
+            Assignment.objects.create(
+                course=course, title=assignment.title, description=assignment.description, body=assignment.body,
+                is_draft=assignment.is_draft, due_date=assignment.due_date, max_marks=assignment.max_marks,
+            )
+            for course in courses
+        ]
+        _save_tree([
+            (copy, [
+                (Question(order=q.order, qtype=q.qtype, text=q.text, points=q.points),
+                 [Option(order=o.order, text=o.text, is_correct=o.is_correct) for o in opts])
+                for q, opts in source_tree
+            ])
+            for copy in copies
+        ])
+        AssignmentAttachment.objects.bulk_create([
+            # the same storage name: the file itself is not copied
+            AssignmentAttachment(assignment=copy, file=attachment.file.name, uploaded_by=uploaded_by or attachment.uploaded_by)
+            for copy in copies for attachment in attachments
+        ], batch_size=BATCH_SIZE)
+    return copies
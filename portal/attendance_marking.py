@@ -0,0 +1,81 @@
+"""
+Whole-roster attendance marking.
+
+``mark(course, present, absent)`` writes one day's attendance for a class in
+one transaction. The rows go in through ``bulk_create(update_conflicts=True)``
+against the (student, course, date) unique constraint, so a re-mark updates
+in place. The cost is a handful of queries for the whole roster, not two per
+student. Bulk writes skip model signals, so ``mark`` does their work itself
+for the students whose status changed: summary refresh, feed events and
+cache version bumps.
+"""
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import activity, cache_versions, course_summary
+from .models import Attendance, Enrollment
+
+
+BATCH_SIZE = 1000
+
+
+class RosterError(ValueError):
+    """Student ids that are not enrolled in the course, or marked both present and absent."""
+
+
+def parse_ids(value):
+    """Student ids from a list of ints/strings or a comma-separated string."""
+    if value is None:
+        return set()
+    if isinstance(value, str):
+        value = [v for v in value.split(',') if v.strip()]
+    try:
+        return {int(v) for v in value}
+    except (TypeError, ValueError):
+        raise RosterError('Student ids must be integers')
+
+
+def mark(course, present, absent=(), day=None, rest_absent=True):
+    """Write ``course``'s attendance on ``day`` (default today) and return a summary dict.
+
+    ``present`` and ``absent`` are student profile ids. With ``rest_absent``
+    every other enrolled student is marked absent; otherwise their rows are
+    left as they are. Raises RosterError for ids outside the roster.
+    """
+    day = day or timezone.localdate()
+    present, absent = set(present), set(absent)
+    both = present & absent
+    if both:
+        raise RosterError(f"Marked both present and absent: {', '.join(map(str, sorted(both)))}")
+    roster = set(Enrollment.objects.filter(course=course).values_list('student_id', flat=True))
+    unknown = (present | absent) - roster
+    if unknown:
+        raise RosterError(f"Not enrolled in {course.code}: {', '.join(map(str, sorted(unknown)))}")
+    if rest_absent:
+        absent = roster - present
+
+    statuses = {sid: True for sid in present}
+    statuses.update({sid: False for sid in absent})
+    with transaction.atomic():
+        existing = dict(Attendance.objects.filter(course=course, date=day).values_list('student_id', 'status'))
+        changed = {sid: status for sid, status in statuses.items() if existing.get(sid) != status}
+        if changed:
+            Attendance.objects.bulk_create(
+                [Attendance(student_id=sid, course=course, date=day, status=status) for sid, status in changed.items()],
+                batch_size=BATCH_SIZE, update_conflicts=True, update_fields=['status'],
+                unique_fields=['student', 'course', 'date'] if connection.features.supports_update_conflicts_with_target else None,
+            )
+            course_summary.refresh_many((sid, course.id) for sid in changed)
+            activity.attendance_marked(course.id, day, changed)
+            cache_versions.bump_on_write(
+                cache_versions.table_scope(Attendance), cache_versions.course_scope(course.id),
+                *(cache_versions.student_scope(sid) for sid in changed),
+            )
+
+    return {
+        'date': day.isoformat(),
+        'present': sum(1 for s in statuses.values() if s),
+        'absent': sum(1 for s in statuses.values() if not s),
+        'changed': len(changed),
+    }
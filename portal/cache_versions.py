@@ -0,0 +1,123 @@
+"""
+Version-keyed caching for per-user JSON responses.
+
+Every cached payload names the scopes it was built from (``course_scope``,
+``student_scope``, ``teacher_scope``, ``table_scope``). Each scope has a
+version counter in the cache, and the counters are part of the cache key.
+Model save/delete signals (see ``portal.models``) bump the versions of the
+scopes a row belongs to. The next read after a relevant write therefore
+misses and rebuilds, so entries can live for a long time without going stale.
+
+Nothing is ever deleted explicitly. Superseded entries simply stop being
+read and expire on their TTL. If a version counter is evicted it restarts
+from the current time, which never matches an older key.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+VERSION_KEY = 'cachever:{}'
+VERSION_TTL = 60 * 60 * 24 * 30
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+
+def course_scope(course_id):
+    return f'course:{course_id}'
+
+
+def student_scope(profile_id):
+    return f'student:{profile_id}'
+
+
+def teacher_scope(profile_id):
+    return f'teacher:{profile_id}'
+
+
+def table_scope(model):
+    return f'table:{model._meta.label_lower}'
+
+
+def versions(scopes):
+    """Current version of every scope, in order (one cache round-trip when all exist)."""
+    keys = [VERSION_KEY.format(s) for s in scopes]
+    found = cache.get_many(keys)
+    result = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, int(time.time() * 1000), VERSION_TTL)
+            found[key] = cache.get(key)
+        result.append(found[key])
+    return result
+
+
+def bump(*scopes):
+    for scope in dict.fromkeys(scopes):
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), VERSION_TTL)
+
+
+def versioned_key(name, scopes, *extra):
+    parts = [str(v) for v in versions(scopes)] + [str(e) for e in extra]
+    return f'vc:{name}:' + ':'.join(parts)
+
+
+def cached(name, scopes, builder, timeout=DEFAULT_TIMEOUT, daily=False):
+    """Return ``builder()`` cached under ``name`` and the current versions of ``scopes``.
+
+    ``name`` must identify the payload, including the user or object it is
+    for. ``daily`` adds today's date to the key for payloads that mention
+    "today" (days left, is-new flags).
+    """
+    extra = [timezone.localdate().isoformat()] if daily else []
+    return cache.get_or_set(versioned_key(name, scopes, *extra), builder, timeout)
+
+
+# ---------------------------------------------------------------------------
+# Invalidation (called from the signal receivers in portal.models)
+# ---------------------------------------------------------------------------
+
+def _assignment_course_id(assignment_id):
+    from .models import Assignment
+    return Assignment.objects.filter(pk=assignment_id).values_list('course_id', flat=True).first()
+
+
+def scopes_for(instance):
+    """The scopes whose cached payloads can change when ``instance`` is written."""
+    name = type(instance).__name__
+    scopes = [table_scope(type(instance))]
+    if name == 'Course':
+        scopes += [course_scope(instance.pk), teacher_scope(instance.teacher_id)]
+    elif name == 'Enrollment':
+        scopes += [course_scope(instance.course_id), student_scope(instance.student_id)]
+    elif name == 'Attendance':
+        scopes += [course_scope(instance.course_id), student_scope(instance.student_id)]
+    elif name == 'Submission':
+        scopes.append(student_scope(instance.student_id))
+        course_id = _assignment_course_id(instance.assignment_id)
+        if course_id is not None:
+            scopes.append(course_scope(course_id))
+    elif name in ('Assignment', 'StudyMaterial'):
+        scopes.append(course_scope(instance.course_id))
+    elif name == 'Schedule':
+        if instance.course_id:
+            scopes.append(course_scope(instance.course_id))
+    return scopes
+
+
+def bump_on_write(*scopes):
+    """Bump now and again after commit, for writes that may be inside a transaction."""
+    bump(*scopes)
+    # Again after commit: a reader that rebuilt between the first bump and the
+    # commit may have cached pre-commit data under the new versions.
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def bump_for(instance):
+    bump_on_write(*scopes_for(instance))
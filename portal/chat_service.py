@@ -0,0 +1,69 @@
+"""
+Direct messages between students, teachers and admins.
+
+Each pair of users shares one ChatThread; history is read newest-first with
+keyset pagination on (created_at, id), so loading a page is an index range
+scan whose cost does not depend on how many other messages or notifications
+exist.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChatMessage, ChatThread
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def thread_between(user, other):
+    """Return the thread for the two users, creating it on first contact."""
+    a, b = sorted([user.pk, other.pk])
+    try:
+        with transaction.atomic():
+            thread, _ = ChatThread.objects.get_or_create(user_a_id=a, user_b_id=b)
+    except IntegrityError:
+        # Lost a race with a concurrent first message.
+        thread = ChatThread.objects.get(user_a_id=a, user_b_id=b)
+    return thread
+
+
+def find_thread(user, other):
+    """Existing thread for the two users, or None."""
+    a, b = sorted([user.pk, other.pk])
+    return ChatThread.objects.filter(user_a_id=a, user_b_id=b).first()
+
+
+def post_message(sender, recipients, body):
+    """Append ``body`` to the sender's thread with every recipient; return the messages."""
+    threads = [thread_between(sender, r) for r in recipients if r.pk != sender.pk]
+    if not threads:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        created = ChatMessage.objects.bulk_create(
+            [ChatMessage(thread=t, sender=sender, body=body) for t in threads]
+        )
+        ChatThread.objects.filter(pk__in=[t.pk for t in threads]).update(last_message_at=now)
+    return created
+
+
+def history(thread, before=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of ``thread`` messages, newest first.
+
+    ``before`` is the id of the oldest message the client already has. Returns
+    ``(messages, next_before)`` where ``next_before`` is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    qs = ChatMessage.objects.filter(thread=thread)
+    if before is not None:
+        pivot = qs.filter(id=before).values_list('created_at', flat=True).first()
+        if pivot is None:
+            return [], None
+        qs = qs.filter(Q(created_at__lt=pivot) | Q(created_at=pivot, id__lt=before))
+
+    page = list(qs.order_by('-created_at', '-id')[:limit + 1])
+    next_before = page[limit - 1].id if len(page) > limit else None
+    return page[:limit], next_before
@@ -7,9 +7,10 @@ from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
-from django.db.models import Q
-from .models import Notification, Profile, Enrollment
+from .models import Profile, Enrollment
 from .chatbot_service import StudentChatbotService
+from .notification_service import dispatch, notify, role_recipients
+from . import chat_service
 import json
 
 
@@ -102,14 +103,14 @@ def send_message_to_teacher(request):
                 'error': f'Teacher "{teacher_name}" not found in your courses'
             }, status=404)
         
+        chat_service.post_message(request.user, [teacher_profile.user], message_text)
+
         # Create notification for teacher with real-time indicator
-        notification = Notification.objects.create(
-            user=teacher_profile.user,
-            title=f"💬 New Message from {student.user.get_full_name()}",
-            message=message_text,
-            type='student_message',
-            is_read=False,
-            created_at=timezone.now()
+        notification = notify(
+            teacher_profile.user,
+            f"💬 New Message from {student.user.get_full_name()}",
+            message_text,
+            sender=request.user,
         )
         
         return JsonResponse({
@@ -168,25 +169,22 @@ def send_message_to_admin(request):
         }
         
         category_data = category_info.get(category, category_info['general'])
+
+        chat_service.post_message(request.user, [p.user for p in admin_profiles], message_text)
         
         # Create notifications for all admins
-        notifications_created = []
-        for admin in admin_profiles:
-            notification = Notification.objects.create(
-                user=admin.user,
-                title=f"{category_data['emoji']} {category_data['label']} from {request.user.get_full_name()}",
-                message=message_text,
-                type='student_query',
-                is_read=False,
-                created_at=timezone.now()
-            )
-            notifications_created.append(notification.id)
+        admins_notified = dispatch(
+            role_recipients(['admin2', 'superadmin']),
+            f"{category_data['emoji']} {category_data['label']} from {request.user.get_full_name()}",
+            message_text,
+            sender=request.user,
+        )
         
         return JsonResponse({
             'success': True,
-            'message': f"{category_data['emoji']} Your message has been sent to {len(notifications_created)} administrator(s)!",
+            'message': f"{category_data['emoji']} Your message has been sent to {admins_notified} administrator(s)!",
             'category': category,
-            'admins_notified': len(notifications_created),
+            'admins_notified': admins_notified,
             'timestamp': timezone.now().isoformat(),
             'suggestions': ['Contact teacher', 'Back to Menu']
         })
@@ -288,7 +286,8 @@ def get_admin_list(request):
 def get_message_history(request):
     """
     Get chat message history for a specific contact (teacher or admin)
-    Returns past conversations for context
+    Returns past conversations for context, newest first. Pass the returned
+    ``next_before`` as ``before`` to load older messages.
     """
     try:
         if not hasattr(request.user, 'profile') or request.user.profile.role != 'student':
@@ -300,35 +299,38 @@ def get_message_history(request):
         if not contact_id:
             return JsonResponse({'success': False, 'error': 'contact_id required'}, status=400)
         
-        # Get notifications (messages) with this contact
+        # Resolve the contact, then read one page of the pair's thread
         if contact_type == 'teacher':
-            try:
-                contact = Profile.objects.get(id=contact_id, role='teacher')
-                messages = Notification.objects.filter(
-                    Q(user=request.user, title__contains=contact.user.get_full_name()) |
-                    Q(user=contact.user, title__contains=request.user.get_full_name())
-                ).order_by('-created_at')[:20]
-            except Profile.DoesNotExist:
-                return JsonResponse({'success': False, 'error': 'Teacher not found'}, status=404)
-        
+            roles = ['teacher']
         elif contact_type == 'admin':
-            try:
-                contact = Profile.objects.get(id=contact_id, role__in=['admin2', 'superadmin'])
-                messages = Notification.objects.filter(
-                    Q(user=request.user, title__contains=contact.user.get_full_name()) |
-                    Q(user=contact.user, title__contains=request.user.get_full_name())
-                ).order_by('-created_at')[:20]
-            except Profile.DoesNotExist:
-                return JsonResponse({'success': False, 'error': 'Admin not found'}, status=404)
+            roles = ['admin2', 'superadmin']
         else:
             return JsonResponse({'success': False, 'error': 'Invalid contact type'}, status=400)
-        
+
+        try:
+            contact = Profile.objects.select_related('user').get(id=contact_id, role__in=roles)
+        except Profile.DoesNotExist:
+            label = 'Teacher' if contact_type == 'teacher' else 'Admin'
+            return JsonResponse({'success': False, 'error': f'{label} not found'}, status=404)
+
+        try:
+            before = int(request.GET['before']) if request.GET.get('before') else None
+            limit = int(request.GET.get('limit', chat_service.DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'before and limit must be integers'}, status=400)
+
+        thread = chat_service.find_thread(request.user, contact.user)
+        if thread is None:
+            messages, next_before = [], None
+        else:
+            messages, next_before = chat_service.history(thread, before=before, limit=limit)
+
         message_list = [
             {
                 'id': msg.id,
-                'message': msg.message,
+                'message': msg.body,
                 'timestamp': msg.created_at.isoformat(),
-                'is_from_student': msg.user.id == request.user.id
+                'is_from_student': msg.sender_id == request.user.id
             }
             for msg in messages
         ]
@@ -336,7 +338,8 @@ def get_message_history(request):
         return JsonResponse({
             'success': True,
             'messages': message_list,
-            'count': len(message_list)
+            'count': len(message_list),
+            'next_before': next_before,
         })
     
     except Exception as e:
@@ -6,7 +6,9 @@ Handles intelligent responses, message routing, and real-time communications wit
 import re
 from django.utils import timezone
 from django.db.models import Q
-from .models import Course, Assignment, Enrollment, Attendance, Notification, Profile
+from .models import Course, Assignment, Enrollment, Attendance, Profile
+from .notification_service import dispatch, notify, role_recipients
+from . import chat_service
 from datetime import datetime, timedelta
 
 
@@ -453,14 +455,14 @@ class StudentChatbotService:
         try:
             teacher = Profile.objects.get(id=teacher_id, role='teacher')
             
+            chat_service.post_message(self.student.user, [teacher.user], message_text)
+
             # Create notification for teacher
-            notification = Notification.objects.create(
-                recipient=teacher.user,
-                sender=self.user,
-                title=f"New message from {self.student.user.get_full_name()}",
-                message=message_text,
-                notification_type='message',
-                is_read=False
+            notification = notify(
+                teacher.user,
+                f"New message from {self.student.user.get_full_name()}",
+                message_text,
+                sender=self.student.user,
             )
             
             return {
@@ -486,7 +488,7 @@ class StudentChatbotService:
     def send_message_to_admin(self, message_text, issue_category='general'):
         """Send message to all admins with categorization"""
         try:
-            admins = Profile.objects.filter(role__in=['admin2', 'superadmin']).values_list('user', flat=True)
+            admins = role_recipients(['admin2', 'superadmin'])
             
             if not admins.exists():
                 return {
@@ -495,18 +497,14 @@ class StudentChatbotService:
                     'timestamp': timezone.now().isoformat()
                 }
             
-            notifications_created = 0
-            
-            for admin_user_id in admins:
-                notification = Notification.objects.create(
-                    recipient_id=admin_user_id,
-                    sender=self.user,
-                    title=f"Student Message: [{issue_category.upper()}] from {self.student.user.get_full_name()}",
-                    message=message_text,
-                    notification_type='message',
-                    is_read=False
-                )
-                notifications_created += 1
+            chat_service.post_message(self.student.user, list(admins), message_text)
+
+            notifications_created = dispatch(
+                admins,
+                f"Student Message: [{issue_category.upper()}] from {self.student.user.get_full_name()}",
+                message_text,
+                sender=self.student.user,
+            )
             
             category_emoji = {
                 'technical': '🛠️',
@@ -0,0 +1,267 @@
+"""
+Resumable chunked uploads for study materials, submissions and assignment attachments.
+
+A single multipart POST of a 500 MB video restarts from zero when the
+connection drops, and Django reads the whole body before any view code can
+reject it. Uploads therefore go through an UploadSession instead:
+
+1. ``start`` checks the declared type and size against ``POLICIES`` and the
+   user's access to the target. Nothing is transferred before that.
+2. The client sends the file in order, one chunk per request, each with the
+   offset it starts at and its SHA-256. ``append`` rejects a chunk that does
+   not start at the session's offset (the client asks for the offset and
+   resumes from there) or whose checksum does not match. It streams the
+   chunk from the request into a temporary file first, and appends it to the
+   partial file under the session lock only once it is complete.
+3. ``finish`` hands the complete file to StudyMaterial, Submission or
+   AssignmentAttachment. The partial file lives in
+   ``settings.CHUNKED_UPLOAD_DIR``; on the same filesystem as MEDIA_ROOT the
+   file storage moves it into place rather than copying it.
+
+Abandoned sessions are removed by the ``purge_upload_sessions`` command.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Assignment, AssignmentAttachment, Course, Enrollment, StudyMaterial, Submission, UploadSession
+
+
+CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+READ_SIZE = 64 * 1024
+SESSION_TTL = timedelta(days=1)
+
+DOCUMENT_TYPES = (
+    'application/pdf',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'image/png',
+    'image/jpeg',
+    'image/jpg',
+)
+ARCHIVE_TYPES = ('application/zip', 'application/x-zip-compressed', 'text/plain')
+DOCUMENT_MAX_BYTES = 50 * 1024 * 1024
+VIDEO_MAX_BYTES = 500 * 1024 * 1024
+
+# purpose -> (allowed content types besides video/*, message when the type is refused)
+POLICIES = {
+    'material': (DOCUMENT_TYPES, 'Only PDF, Word, image, and video files are allowed (PDF, DOC/DOCX, PNG, JPG, MP4, etc.)'),
+    'attachment': (DOCUMENT_TYPES + ARCHIVE_TYPES, 'Only PDF, Word, image, ZIP, text and video files are allowed'),
+    'submission': (DOCUMENT_TYPES + ARCHIVE_TYPES, 'Only PDF, Word, image, ZIP, text and video files are allowed'),
+}
+
+# Leading bytes of the types that have a reliable signature; checked on the first chunk
+SIGNATURES = {
+    'application/pdf': (b'%PDF',),
+    'image/png': (b'\x89PNG\r\n\x1a\n',),
+    'image/jpeg': (b'\xff\xd8\xff',),
+    'image/jpg': (b'\xff\xd8\xff',),
+    'application/zip': (b'PK\x03\x04', b'PK\x05\x06'),
+}
+
+
+class UploadError(ValueError):
+    """A refused upload request; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def check_file(purpose, content_type, size):
+    """The error message for a file of this type and size, or None when it is acceptable."""
+    allowed, type_message = POLICIES[purpose]
+    content_type = (content_type or '').lower()
+    if not (content_type in allowed or content_type.startswith('video/')):
+        return type_message
+    max_bytes = VIDEO_MAX_BYTES if content_type.startswith('video/') else DOCUMENT_MAX_BYTES
+    if size > max_bytes:
+        return 'File too large (max 50MB for documents/images, 500MB for videos)'
+    return None
+
+
+def check_access(user, purpose, target_id):
+    """Raise UploadError unless ``user`` may upload a file of ``purpose`` to ``target_id``."""
+    profile = getattr(user, 'profile', None)
+    admin = getattr(profile, 'role', None) in ('superadmin', 'admin2')
+    if purpose == 'material':
+        course = Course.objects.filter(id=target_id).first()
+        if course is None:
+            raise UploadError('Course not found', status=404)
+        if not admin and course.teacher_id != getattr(profile, 'id', None):
+            raise UploadError('Access denied', status=403)
+        return
+    assignment = Assignment.objects.select_related('course').filter(id=target_id).first()
+    if assignment is None:
+        raise UploadError('Assignment not found', status=404)
+    if purpose == 'attachment':
+        if not admin and assignment.course.teacher_id != getattr(profile, 'id', None):
+            raise UploadError('Access denied', status=403)
+    elif getattr(profile, 'role', None) != 'student' or not Enrollment.objects.filter(course=assignment.course, student=profile).exists():
+        raise UploadError('Access denied', status=403)
+
+
+def partial_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{session.id.hex}.part')
+
+
+def start(user, purpose, target_id, filename, content_type, size):
+    """Validate an upload before any data is sent and open its session."""
+    if purpose not in POLICIES:
+        raise UploadError(f"purpose must be one of {', '.join(POLICIES)}")
+    try:
+        target_id, size = int(target_id), int(size)
+    except (TypeError, ValueError):
+        raise UploadError('target_id and size must be integers')
+    filename = os.path.basename(str(filename or '')).strip()[:255]
+    if not filename or size <= 0:
+        raise UploadError('filename and a positive size are required')
+    error = check_file(purpose, content_type, size)
+    if error:
+        raise UploadError(error, status=413 if error.startswith('File too large') else 415)
+    check_access(user, purpose, target_id)
+
+    session = UploadSession.objects.create(
+        owner=user, purpose=purpose, target_id=target_id, filename=filename,
+        content_type=content_type.lower(), size=size,
+    )
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(partial_path(session), 'wb').close()
+    return session
+
+
+def _receive(session, offset, length, checksum, stream, spool):
+    """Copy the chunk from ``stream`` into ``spool``, checking its length, checksum and, at offset 0, its signature."""
+    digest = hashlib.sha256()
+    remaining = length
+    first = True
+    while remaining:
+        block = stream.read(min(READ_SIZE, remaining))
+        if not block:
+            break
+        if first and offset == 0:
+            signatures = SIGNATURES.get(session.content_type)
+            if signatures and not block.startswith(signatures):
+                raise UploadError(f'File content does not match {session.content_type}', status=415, offset=0)
+        first = False
+        digest.update(block)
+        spool.write(block)
+        remaining -= len(block)
+    if remaining:
+        raise UploadError('Chunk shorter than its Content-Length', offset=session.offset)
+    if (checksum or '').lower() != digest.hexdigest():
+        raise UploadError('Chunk checksum mismatch', status=422, offset=session.offset)
+
+
+def append(session, offset, length, checksum, stream):
+    """Write the next chunk, read from ``stream``, and return the new offset.
+
+    ``checksum`` is the hex SHA-256 of the chunk. The chunk is first read
+    into a temporary file, with no transaction open, so a slow client holds
+    neither a database connection nor the session lock. Only the append to
+    the partial file runs with the session row locked, so two requests for
+    the same offset cannot interleave.
+    """
+    if not 0 < length <= MAX_CHUNK_SIZE:
+        raise UploadError(f'Chunks must be between 1 byte and {MAX_CHUNK_SIZE} bytes')
+    # fail fast on a stale offset before reading the body; checked again under the lock
+    if offset != session.offset:
+        raise UploadError('Chunk does not start at the upload offset', status=409, offset=session.offset)
+    if offset + length > session.size:
+        raise UploadError('Chunk runs past the declared size', status=413, offset=session.offset)
+
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    with tempfile.TemporaryFile(dir=settings.CHUNKED_UPLOAD_DIR) as spool:
+        _receive(session, offset, length, checksum, stream, spool)
+        spool.seek(0)
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+            if session is None:
+                raise UploadError('Upload not found', status=404)
+            if offset != session.offset:
+                raise UploadError('Chunk does not start at the upload offset', status=409, offset=session.offset)
+            try:
+                with open(partial_path(session), 'r+b') as out:
+                    out.seek(offset)
+                    shutil.copyfileobj(spool, out, READ_SIZE)
+                    # drop whatever an interrupted earlier append may have left past the offset
+                    out.truncate(offset + length)
+            except FileNotFoundError:
+                raise UploadError('The partial upload is gone; start the upload again', status=410)
+            session.offset = offset + length
+            session.save(update_fields=['offset', 'updated_at'])
+    return session.offset
+
+
+class _PartialFile(File):
+    """The finished partial file; ``temporary_file_path`` lets FileSystemStorage move it instead of copying."""
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name=name)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def finish(session, profile, title='', description='', text=''):
+    """Hand the completed file to its model and close the session; returns the new or updated object."""
+    if session.offset != session.size:
+        raise UploadError('Upload incomplete', status=409, offset=session.offset)
+    path = partial_path(session)
+    try:
+        upload = _PartialFile(path, session.filename)
+    except FileNotFoundError:
+        raise UploadError('The partial upload is gone; start the upload again', status=410)
+    try:
+        if session.purpose == 'material':
+            if not title:
+                raise UploadError('Title is required')
+            obj = StudyMaterial.objects.create(course_id=session.target_id, uploaded_by=profile,
+                                               title=title, description=description, file=upload)
+        elif session.purpose == 'attachment':
+            obj = AssignmentAttachment.objects.create(assignment_id=session.target_id, file=upload, uploaded_by=profile)
+        else:
+            obj = Submission.objects.filter(assignment_id=session.target_id, student=profile).first()
+            if obj is None:
+                obj = Submission(assignment_id=session.target_id, student=profile)
+            obj.file = upload
+            if text:
+                obj.text = text
+            obj.submission_date = timezone.now()
+            obj.save()
+    finally:
+        upload.close()
+    session.delete()
+    # gone already when the storage moved it
+    if os.path.exists(path):
+        os.remove(path)
+    return obj
+
+
+def discard(session):
+    """Abort an upload and remove its partial file."""
+    path = partial_path(session)
+    session.delete()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def purge(now=None):
+    """Discard sessions idle for longer than ``SESSION_TTL``; returns how many."""
+    stale = UploadSession.objects.filter(updated_at__lt=(now or timezone.now()) - SESSION_TTL)
+    count = 0
+    for session in stale.iterator():
+        discard(session)
+        count += 1
+    return count
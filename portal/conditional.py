@@ -0,0 +1,92 @@
+"""
+Conditional GET for the polling JSON endpoints.
+
+Dashboards poll their update endpoints every few seconds, and most polls see
+the same data as the last one. ``conditional_json(stamp)`` puts an ETag on
+a view's 200 responses. The ETag is derived from ``stamp(request, ...)``,
+which is a list of cheap fingerprints of the data the view reads. There
+are two kinds. ``version_stamp`` reads the table version counters that the
+save/delete signals bump (see ``portal.cache_versions``): one cache
+round-trip, no query, whatever the table size. It is the one to use for
+whole-table reads such as the admin dashboards. ``table_stamp`` is an
+aggregate (row count, highest id and newest change time) over a queryset.
+It is only cheap when the queryset is narrow and indexed, such as the
+requesting user's rows. When the poll's If-None-Match still matches, the
+view is not run at all and the client gets a 304.
+
+A stamp only has to change whenever the payload can. Keep it to the tables
+the view reads and list them next to the view. The user, the query string
+and the current date are always part of the ETag.
+"""
+
+import hashlib
+import logging
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from . import cache_versions
+
+
+logger = logging.getLogger(__name__)
+
+
+def table_stamp(queryset, changed_field=None, **extra):
+    """Fingerprint of ``queryset``: row count, max pk and, if given, the newest ``changed_field``.
+
+    Count and max pk catch inserts and deletes; ``changed_field`` (an
+    ``auto_now`` column) catches in-place updates. ``extra`` adds further
+    aggregates computed in the same query.
+    """
+    aggregates = {'n': Count('pk'), 'last': Max('pk')}
+    if changed_field:
+        aggregates['changed'] = Max(changed_field)
+    aggregates.update(extra)
+    row = queryset.order_by().aggregate(**aggregates)
+    return ':'.join(str(row[k]) for k in aggregates)
+
+
+def version_stamp(*models):
+    """Current table versions of ``models``; changes on every signalled save or delete.
+
+    Writes that bypass the signals (``QuerySet.update``, ``bulk_create``)
+    must bump the table scope themselves, as ``regenerate_many`` does.
+    """
+    return cache_versions.versions([cache_versions.table_scope(m) for m in models])
+
+
+def _etag(request, parts):
+    raw = '|'.join([str(request.user.pk), request.get_full_path(), timezone.localdate().isoformat(), *map(str, parts)])
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def conditional_json(stamp):
+    """Answer unchanged polls with 304 without running the view.
+
+    If ``stamp`` fails the error is logged, the view runs normally and the
+    response carries no ETag.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            etag = None
+            if request.method in ('GET', 'HEAD'):
+                try:
+                    etag = _etag(request, stamp(request, *args, **kwargs))
+                except Exception:
+                    logger.exception('ETag stamp of %s failed', view_func.__name__)
+            if etag:
+                not_modified = get_conditional_response(request, etag=etag)
+                if not_modified is not None:
+                    patch_cache_control(not_modified, private=True, no_cache=True)
+                    return not_modified
+
+            response = view_func(request, *args, **kwargs)
+            if etag and response.status_code == 200:
+                response['ETag'] = etag
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return _wrapped
+    return decorator
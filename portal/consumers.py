@@ -0,0 +1,39 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+
+def notification_group(user_id):
+    """Channel-layer group that receives every notification for one user."""
+    return f'notifications_user_{user_id}'
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """Pushes new notifications to the logged-in user's open tabs.
+
+    The user comes from the session via AuthMiddlewareStack; anonymous
+    sockets are rejected. On connect the current unread count is sent so the
+    badge is correct without an extra HTTP request.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = notification_group(user.pk)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_json({'type': 'unread', 'unread_count': await self._unread_count(user)})
+
+    async def disconnect(self, code):
+        if getattr(self, 'group_name', None):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notification_message(self, event):
+        await self.send_json({'type': 'notification', 'notification': event['notification']})
+
+    @database_sync_to_async
+    def _unread_count(self, user):
+        from .notification_service import unread_count
+        return unread_count(user)
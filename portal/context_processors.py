@@ -1,11 +1,11 @@
-from .models import Notification
+from .notification_service import unread_count
 
 
 def unread_notifications(request):
     """Return unread notification count for the logged-in user, or 0."""
     if request.user.is_authenticated:
         try:
-            count = Notification.objects.filter(user=request.user, is_read=False).count()
+            count = unread_count(request.user)
         except Exception:
             count = 0
     else:
@@ -0,0 +1,161 @@
+"""
+Maintenance of StudentCourseSummary rows.
+
+``refresh`` recomputes one (student, course) pair from its own Attendance and
+Submission rows, which are small indexed ranges, so a write costs the same no
+matter how much history the rest of the system holds. Model signals call it
+for single-row writes; code that writes in bulk (``QuerySet.update``,
+``bulk_create``) must call ``refresh_many`` itself. ``rebuild`` recomputes
+everything, a chunk of students at a time.
+"""
+
+from datetime import datetime, time
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Attendance, Enrollment, Profile, StudentCourseSummary, Submission
+
+
+def _latest(attendance_date, submitted_at):
+    """Latest of an attendance date and a submission timestamp, as an aware datetime."""
+    candidates = []
+    if attendance_date is not None:
+        candidates.append(timezone.make_aware(datetime.combine(attendance_date, time.min), timezone.get_current_timezone()))
+    if submitted_at is not None:
+        candidates.append(submitted_at)
+    return max(candidates) if candidates else None
+
+
+def _attendance_totals(qs):
+    return qs.aggregate(total=Count('id'), present=Count('id', filter=Q(status=True)), last=Max('date'))
+
+
+def _submission_totals(qs):
+    return qs.aggregate(graded=Count('id', filter=Q(marks_obtained__isnull=False)), marks=Sum('marks_obtained'), last=Max('submission_date'))
+
+
+def refresh(student_id, course_id, create=True):
+    """Recompute the summary for one pair; with ``create=False`` only existing rows are updated."""
+    att = _attendance_totals(Attendance.objects.filter(student_id=student_id, course_id=course_id))
+    sub = _submission_totals(Submission.objects.filter(student_id=student_id, assignment__course_id=course_id))
+    values = {
+        'present': att['present'],
+        'total': att['total'],
+        'graded_count': sub['graded'],
+        'marks_sum': sub['marks'] or 0,
+        'last_activity': _latest(att['last'], sub['last']),
+        'updated_at': timezone.now(),
+    }
+    if create:
+        try:
+            with transaction.atomic():
+                StudentCourseSummary.objects.update_or_create(student_id=student_id, course_id=course_id, defaults=values)
+        except IntegrityError:
+            # A concurrent writer inserted the row first; ours is just as current.
+            StudentCourseSummary.objects.filter(student_id=student_id, course_id=course_id).update(**values)
+    else:
+        StudentCourseSummary.objects.filter(student_id=student_id, course_id=course_id).update(**values)
+
+
+def refresh_many(pairs, batch_size=1000):
+    """Refresh every (student_id, course_id) pair in ``pairs``.
+
+    Pairs are grouped by course, so a whole class costs three queries per
+    ``batch_size`` students: attendance totals, submission totals and one
+    upsert.
+    """
+    by_course = {}
+    for student_id, course_id in set(pairs):
+        by_course.setdefault(course_id, []).append(student_id)
+    conflict_target = ['student', 'course'] if connection.features.supports_update_conflicts_with_target else None
+    for course_id, student_ids in by_course.items():
+        student_ids.sort()
+        for start in range(0, len(student_ids), batch_size):
+            chunk = student_ids[start:start + batch_size]
+            attendance = {a['student_id']: a for a in
+                          Attendance.objects.filter(course_id=course_id, student_id__in=chunk).order_by()
+                          .values('student_id')
+                          .annotate(total=Count('id'), present=Count('id', filter=Q(status=True)), last=Max('date'))}
+            submissions = {sub['student_id']: sub for sub in
+                           Submission.objects.filter(assignment__course_id=course_id, student_id__in=chunk).order_by()
+                           .values('student_id')
+                           .annotate(graded=Count('id', filter=Q(marks_obtained__isnull=False)), marks=Sum('marks_obtained'), last=Max('submission_date'))}
+            now = timezone.now()
+            rows = []
+            for student_id in chunk:
+                att = attendance.get(student_id, {})
+                sub = submissions.get(student_id, {})
+                rows.append(StudentCourseSummary(
+                    student_id=student_id, course_id=course_id,
+                    present=att.get('present', 0), total=att.get('total', 0),
+                    graded_count=sub.get('graded', 0), marks_sum=sub.get('marks') or 0,
+                    last_activity=_latest(att.get('last'), sub.get('last')), updated_at=now,
+                ))
+            StudentCourseSummary.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=conflict_target,
+                update_fields=['present', 'total', 'graded_count', 'marks_sum', 'last_activity', 'updated_at'],
+            )
+
+
+def course_totals(course_ids):
+    """Summed summary figures per course: {course_id: {present, total, graded_count, marks_sum}}."""
+    rows = (StudentCourseSummary.objects.filter(course_id__in=list(course_ids))
+            .values('course_id')
+            .annotate(present=Sum('present'), total=Sum('total'), graded_count=Sum('graded_count'), marks_sum=Sum('marks_sum')))
+    return {r.pop('course_id'): r for r in rows}
+
+
+def rebuild_students(student_ids):
+    """Recompute all summaries of the given students from scratch (a handful of queries)."""
+    student_ids = list(student_ids)
+    summaries = {}
+
+    def row(student_id, course_id):
+        key = (student_id, course_id)
+        if key not in summaries:
+            summaries[key] = StudentCourseSummary(student_id=student_id, course_id=course_id)
+        return summaries[key]
+
+    for student_id, course_id in Enrollment.objects.filter(student_id__in=student_ids).values_list('student_id', 'course_id'):
+        row(student_id, course_id)
+
+    attendance = (Attendance.objects.filter(student_id__in=student_ids).order_by()
+                  .values('student_id', 'course_id')
+                  .annotate(total=Count('id'), present=Count('id', filter=Q(status=True)), last=Max('date')))
+    last_attendance = {}
+    for a in attendance:
+        s = row(a['student_id'], a['course_id'])
+        s.total, s.present = a['total'], a['present']
+        last_attendance[(a['student_id'], a['course_id'])] = a['last']
+
+    submissions = (Submission.objects.filter(student_id__in=student_ids).order_by()
+                   .values('student_id', 'assignment__course_id')
+                   .annotate(graded=Count('id', filter=Q(marks_obtained__isnull=False)), marks=Sum('marks_obtained'), last=Max('submission_date')))
+    last_submission = {}
+    for sub in submissions:
+        key = (sub['student_id'], sub['assignment__course_id'])
+        s = row(*key)
+        s.graded_count, s.marks_sum = sub['graded'], sub['marks'] or 0
+        last_submission[key] = sub['last']
+
+    for key, s in summaries.items():
+        s.last_activity = _latest(last_attendance.get(key), last_submission.get(key))
+        s.updated_at = timezone.now()
+
+    with transaction.atomic():
+        StudentCourseSummary.objects.filter(student_id__in=student_ids).delete()
+        StudentCourseSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+    return len(summaries)
+
+
+def rebuild(batch_size=500, stdout=None):
+    """Rebuild every profile's summaries, ``batch_size`` profiles per transaction."""
+    student_ids = list(Profile.objects.order_by('id').values_list('id', flat=True))
+    written = 0
+    for start in range(0, len(student_ids), batch_size):
+        written += rebuild_students(student_ids[start:start + batch_size])
+        if stdout is not None:
+            stdout.write(f'  {min(start + batch_size, len(student_ids))}/{len(student_ids)} profiles, {written} summaries')
+    return written
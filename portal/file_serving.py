@@ -0,0 +1,157 @@
+"""
+Serving stored files after a view's permission check.
+
+``serve(request, field_file)`` never reads the whole file into the worker:
+
+* An ETag (from the name, size and modification time) and Last-Modified
+  let a repeated request get a 304.
+* A single ``Range: bytes=...`` request gets a 206 with just that part.
+  Videos can then seek without restarting from byte 0. Several ranges, or a
+  stale ``If-Range``, get the whole file; an unsatisfiable range gets a 416.
+* The body is streamed in ``CHUNK_SIZE`` blocks.
+
+With ``settings.FILE_SERVING_OFFLOAD`` set to ``'x-accel'`` (nginx) or
+``'x-sendfile'`` (Apache, lighttpd), no bytes go through Django at all. The
+response carries only an ``X-Accel-Redirect`` (to
+``FILE_SERVING_ACCEL_PREFIX`` plus the storage name, an ``internal``
+location in nginx) or an ``X-Sendfile`` header. The proxy then sends the
+file and handles ranges itself.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+
+CHUNK_SIZE = 256 * 1024
+# Types browsers display without running anything; any other type is served as
+# a download even when inline is asked for. The type comes from the file name,
+# so image/svg+xml, text/html and XML (which can carry script) must never be added.
+INLINE_TYPES = frozenset({'application/pdf', 'image/png', 'image/jpeg', 'image/gif', 'image/webp'})
+INLINE_PREFIXES = ('video/', 'audio/')
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def guess_type(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def is_inline_safe(content_type):
+    """True for the types that may be shown in the browser rather than downloaded."""
+    content_type = content_type.split(';')[0].strip().lower()
+    return content_type in INLINE_TYPES or content_type.startswith(INLINE_PREFIXES)
+
+
+def _modified_time(field_file):
+    try:
+        return field_file.storage.get_modified_time(field_file.name)
+    except (NotImplementedError, OSError, AttributeError):
+        return None
+
+
+def _etag(field_file, size, modified):
+    raw = f'{field_file.name}:{size}:{modified.timestamp() if modified else ""}'
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single satisfiable byte range.
+
+    Returns None when the whole file should be sent (no header, several
+    ranges, syntax the server may ignore) and ``()`` when the range cannot be
+    satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip().replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return ()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return ()
+    return start, end
+
+
+def _stream(field_file, start, length):
+    field_file.open('rb')
+    try:
+        field_file.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = field_file.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        field_file.close()
+
+
+def serve(request, field_file, filename=None, content_type=None, inline=False):
+    """Response for the file of a FileField, after the caller has checked access."""
+    filename = filename or os.path.basename(field_file.name)
+    content_type = content_type or guess_type(filename)
+    inline = inline and is_inline_safe(content_type)
+    size = field_file.size
+    modified = _modified_time(field_file)
+    etag = _etag(field_file, size, modified)
+    last_modified = int(modified.timestamp()) if modified else None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    offload = getattr(settings, 'FILE_SERVING_OFFLOAD', None)
+    if offload:
+        response = HttpResponse(content_type=content_type)
+        if offload == 'x-accel':
+            prefix = getattr(settings, 'FILE_SERVING_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name)
+        else:
+            response['X-Sendfile'] = field_file.path
+    else:
+        byte_range = parse_range(request.headers.get('Range'), size)
+        if_range = request.headers.get('If-Range')
+        if byte_range is not None and if_range and if_range.strip() != etag:
+            byte_range = None
+        if byte_range == ():
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(_stream(field_file, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = StreamingHttpResponse(_stream(field_file, 0, size), content_type=content_type)
+            response['Content-Length'] = str(size)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = content_disposition_header(not inline, filename)
+    # the browser must not second-guess the type (a renamed HTML file sniffed as a page)
+    response['X-Content-Type-Options'] = 'nosniff'
+    # Access is per user: shared caches must not keep a copy
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,3 +1,4 @@
+from dateutil.rrule import rrulestr
 from django import forms
 from django.contrib.auth.models import User
 from .models import Profile
@@ -18,6 +19,15 @@ class ScheduleForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def clean_recurrence_rule(self):
+        rule = (self.cleaned_data.get('recurrence_rule') or '').strip()
+        if rule:
+            try:
+                rrulestr(rule, ignoretz=True)
+            except (ValueError, TypeError):
+                raise forms.ValidationError('Enter a valid RRULE, e.g. FREQ=WEEKLY;BYDAY=MO')
+        return rule
+
 
 class StudentCreateForm(forms.ModelForm):
     username = forms.CharField(max_length=150)
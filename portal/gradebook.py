@@ -0,0 +1,174 @@
+"""
+Course gradebook: the students x assignments matrix of marks.
+
+``Gradebook(course)`` loads the roster, the assignments and every
+(student, assignment, marks) triple of the course, one query each, and
+pivots the triples into a dense matrix. Row statistics (per student) and
+column statistics (per assignment) are computed in the same pass. The
+course CSV report and the assignment averages report are projections of
+it, and ``course_gradebook`` serves the whole matrix as JSON, streamed CSV
+or write-only XLSX.
+
+A cell is the marks of a graded submission, or None when the student has
+not submitted or the submission is not graded yet. Averages are over
+graded submissions only.
+"""
+
+import csv
+from io import BytesIO
+
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .models import Assignment, Profile, Submission
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def _blank(value):
+    return '' if value is None else value
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+class Gradebook:
+    """Marks matrix of one course, optionally limited to assignments due between ``start`` and ``end``."""
+
+    def __init__(self, course, start=None, end=None):
+        self.course = course
+        self.start = start
+        self.end = end
+
+        assignments = Assignment.objects.filter(course=course)
+        submissions = Submission.objects.filter(assignment__course=course)
+        if start:
+            assignments = assignments.filter(due_date__gte=start)
+            submissions = submissions.filter(assignment__due_date__gte=start)
+        if end:
+            assignments = assignments.filter(due_date__lte=end)
+            submissions = submissions.filter(assignment__due_date__lte=end)
+
+        self.assignments = list(assignments.order_by('due_date', 'id'))
+        self.students = list(Profile.objects.filter(enrollment__course=course)
+                             .select_related('user')
+                             .order_by('user__last_name', 'user__first_name', 'user__username', 'id'))
+
+        row_of = {s.id: i for i, s in enumerate(self.students)}
+        col_of = {a.id: j for j, a in enumerate(self.assignments)}
+        self.marks = [[None] * len(self.assignments) for _ in self.students]
+        self.submitted = [0] * len(self.assignments)
+        for student_id, assignment_id, marks in submissions.values_list('student_id', 'assignment_id', 'marks_obtained'):
+            i, j = row_of.get(student_id), col_of.get(assignment_id)
+            # submissions of students no longer enrolled are left out
+            if i is None or j is None:
+                continue
+            self.marks[i][j] = marks
+            self.submitted[j] += 1
+
+        self.row_stats = [self._row_stats(row) for row in self.marks]
+        self.column_stats = [self._column_stats(j) for j in range(len(self.assignments))]
+
+    def _row_stats(self, row):
+        graded = [(m, a.max_marks) for m, a in zip(row, self.assignments) if m is not None]
+        total = sum(m for m, _ in graded)
+        possible = sum(mx for _, mx in graded)
+        return {
+            'graded': len(graded),
+            'total': total,
+            'mean': _round(total / len(graded)) if graded else None,
+            'percentage': _round(total / possible * 100) if possible else None,
+        }
+
+    def _column_stats(self, j):
+        graded = [row[j] for row in self.marks if row[j] is not None]
+        return {
+            'submitted': self.submitted[j],
+            'graded': len(graded),
+            'mean': _round(sum(graded) / len(graded)) if graded else None,
+            'min': min(graded) if graded else None,
+            'max': max(graded) if graded else None,
+        }
+
+    # ------------------------------------------------------------------
+    # Projections
+    # ------------------------------------------------------------------
+
+    def student_rows(self):
+        """``(student, marks, row_stats)`` per enrolled student, in roster order."""
+        return zip(self.students, self.marks, self.row_stats)
+
+    def assignment_columns(self):
+        """``(assignment, column_stats)`` per assignment, in due date order."""
+        return zip(self.assignments, self.column_stats)
+
+    def rows(self):
+        """The matrix as spreadsheet rows: a header, one row per student, then per-assignment statistics."""
+        yield (['Username', 'Full name']
+               + [f'{a.title} (/{a.max_marks})' for a in self.assignments]
+               + ['Graded', 'Average', 'Percentage'])
+        for student, marks, stats in self.student_rows():
+            user = student.user
+            yield ([user.username, user.get_full_name()]
+                   + ['' if m is None else m for m in marks]
+                   + [stats['graded'], _blank(stats['mean']), _blank(stats['percentage'])])
+        for label, key in (('Average', 'mean'), ('Graded', 'graded'), ('Lowest', 'min'), ('Highest', 'max')):
+            yield [label, ''] + [_blank(c[key]) for c in self.column_stats] + ['', '', '']
+
+    def as_dict(self):
+        return {
+            'course': {'id': self.course.id, 'code': self.course.code, 'name': self.course.name},
+            'start': self.start.isoformat() if self.start else None,
+            'end': self.end.isoformat() if self.end else None,
+            'assignments': [
+                {'id': a.id, 'title': a.title, 'due_date': a.due_date.isoformat() if a.due_date else None,
+                 'max_marks': a.max_marks, **stats}
+                for a, stats in self.assignment_columns()
+            ],
+            'students': [
+                {'id': s.id, 'username': s.user.username, 'full_name': s.user.get_full_name() or s.user.username,
+                 'marks': marks, **stats}
+                for s, marks, stats in self.student_rows()
+            ],
+        }
+
+    # ------------------------------------------------------------------
+    # Responses
+    # ------------------------------------------------------------------
+
+    @property
+    def filename(self):
+        return f'course_{self.course.code}_gradebook'
+
+    def csv_response(self):
+        """The rows streamed as CSV, one line at a time."""
+        writer = csv.writer(_Echo())
+        response = StreamingHttpResponse((writer.writerow(row) for row in self.rows()),
+                                         content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.csv"'
+        return response
+
+    def xlsx_response(self):
+        """The rows as an XLSX workbook, or None when openpyxl is not installed."""
+        try:
+            from openpyxl import Workbook  # type: ignore
+        except ImportError:
+            return None
+        # write-only mode streams rows to the file instead of keeping a cell grid in memory
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=self.course.code[:31] or 'Gradebook')
+        for row in self.rows():
+            sheet.append(row)
+        out = BytesIO()
+        workbook.save(out)
+        response = HttpResponse(out.getvalue(), content_type=XLSX_CONTENT_TYPE)
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.xlsx"'
+        return response
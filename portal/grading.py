@@ -0,0 +1,149 @@
+"""
+Auto-grading of multiple choice and true/false assignments.
+
+An assignment is auto-gradable when it has questions, every question is
+``mcq`` or ``true_false`` and every question has a correct option.
+``grade(assignment)`` loads the answer key once (``AnswerKey``), then scores
+every ungraded submission in one pass over the (submission, question,
+option) triples of StudentAnswer. It writes ``marks_obtained`` back with
+``bulk_update``. Whatever the class size, that is a fixed handful of
+queries plus one UPDATE per ``BATCH_SIZE`` submissions.
+
+A question is worth its ``points``, or 1 when it has none. The score is
+scaled to ``Assignment.max_marks``. A submission without answers scores 0.
+Marks a teacher has entered are never overwritten unless ``regrade`` is
+passed. Once a submission has marks its answers are locked
+(``save_answers`` raises ``AnswersLocked``), so the marks always match the
+answers they were computed from.
+
+Bulk updates skip model signals, so ``grade`` refreshes the course
+summaries, writes the feed events and bumps the cache versions itself. The
+``grade_due_assignments`` command, run every few minutes, grades
+assignments once their due date has passed.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import activity, cache_versions, course_summary
+from .models import Assignment, Option, Question, StudentAnswer, Submission
+
+
+AUTO_GRADED_TYPES = ('mcq', 'true_false')
+BATCH_SIZE = 1000
+
+
+class AnswersLocked(ValueError):
+    """A graded submission's answers cannot be changed."""
+
+
+class AnswerKey:
+    """Points per question and the correct options of one assignment, loaded in two queries."""
+
+    def __init__(self, assignment):
+        self.assignment = assignment
+        questions = list(Question.objects.filter(assignment=assignment).values_list('id', 'qtype', 'points'))
+        self.points = {qid: (points if points and points > 0 else 1.0) for qid, _qtype, points in questions}
+        # option id -> question id, for the correct options only
+        self.correct = dict(Option.objects.filter(question__assignment=assignment, is_correct=True)
+                            .values_list('id', 'question_id'))
+        keyed = set(self.correct.values())
+        self.possible = sum(self.points.values())
+        self.gradable = bool(questions) and all(
+            qtype in AUTO_GRADED_TYPES and qid in keyed for qid, qtype, _points in questions
+        )
+
+    def score(self, question_id, option_id):
+        """Points earned by choosing ``option_id`` for ``question_id``."""
+        return self.points.get(question_id, 0) if self.correct.get(option_id) == question_id else 0
+
+    def marks(self, earned):
+        """``earned`` points scaled to the assignment's max marks, rounded half up."""
+        return int(earned / self.possible * self.assignment.max_marks + 0.5) if self.possible else 0
+
+
+def gradable_questions():
+    """Queryset filter: assignments with questions, none of them free-form."""
+    return (Exists(Question.objects.filter(assignment=OuterRef('pk')))
+            & ~Exists(Question.objects.filter(assignment=OuterRef('pk')).exclude(qtype__in=AUTO_GRADED_TYPES)))
+
+
+def due_for_grading(today=None):
+    """Published assignments past their due date with ungraded submissions and auto-gradable questions."""
+    today = today or timezone.localdate()
+    return (Assignment.objects
+            .filter(is_draft=False, due_date__lt=today)
+            .filter(gradable_questions())
+            .filter(Exists(Submission.objects.filter(assignment=OuterRef('pk'), marks_obtained__isnull=True))))
+
+
+def grade(assignment, regrade=False, batch_size=BATCH_SIZE):
+    """Score the assignment's submissions from their answers. Returns a summary dict.
+
+    Only ungraded submissions are scored unless ``regrade``. ``graded`` is
+    None when the assignment cannot be auto-graded.
+    """
+    key = AnswerKey(assignment)
+    if not key.gradable:
+        return {'graded': None, 'average': None}
+
+    with transaction.atomic():
+        submissions = Submission.objects.filter(assignment=assignment)
+        if not regrade:
+            submissions = submissions.filter(marks_obtained__isnull=True)
+        students = dict(submissions.select_for_update().values_list('id', 'student_id'))
+        if not students:
+            return {'graded': 0, 'average': None}
+
+        earned = dict.fromkeys(students, 0.0)
+        answers = (StudentAnswer.objects
+                   .filter(submission__in=submissions.values('id'), option__isnull=False)
+                   .values_list('submission_id', 'question_id', 'option_id'))
+        for submission_id, question_id, option_id in answers.iterator(chunk_size=batch_size):
+            earned[submission_id] += key.score(question_id, option_id)
+
+        marks = {sub_id: key.marks(points) for sub_id, points in earned.items()}
+        Submission.objects.bulk_update(
+            [Submission(id=sub_id, marks_obtained=m) for sub_id, m in marks.items()],
+            ['marks_obtained'], batch_size=batch_size,
+        )
+
+        by_student = {students[sub_id]: m for sub_id, m in marks.items()}
+        course_summary.refresh_many((sid, assignment.course_id) for sid in by_student)
+        activity.submissions_graded(assignment, by_student)
+        cache_versions.bump_on_write(
+            cache_versions.table_scope(Submission), cache_versions.course_scope(assignment.course_id),
+            *(cache_versions.student_scope(sid) for sid in by_student),
+        )
+
+    return {'graded': len(marks), 'average': round(sum(marks.values()) / len(marks), 2)}
+
+
+def answers_locked(submission, choices):
+    """True when ``submission`` has marks and ``choices`` would change its stored answers."""
+    if submission.marks_obtained is None or not choices:
+        return False
+    stored = dict(StudentAnswer.objects.filter(submission=submission).values_list('question_id', 'option_id'))
+    return any(stored.get(qid) != oid for qid, oid in choices.items())
+
+
+def save_answers(submission, choices):
+    """Store a submission's chosen options; ``choices`` maps question id to option id.
+
+    Options that do not belong to their question, or to this assignment, are
+    ignored. Returns the number of answers stored. Raises AnswersLocked when
+    the submission is graded and the answers differ from the graded ones.
+    """
+    if answers_locked(submission, choices):
+        raise AnswersLocked('Answers cannot be changed after the submission has been graded')
+    valid = set(Option.objects.filter(question__assignment_id=submission.assignment_id, id__in=choices.values())
+                .values_list('question_id', 'id'))
+    rows = [StudentAnswer(submission=submission, question_id=qid, option_id=oid)
+            for qid, oid in choices.items() if (qid, oid) in valid]
+    if rows:
+        StudentAnswer.objects.bulk_create(
+            rows, update_conflicts=True, update_fields=['option', 'answered_at'],
+            unique_fields=['submission', 'question'] if connection.features.supports_update_conflicts_with_target else None,
+        )
+    return len(rows)
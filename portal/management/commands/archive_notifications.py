@@ -0,0 +1,57 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from portal.models import Notification, NotificationArchive
+
+
+class Command(BaseCommand):
+    help = 'Move read notifications older than --days into NotificationArchive, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Archive read notifications older than this many days (default 90)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved per transaction (default 1000)')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        eligible = Notification.objects.filter(is_read=True, created_at__lt=cutoff).select_related(None)
+
+        if options['dry_run']:
+            count = eligible.count()
+            self.stdout.write(f'Dry run: {count} read notifications older than {cutoff:%Y-%m-%d %H:%M} would be archived')
+            return
+
+        moved = 0
+        started = time.monotonic()
+        last_id = 0
+        while True:
+            # Walk the primary key so every batch is a short range scan and
+            # each transaction only locks `batch_size` rows.
+            rows = list(eligible.filter(id__gt=last_id).order_by('id')
+                        .values_list('id', 'user_id', 'message_id', 'created_at')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            with transaction.atomic():
+                NotificationArchive.objects.bulk_create([
+                    NotificationArchive(user_id=user_id, message_id=message_id, created_at=created_at)
+                    for _, user_id, message_id, created_at in rows
+                ])
+                Notification.objects.filter(id__in=[r[0] for r in rows]).delete()
+
+            moved += len(rows)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  archived {moved} rows ({moved / elapsed if elapsed else moved:.0f} rows/sec)')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        rate = moved / elapsed if elapsed else moved
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} notifications in {elapsed:.1f}s ({rate:.0f} rows/sec)'))
@@ -0,0 +1,37 @@
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from portal import activity
+from portal.models import ActivityEvent, Assignment, Attendance, StudyMaterial, Submission
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the live-updates feed (ActivityEvent) from the last --days of attendance, submissions, assignments and materials'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='How far back to replay (default 7)')
+
+    def handle(self, *args, **options):
+        tz = timezone.get_current_timezone()
+        # Start at local midnight so attendance (stamped at the start of its day) falls inside the window.
+        first_day = timezone.localdate() - timedelta(days=options['days'])
+        since = timezone.make_aware(datetime.combine(first_day, dt_time.min), tz)
+
+        with transaction.atomic():
+            # Replace the window rather than append to it so the command can be re-run.
+            deleted, _ = ActivityEvent.objects.filter(created_at__gte=since).delete()
+
+            for att in Attendance.objects.filter(date__gte=first_day):
+                activity.attendance_saved(att, True, at=timezone.make_aware(datetime.combine(att.date, dt_time.min), tz))
+            for sub in Submission.objects.filter(submission_date__gte=since):
+                activity.submission_saved(sub, True, at=sub.submission_date)
+            for asg in Assignment.objects.filter(created_at__gte=since, is_draft=False):
+                activity.assignment_saved(asg, True, at=asg.created_at)
+            for material in StudyMaterial.objects.filter(uploaded_at__gte=since):
+                activity.material_saved(material, True, at=material.uploaded_at)
+
+        written = ActivityEvent.objects.filter(created_at__gte=since).count()
+        self.stdout.write(self.style.SUCCESS(f'Replaced {deleted} events with {written} since {since:%Y-%m-%d %H:%M}'))
@@ -0,0 +1,74 @@
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from portal.attendance_marking import mark
+from portal.models import Attendance, Course, Enrollment, Profile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time whole-roster attendance marking against per-student update_or_create on throwaway classes (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000], help='Class sizes to time (default 50 500 5000)')
+        parser.add_argument('--skip-legacy', action='store_true', help='Only time the bulk path')
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    course, student_ids = self._make_class(size)
+                    present = set(student_ids[::2])
+                    bulk = self._time(lambda: mark(course, present))
+                    remark = self._time(lambda: mark(course, set(student_ids[1::2])))
+                    legacy = None if options['skip_legacy'] else self._time(lambda: self._legacy(course, student_ids, present))
+                    raise Rollback
+            except Rollback:
+                pass
+            line = f'{size:>6} students: bulk {bulk[0]:.3f}s/{bulk[1]}q, re-mark {remark[0]:.3f}s/{remark[1]}q'
+            if legacy:
+                line += f', update_or_create {legacy[0]:.3f}s/{legacy[1]}q'
+            self.stdout.write(line)
+
+    def _make_class(self, size):
+        tag = uuid.uuid4().hex[:8]
+        prefix = f'bench-{tag}-'
+        teacher = User.objects.create(username=f'{prefix}teacher').profile
+        teacher.role = 'teacher'
+        teacher.save()
+        course = Course.objects.create(name='Attendance benchmark', code=f'B{tag}', teacher=teacher)
+        # bulk_create skips the signal that creates profiles, so they are created here
+        User.objects.bulk_create([User(username=f'{prefix}{i}') for i in range(size)], batch_size=1000)
+        users = User.objects.filter(username__startswith=prefix).exclude(pk=teacher.user_id).values_list('id', flat=True)
+        Profile.objects.bulk_create([Profile(user_id=uid, role='student') for uid in users], batch_size=1000)
+        student_ids = list(Profile.objects.filter(user__username__startswith=prefix, role='student').values_list('id', flat=True))
+        Enrollment.objects.bulk_create([Enrollment(student_id=sid, course=course) for sid in student_ids], batch_size=1000)
+        return course, student_ids
+
+    def _legacy(self, course, student_ids, present):
+        # what take_attendance used to do: two queries (and all signals) per student
+        Attendance.objects.filter(course=course).delete()
+        for sid in student_ids:
+            Attendance.objects.update_or_create(student_id=sid, course=course, date=Attendance._meta.get_field('date').get_default(),
+                                                defaults={'status': sid in present})
+
+    def _time(self, func):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        return elapsed, queries
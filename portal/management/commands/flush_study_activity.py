@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.study_activity import FLUSH_BATCH, buffer_available, buffered, flush, prune
+
+
+class Command(BaseCommand):
+    help = 'Write buffered page/API activity to StudyEvent and refresh the hourly StudyHour rollups (run every minute)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=FLUSH_BATCH, help=f'Events written per transaction (default {FLUSH_BATCH})')
+        parser.add_argument('--prune-days', type=int, default=0, help='Also delete raw events older than this many days (rollups are kept)')
+
+    def handle(self, *args, **options):
+        if not buffer_available():
+            self.stderr.write(self.style.WARNING('The default cache is not shared between processes; '
+                                                 'nothing is buffered. Set REDIS_URL to record study activity.'))
+        started = time.monotonic()
+        pending = buffered()
+        written = flush(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed {written} of {pending} buffered events in {time.monotonic() - started:.1f}s'))
+        if options['prune_days']:
+            self.stdout.write(f"Pruned {prune(options['prune_days'])} events older than {options['prune_days']} days")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.grading import BATCH_SIZE, due_for_grading, grade
+from portal.models import Assignment
+
+
+class Command(BaseCommand):
+    help = 'Auto-grade the multiple choice submissions of assignments past their due date (run every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assignment', type=int, action='append', help='Grade only this assignment id (repeatable), due or not')
+        parser.add_argument('--regrade', action='store_true', help='Also re-score submissions that already have marks')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['assignment']:
+            assignments = Assignment.objects.filter(id__in=options['assignment'])
+        else:
+            assignments = due_for_grading()
+
+        total = 0
+        for assignment in assignments.select_related('course'):
+            started = time.monotonic()
+            result = grade(assignment, regrade=options['regrade'], batch_size=options['batch_size'])
+            if result['graded'] is None:
+                self.stdout.write(self.style.WARNING(f'{assignment}: not auto-gradable, skipped'))
+                continue
+            total += result['graded']
+            self.stdout.write(f"{assignment}: graded {result['graded']} submission(s), "
+                              f"average {result['average']} in {time.monotonic() - started:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f'Graded {total} submission(s)'))
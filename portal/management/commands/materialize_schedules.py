@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.models import Schedule
+from portal.recurrence import HORIZON_DAYS, regenerate_many
+
+
+class Command(BaseCommand):
+    help = f'Rewrite ScheduleOccurrence rows of every schedule up to {HORIZON_DAYS} days ahead (run daily)'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = regenerate_many(Schedule.objects.iterator())
+        self.stdout.write(self.style.SUCCESS(f'Materialized {written} occurrences in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from portal.chunked_upload import SESSION_TTL, purge
+
+
+class Command(BaseCommand):
+    help = f'Remove chunked uploads idle for more than {SESSION_TTL} and their partial files (run hourly)'
+
+    def handle(self, *args, **options):
+        removed = purge()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} abandoned upload(s)'))
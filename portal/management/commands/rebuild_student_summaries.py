@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.course_summary import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute StudentCourseSummary from Attendance and Submission, a batch of profiles at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Profiles rebuilt per transaction (default 500)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = rebuild(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} summaries in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from portal.models import Notification
+from portal.notification_service import UNREAD_TTL, unread_cache_key
+
+
+class Command(BaseCommand):
+    help = 'Compare cached unread notification counts with the database and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only reconcile this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = options['users'] or list(User.objects.order_by('id').values_list('id', flat=True))
+
+        checked = fixed = 0
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            exact = dict(
+                Notification.objects.filter(user_id__in=chunk, is_read=False)
+                .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n')
+            )
+            cached = cache.get_many([unread_cache_key(uid) for uid in chunk])
+
+            repairs = {}
+            for uid in chunk:
+                key = unread_cache_key(uid)
+                # Users without a cached value are recounted on their next read.
+                if key in cached and cached[key] != exact.get(uid, 0):
+                    repairs[key] = exact.get(uid, 0)
+            if repairs:
+                cache.set_many(repairs, UNREAD_TTL)
+            checked += len(chunk)
+            fixed += len(repairs)
+
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} users, repaired {fixed} unread counters'))
@@ -0,0 +1,37 @@
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from portal.reminders import BATCH_SIZE, ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = 'Long-running worker that sends Schedule reminders reminder_minutes before each occurrence'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f'Reminders claimed per transaction (default {BATCH_SIZE})')
+        parser.add_argument('--once', action='store_true', help='Send what is due now and exit (for cron)')
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler(batch_size=options['batch_size'], stdout=self.stdout)
+        if options['once']:
+            scheduler.refresh()
+            scheduler.run_pending()
+            self.stdout.write(self.style.SUCCESS(f'Sent {scheduler.sent} reminder(s)'))
+            return
+
+        self.stdout.write('Sending schedule reminders (Ctrl+C to stop)')
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    scheduler.tick()
+                except Exception:
+                    # a database hiccup must not end the worker; retry from a fresh refresh
+                    traceback.print_exc()
+                    scheduler.next_refresh = None
+                    time.sleep(5)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS(f'Stopped after sending {scheduler.sent} reminder(s)'))
@@ -0,0 +1,27 @@
+import traceback
+
+from . import study_activity
+
+
+class StudyActivityMiddleware:
+    """Buffer page views and actions of signed-in users for study analytics.
+
+    Only appends to the cache buffer of ``portal.study_activity``; no query
+    is added to the request. Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            try:
+                kind = study_activity.classify(request, response)
+                if kind:
+                    study_activity.record(user.pk, kind, request.path)
+            except Exception:
+                # analytics must never break a request
+                traceback.print_exc()
+        return response
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+BATCH_SIZE = 1000
+
+
+def split_messages(apps, schema_editor):
+    """Collapse identical (title, message) rows into one NotificationMessage each.
+
+    Works through the distinct pairs a batch at a time, grouped in the
+    database, and links each group with one UPDATE, so no id lists are held
+    in memory. Each pass only looks at rows not linked yet; MySQL groups long
+    TEXT values by a prefix, so rows a group's exact-match UPDATE left out
+    are picked up by a later pass.
+    """
+    Notification = apps.get_model('portal', 'Notification')
+    NotificationMessage = apps.get_model('portal', 'NotificationMessage')
+
+    while True:
+        groups = list(Notification.objects.filter(message_ref__isnull=True)
+                      .values('title', 'legacy_message')
+                      .annotate(first_sent=Min('created_at'), recipients=Count('id'))
+                      .order_by('title', 'legacy_message')[:BATCH_SIZE])
+        if not groups:
+            break
+        for group in groups:
+            title, body = group['title'], group['legacy_message']
+            msg = NotificationMessage.objects.create(title=title, body=body, recipient_count=group['recipients'])
+            linked = (Notification.objects
+                      .filter(message_ref__isnull=True, title=title, legacy_message=body)
+                      .update(message_ref=msg.pk))
+            # auto_now_add stamped "now"; keep the original send time instead.
+            NotificationMessage.objects.filter(pk=msg.pk).update(created_at=group['first_sent'], recipient_count=linked)
+
+
+def join_messages(apps, schema_editor):
+    Notification = apps.get_model('portal', 'Notification')
+    NotificationMessage = apps.get_model('portal', 'NotificationMessage')
+
+    for msg in NotificationMessage.objects.iterator(chunk_size=BATCH_SIZE):
+        Notification.objects.filter(message_ref=msg.pk).update(title=msg.title, legacy_message=msg.body)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0014_notificationmessage'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_messages, join_messages),
+    ]
@@ -0,0 +1,41 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0015_populate_notificationmessage'),
+    ]
+
+    operations = [
+        # Defaults only so the columns can be re-added when migrating backwards.
+        migrations.AlterField(
+            model_name='notification',
+            name='title',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='legacy_message',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='title',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='legacy_message',
+        ),
+        migrations.RenameField(
+            model_name='notification',
+            old_name='message_ref',
+            new_name='message',
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='message',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='portal.notificationmessage'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0017_notificationarchive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', 'course', 'status'], name='attendance_stu_course_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['course', 'date'], name='attendance_course_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialtransaction',
+            index=models.Index(fields=['created_at'], name='fintx_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', 'created_at'], name='notif_user_read_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role'], name='profile_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staffattendance',
+            index=models.Index(fields=['timestamp'], name='staffatt_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staffdailyattendance',
+            index=models.Index(fields=['date', 'status'], name='staffdaily_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['student', 'assignment', 'marks_obtained'], name='submission_stu_asg_marks_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def populate(apps, schema_editor):
+    """Initial fill; afterwards signals keep the table current."""
+    Attendance = apps.get_model('portal', 'Attendance')
+    Submission = apps.get_model('portal', 'Submission')
+    StudentCourseSummary = apps.get_model('portal', 'StudentCourseSummary')
+
+    rows = {}
+    for a in (Attendance.objects.order_by().values('student_id', 'course_id')
+              .annotate(total=Count('id'), present=Count('id', filter=Q(status=True)))):
+        s = rows.setdefault((a['student_id'], a['course_id']), StudentCourseSummary(student_id=a['student_id'], course_id=a['course_id']))
+        s.total, s.present = a['total'], a['present']
+    for sub in (Submission.objects.order_by().values('student_id', 'assignment__course_id')
+                .annotate(graded=Count('id', filter=Q(marks_obtained__isnull=False)), marks=Sum('marks_obtained'))):
+        key = (sub['student_id'], sub['assignment__course_id'])
+        s = rows.setdefault(key, StudentCourseSummary(student_id=key[0], course_id=key[1]))
+        s.graded_count, s.marks_sum = sub['graded'], sub['marks'] or 0
+    StudentCourseSummary.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0019_chatthread_chatmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentCourseSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('graded_count', models.PositiveIntegerField(default=0)),
+                ('marks_sum', models.BigIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_summaries', to='portal.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_summaries', to='portal.profile')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='studentcoursesummary',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='summary_student_course_uniq'),
+        ),
+        # last_activity is filled in by `manage.py rebuild_student_summaries`.
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
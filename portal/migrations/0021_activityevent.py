@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0020_studentcoursesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('attendance', 'Attendance'), ('performance', 'Performance'), ('submission', 'Submission'), ('assignment', 'Assignment'), ('material', 'Material')], max_length=20)),
+                ('title', models.CharField(max_length=255)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('status', models.BooleanField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='portal.course')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_events', to='portal.profile')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['recipient', 'created_at', 'id'], name='activity_recipient_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from datetime import datetime, time, timedelta
+
+from dateutil.rrule import rrulestr
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+# A frozen copy of the expansion in portal.recurrence at the time of this
+# migration, so later changes to that module do not change it.
+HORIZON_DAYS = 180
+MAX_OCCURRENCES = 1000
+
+
+def occurrence_dates(schedule, start, end):
+    rule = (schedule.recurrence_rule or '').strip()
+    if schedule.is_recurring and rule:
+        try:
+            dtstart = datetime.combine(schedule.date, time.min)
+            dates = []
+            for dt in rrulestr(rule, dtstart=dtstart, ignoretz=True):
+                if dt.date() > end or len(dates) >= MAX_OCCURRENCES:
+                    break
+                if dt.date() >= start and (not dates or dates[-1] != dt.date()):
+                    dates.append(dt.date())
+            return dates
+        except (ValueError, TypeError):
+            pass
+    # one-off schedules are materialized however far ahead they are
+    return [schedule.date] if schedule.date >= start else []
+
+
+def populate(apps, schema_editor):
+    """Initial fill; afterwards Schedule saves and materialize_schedules keep it current."""
+    Schedule = apps.get_model('portal', 'Schedule')
+    ScheduleOccurrence = apps.get_model('portal', 'ScheduleOccurrence')
+    today = timezone.localdate()
+    start, end = today - timedelta(days=today.weekday()), today + timedelta(days=HORIZON_DAYS)
+    rows = []
+    for schedule in Schedule.objects.filter(is_active=True).iterator():
+        rows.extend(
+            ScheduleOccurrence(schedule_id=schedule.id, date=day, start_time=schedule.start_time,
+                               end_time=schedule.end_time, course_id=schedule.course_id, is_public=schedule.is_public)
+            for day in occurrence_dates(schedule, start, end)
+        )
+    ScheduleOccurrence.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0021_activityevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('is_public', models.BooleanField(default=False)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='portal.course')),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='portal.schedule')),
+            ],
+            options={
+                'ordering': ['date', 'start_time'],
+                'indexes': [models.Index(fields=['date', 'start_time'], name='occurrence_date_idx'), models.Index(fields=['course', 'date'], name='occurrence_course_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scheduleoccurrence',
+            constraint=models.UniqueConstraint(fields=('schedule', 'date'), name='occurrence_schedule_date_uniq'),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
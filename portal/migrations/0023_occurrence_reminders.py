@@ -0,0 +1,56 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# A frozen copy of portal.recurrence.remind_at at the time of this migration
+def remind_at(schedule, day):
+    if not schedule.notify_students or schedule.reminder_minutes is None or schedule.reminder_minutes < 0:
+        return None
+    try:
+        zone = ZoneInfo(schedule.timezone) if schedule.timezone else timezone.get_current_timezone()
+    except (ValueError, ZoneInfoNotFoundError):
+        zone = timezone.get_current_timezone()
+    starts = datetime.combine(day, schedule.start_time or time.min).replace(tzinfo=zone)
+    return starts - timedelta(minutes=schedule.reminder_minutes)
+
+
+def populate(apps, schema_editor):
+    """Due times for the occurrences that already exist; only future reminders matter."""
+    ScheduleOccurrence = apps.get_model('portal', 'ScheduleOccurrence')
+    now = timezone.now()
+    rows = []
+    for occurrence in ScheduleOccurrence.objects.filter(date__gte=timezone.localdate()).select_related('schedule').iterator():
+        occurrence.remind_at = remind_at(occurrence.schedule, occurrence.date)
+        if occurrence.remind_at is not None and occurrence.remind_at < now:
+            # already past: count it as sent rather than reminding late
+            occurrence.reminder_sent_at = now
+        rows.append(occurrence)
+    ScheduleOccurrence.objects.bulk_update(rows, ['remind_at', 'reminder_sent_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0022_scheduleoccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduleoccurrence',
+            name='remind_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduleoccurrence',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleoccurrence',
+            index=models.Index(fields=['reminder_sent_at', 'remind_at'], name='occurrence_remind_idx'),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
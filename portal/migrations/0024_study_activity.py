@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('portal', '0023_occurrence_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyHour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('active_seconds', models.PositiveIntegerField(default=0)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_hours', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudyEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('page', 'Page view'), ('action', 'Action')], max_length=10)),
+                ('path', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='studyhour',
+            constraint=models.UniqueConstraint(fields=('user', 'hour'), name='studyhour_user_hour_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='studyevent',
+            index=models.Index(fields=['user', 'created_at'], name='studyevent_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studyevent',
+            index=models.Index(fields=['created_at'], name='studyevent_created_idx'),
+        ),
+    ]
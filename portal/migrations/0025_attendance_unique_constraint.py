@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0024_study_activity'),
+    ]
+
+    operations = [
+        # add the named constraint before dropping the unnamed one so the rows are never unguarded
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('student', 'course', 'date'), name='attendance_student_course_date_uniq'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='attendance',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+    ]
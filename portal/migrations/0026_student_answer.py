@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0025_attendance_unique_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answered_at', models.DateTimeField(auto_now=True)),
+                ('option', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='portal.option')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='portal.question')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='portal.submission')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='studentanswer',
+            constraint=models.UniqueConstraint(fields=('submission', 'question'), name='answer_submission_question_uniq'),
+        ),
+    ]
@@ -11,8 +11,8 @@ except Exception:
     np = None
     LinearRegression = None
 
-from django.db.models import Avg
-from .models import Attendance, Submission, Profile
+from .models import Profile
+from .student_stats import StudentStats
 
 
 class PerformancePredictor:
@@ -31,21 +31,12 @@ class PerformancePredictor:
         self.trained = False
 
     def get_student_data(self, student_profile):
-        # Attendance percentage
-        total_attendance = Attendance.objects.filter(student=student_profile).count()
-        present_count = Attendance.objects.filter(student=student_profile, status=True).count()
-        attendance_percent = (present_count / total_attendance * 100) if total_attendance > 0 else 0
-
-        # Average marks
-        submissions = Submission.objects.filter(student=student_profile).exclude(marks_obtained__isnull=True)
-        avg_marks = submissions.aggregate(Avg('marks_obtained'))['marks_obtained__avg'] or 0
-
-        total_assignments = submissions.count()
-
+        # Read the student's per-course summary rows instead of scanning history
+        stats = StudentStats(student_profile)
         return {
-            'attendance_percent': attendance_percent,
-            'avg_marks': avg_marks,
-            'assignments_completed': total_assignments,
+            'attendance_percent': stats.attendance_percentage,
+            'avg_marks': stats.avg_marks or 0,
+            'assignments_completed': stats.graded_count,
         }
 
     def train_model(self):
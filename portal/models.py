@@ -1,6 +1,8 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.text import slugify
@@ -23,6 +25,9 @@ class Profile(models.Model):
     # New fields for student management
     student_class = models.CharField(max_length=50, blank=True, null=True)
     roll_number = models.CharField(max_length=20, blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['role'], name='profile_role_idx')]
     
     def __str__(self):
         return f"{self.user.username} - {self.role}"
@@ -78,11 +83,16 @@ class Attendance(models.Model):
         limit_choices_to={'role': 'student'}
     )
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=timezone.localdate)
     status = models.BooleanField(default=False)  # True = Present, False = Absent
     
     class Meta:
-        unique_together = ['student', 'course', 'date']
+        # the conflict target of the roster upsert in portal.attendance_marking
+        constraints = [models.UniqueConstraint(fields=['student', 'course', 'date'], name='attendance_student_course_date_uniq')]
+        indexes = [
+            models.Index(fields=['student', 'course', 'status'], name='attendance_stu_course_st_idx'),
+            models.Index(fields=['course', 'date'], name='attendance_course_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.user.username} - {self.course.code} - {self.date}"
@@ -122,11 +132,45 @@ class Submission(models.Model):
     
     class Meta:
         unique_together = ['assignment', 'student']
+        indexes = [
+            # Covers the per-student "graded submissions" lookups.
+            models.Index(fields=['student', 'assignment', 'marks_obtained'], name='submission_stu_asg_marks_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.user.username} - {self.assignment.title}"
 
 
+class StudentCourseSummary(models.Model):
+    """Running attendance/marks totals for one student in one course.
+
+    Kept current by ``portal.course_summary`` (signals on Attendance and
+    Submission); rebuilt from scratch with ``manage.py rebuild_student_summaries``.
+    """
+    student = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='course_summaries')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_summaries')
+    present = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    graded_count = models.PositiveIntegerField(default=0)
+    marks_sum = models.BigIntegerField(default=0)
+    last_activity = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['student', 'course'], name='summary_student_course_uniq')]
+
+    @property
+    def avg_marks(self):
+        return (self.marks_sum / self.graded_count) if self.graded_count else None
+
+    @property
+    def attendance_percentage(self):
+        return (self.present / self.total * 100) if self.total else 0
+
+    def __str__(self):
+        return f"{self.student_id} / {self.course_id}: {self.present}/{self.total}"
+
+
 class AssignmentAttachment(models.Model):
     """Files or images attached to an assignment. Teachers may upload multiple files."""
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='attachments')
@@ -173,18 +217,197 @@ class Option(models.Model):
         return f"Option {self.order} for Q{self.question.order}: {self.text[:40]}"
 
 
+class StudentAnswer(models.Model):
+    """A student's chosen option for one question of a submission; graded by portal.grading."""
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='answers')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers')
+    option = models.ForeignKey(Option, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    answered_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['submission', 'question'], name='answer_submission_question_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.submission} - Q{self.question_id}: {self.option_id}"
+
+
+class NotificationMessage(models.Model):
+    """Title and body of a notification, stored once per broadcast."""
+    title = models.CharField(max_length=200)
+    body = models.TextField()
+    sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sent_notifications')
+    recipient_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        # Templates render ``{{ notification.message }}`` directly.
+        return self.body
+
+
+class NotificationManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().select_related('message')
+
+
 class Notification(models.Model):
+    """Per-user delivery of a NotificationMessage."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    title = models.CharField(max_length=200)
-    message = models.TextField()
+    message = models.ForeignKey(NotificationMessage, on_delete=models.CASCADE, related_name='deliveries')
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
-    
+
+    objects = NotificationManager()
+
     class Meta:
         ordering = ['-created_at']
-    
+        indexes = [models.Index(fields=['user', 'is_read', 'created_at'], name='notif_user_read_created_idx')]
+
+    @property
+    def title(self):
+        return self.message.title
+
+    @property
+    def body(self):
+        return self.message.body
+
+    def __str__(self):
+        return f"{self.user.username} - {self.title}"
+
+
+class NotificationArchive(models.Model):
+    """Read notifications moved out of Notification by ``archive_notifications``."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    message = models.ForeignKey(NotificationMessage, on_delete=models.CASCADE, related_name='archived_deliveries')
+    created_at = models.DateTimeField()
+
+    objects = NotificationManager()
+
+    # Archived rows were read before they were moved.
+    is_read = True
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at'])]
+
+    @property
+    def title(self):
+        return self.message.title
+
+    @property
+    def body(self):
+        return self.message.body
+
+    def __str__(self):
+        return f"{self.user.username} - {self.title} (archived)"
+
+
+class ChatThread(models.Model):
+    """Direct conversation between two users. ``user_a`` always holds the lower user id."""
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user_a', 'user_b'], name='chatthread_pair_uniq')]
+
+    def __str__(self):
+        return f"Chat {self.user_a_id} <-> {self.user_b_id}"
+
+
+class ChatMessage(models.Model):
+    thread = models.ForeignKey(ChatThread, on_delete=models.CASCADE, related_name='messages')
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [models.Index(fields=['thread', 'created_at', 'id'], name='chatmsg_thread_created_idx')]
+
+    def __str__(self):
+        return f"{self.sender_id}: {self.body[:50]}"
+
+
+class ActivityEvent(models.Model):
+    """One entry in a profile's live-updates feed.
+
+    Append-only and fanned out on write: a course-wide event (new assignment,
+    new material) gets one row per enrolled student, so reading a feed is a
+    single range scan on (recipient, created_at, id). Written by
+    ``portal.activity``.
+    """
+    KIND_CHOICES = [
+        ('attendance', 'Attendance'),
+        ('performance', 'Performance'),
+        ('submission', 'Submission'),
+        ('assignment', 'Assignment'),
+        ('material', 'Material'),
+    ]
+
+    recipient = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='activity_events')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    title = models.CharField(max_length=255)
+    detail = models.CharField(max_length=255, blank=True)
+    # Percentage for 'performance', present/absent for 'attendance'
+    score = models.FloatField(null=True, blank=True)
+    status = models.BooleanField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [models.Index(fields=['recipient', 'created_at', 'id'], name='activity_recipient_created_idx')]
+
+    def __str__(self):
+        return f"{self.recipient_id} [{self.kind}] {self.title}"
+
+
+class StudyEvent(models.Model):
+    """A page view or action of a signed-in user, for study analytics.
+
+    Written in bulk from the cache buffer of ``portal.study_activity``, never
+    from the request itself.
+    """
+    KIND_CHOICES = [
+        ('page', 'Page view'),
+        ('action', 'Action'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    path = models.CharField(max_length=200)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='studyevent_user_created_idx'),
+            models.Index(fields=['created_at'], name='studyevent_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.path}"
+
+
+class StudyHour(models.Model):
+    """Hourly study rollup of one user, rebuilt from StudyEvent by ``portal.study_activity``."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='study_hours')
+    hour = models.DateTimeField()
+    events = models.PositiveIntegerField(default=0)
+    # Time between consecutive events of a session, capped, attributed to the hour of the earlier one
+    active_seconds = models.PositiveIntegerField(default=0)
+    sessions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'hour'], name='studyhour_user_hour_uniq')]
+
     def __str__(self):
-        return f"{self.user.username} - {self.title}"# Database
+        return f"{self.user_id} @ {self.hour:%Y-%m-%d %H:00}"
 
 
 class StudyMaterial(models.Model):
@@ -199,6 +422,31 @@ class StudyMaterial(models.Model):
         return f"{self.course.code} - {self.title}"
 
 
+class UploadSession(models.Model):
+    """A resumable chunked upload in progress; see ``portal.chunked_upload``."""
+    PURPOSE_CHOICES = [
+        ('material', 'Study material'),
+        ('submission', 'Assignment submission'),
+        ('attachment', 'Assignment attachment'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    # Course id for materials, assignment id for submissions and attachments
+    target_id = models.PositiveIntegerField()
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    # Bytes received so far; the next chunk must start here
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.purpose} upload {self.filename} ({self.offset}/{self.size})"
+
+
 class Feedback(models.Model):
     student = models.ForeignKey(Profile, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
     course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True)
@@ -283,6 +531,9 @@ class FinancialTransaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     balance_after = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at'], name='fintx_created_idx')]
+
     def __str__(self):
         return f"{self.trans_type} {self.amount} ({self.title})"
 
@@ -299,6 +550,7 @@ class StaffAttendance(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [models.Index(fields=['timestamp'], name='staffatt_timestamp_idx')]
 
     def __str__(self):
         who = self.recognized_username or (self.staff.profile.user.username if self.staff and getattr(self.staff, 'profile', None) else 'unknown')
@@ -323,6 +575,7 @@ class StaffDailyAttendance(models.Model):
     class Meta:
         ordering = ['-date', '-timestamp']
         unique_together = (('staff', 'date'),)
+        indexes = [models.Index(fields=['date', 'status'], name='staffdaily_date_status_idx')]
 
     def __str__(self):
         who = getattr(self.staff, 'profile', None) and getattr(self.staff.profile, 'user', None)
@@ -332,20 +585,20 @@ class StaffDailyAttendance(models.Model):
 
 # Simple schedule/events model for teachers to post class schedules or events
 class ScheduleManager(models.Manager):
-    def upcoming_for_student(self, profile):
-        # Returns public schedules or those tied to student's enrolled courses from today onwards
-        enrollments = Enrollment.objects.filter(student=profile).values_list('course_id', flat=True)
-        today = timezone.localdate()
-        return self.filter(
-            models.Q(is_active=True),
-            models.Q(date__gte=today),
-            models.Q(is_public=True) | models.Q(course_id__in=list(enrollments))
-        ).order_by('date', 'start_time')
+    def upcoming_for_student(self, profile, course_ids=None):
+        # Returns public schedules or those tied to student's enrolled courses that
+        # still have an occurrence today or later (recurring series included).
+        # Callers that already know the enrolled course ids can pass them to skip the lookup.
+        if course_ids is None:
+            course_ids = Enrollment.objects.filter(student=profile).values_list('course_id', flat=True)
+        upcoming = ScheduleOccurrence.objects.upcoming_for_student(profile, course_ids=course_ids)
+        return self.filter(id__in=upcoming.values('schedule_id')).order_by('date', 'start_time')
 
     def upcoming_for_teacher(self, profile):
-        # Returns schedules created by the teacher
+        # Returns schedules created by the teacher that still have an occurrence today or later
         today = timezone.localdate()
-        return self.filter(created_by=profile, is_active=True, date__gte=today).order_by('date', 'start_time')
+        upcoming = ScheduleOccurrence.objects.filter(date__gte=today, schedule__created_by=profile)
+        return self.filter(id__in=upcoming.values('schedule_id')).order_by('date', 'start_time')
 
 
 class Tag(models.Model):
@@ -406,6 +659,53 @@ class Schedule(models.Model):
         return f"{self.title} @ {self.date} ({self.course.code if self.course else 'General'})"
 
 
+class ScheduleOccurrenceManager(models.Manager):
+    def between(self, start, end):
+        return self.filter(date__gte=start, date__lte=end).order_by('date', 'start_time')
+
+    def upcoming_for_student(self, profile, course_ids=None):
+        # Occurrences of public schedules or of the student's courses from today onwards
+        if course_ids is None:
+            course_ids = Enrollment.objects.filter(student=profile).values_list('course_id', flat=True)
+        return self.filter(
+            models.Q(date__gte=timezone.localdate()),
+            models.Q(is_public=True) | models.Q(course_id__in=list(course_ids))
+        ).order_by('date', 'start_time')
+
+
+class ScheduleOccurrence(models.Model):
+    """One dated instance of an active Schedule (see portal.recurrence).
+
+    Rows are materialized from the schedule's date and RRULE up to a rolling
+    horizon and rewritten whenever their schedule is saved. ``course`` and
+    ``is_public`` are copied from the schedule so that calendar reads are a
+    date range on one indexed table.
+    """
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='occurrences')
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    is_public = models.BooleanField(default=False)
+    # When the reminder is due (null: the schedule sends none) and when it was sent (see portal.reminders)
+    remind_at = models.DateTimeField(null=True, blank=True)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ScheduleOccurrenceManager()
+
+    class Meta:
+        ordering = ['date', 'start_time']
+        constraints = [models.UniqueConstraint(fields=['schedule', 'date'], name='occurrence_schedule_date_uniq')]
+        indexes = [
+            models.Index(fields=['date', 'start_time'], name='occurrence_date_idx'),
+            models.Index(fields=['course', 'date'], name='occurrence_course_date_idx'),
+            models.Index(fields=['reminder_sent_at', 'remind_at'], name='occurrence_remind_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.schedule.title} @ {self.date}"
+
+
 # When a schedule is created and notify_students=True, create Notification entries for affected students
 @receiver(post_save, sender=Schedule)
 def schedule_post_save(sender, instance, created, **kwargs):
@@ -420,28 +720,18 @@ def schedule_post_save(sender, instance, created, **kwargs):
         return  # Only if enabled
     
     try:
-        # Collect target users: students and teachers depending on course/public
-        targets = set()
-        
+        from .notification_service import course_recipients, role_recipients, dispatch
+
+        # Resolve target users: students and teachers depending on course/public
         if instance.course:
-            # Students enrolled in the course
-            enrollments = Enrollment.objects.filter(course=instance.course).select_related('student__user')
-            for e in enrollments:
-                if getattr(e.student, 'user', None):
-                    targets.add(e.student.user)
-            
-            # Include the course teacher if available
-            teacher_profile = getattr(instance.course, 'teacher', None)
-            if teacher_profile and getattr(teacher_profile, 'user', None):
-                targets.add(teacher_profile.user)
-        
+            # Students enrolled in the course plus the course teacher
+            targets = course_recipients(instance.course, include_teacher=True)
         elif instance.is_public:
             # Broadcast to all students and teachers
-            profiles = Profile.objects.filter(role__in=['student', 'teacher']).select_related('user')
-            for p in profiles:
-                if getattr(p, 'user', None):
-                    targets.add(p.user)
-        
+            targets = role_recipients(['student', 'teacher'])
+        else:
+            return
+
         # Build notification message
         title = f"📅 Schedule: {instance.title}"
         msg = f"{instance.title} on {instance.date}"
@@ -451,26 +741,96 @@ def schedule_post_save(sender, instance, created, **kwargs):
             msg += f" ({instance.course.code})"
         else:
             msg += " (Public Event)"
-        
-        # Create notifications for all targets
-        notifications_created = 0
-        for u in targets:
-            try:
-                Notification.objects.create(
-                    user=u, 
-                    title=title, 
-                    message=msg,
-                    is_read=False
-                )
-                notifications_created += 1
-            except Exception as e:
-                print(f"Failed to create notification for user {u}: {e}")
-                continue
-        
+
+        notifications_created = dispatch(targets, title, msg)
         print(f"✓ Schedule notifications sent: {notifications_created} users notified")
         
     except Exception as e:
         # Do not allow notification failures to break schedule save
         print(f"Error in schedule_post_save: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+
+
+# Keep each schedule's materialized occurrences in step with the schedule itself.
+@receiver(post_save, sender=Schedule)
+def schedule_occurrences(sender, instance, **kwargs):
+    from .recurrence import regenerate
+    regenerate(instance)
+
+
+# Keep StudentCourseSummary in step with attendance and submission writes.
+# Deletes only update an existing summary so cascading deletes of a course or
+# student never re-create a row that is itself being deleted.
+@receiver(post_save, sender=Attendance)
+def attendance_summary_save(sender, instance, **kwargs):
+    from .course_summary import refresh
+    refresh(instance.student_id, instance.course_id)
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_summary_delete(sender, instance, **kwargs):
+    from .course_summary import refresh
+    refresh(instance.student_id, instance.course_id, create=False)
+
+
+@receiver(post_save, sender=Submission)
+def submission_summary_save(sender, instance, **kwargs):
+    from .course_summary import refresh
+    refresh(instance.student_id, instance.assignment.course_id)
+
+
+@receiver(post_delete, sender=Submission)
+def submission_summary_delete(sender, instance, **kwargs):
+    from .course_summary import refresh
+    course_id = Assignment.objects.filter(pk=instance.assignment_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        refresh(instance.student_id, course_id, create=False)
+
+
+# Live-updates feed (see portal.activity). pre_save remembers the fields whose
+# change is itself an event, so re-saving an unchanged row records nothing.
+@receiver(pre_save, sender=Attendance)
+@receiver(pre_save, sender=Submission)
+@receiver(pre_save, sender=Assignment)
+def activity_remember_previous(sender, instance, **kwargs):
+    from .activity import remember_previous
+    remember_previous(instance)
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_activity(sender, instance, created, **kwargs):
+    from .activity import attendance_saved
+    attendance_saved(instance, created)
+
+
+@receiver(post_save, sender=Submission)
+def submission_activity(sender, instance, created, **kwargs):
+    from .activity import submission_saved
+    submission_saved(instance, created)
+
+
+@receiver(post_save, sender=Assignment)
+def assignment_activity(sender, instance, created, **kwargs):
+    from .activity import assignment_saved
+    assignment_saved(instance, created)
+
+
+@receiver(post_save, sender=StudyMaterial)
+def material_activity(sender, instance, created, **kwargs):
+    from .activity import material_saved
+    material_saved(instance, created)
+
+
+# Version-keyed response caches (see portal.cache_versions): any write to these
+# models makes the cached payloads built from it stale. The admin models are
+# here for the table versions the dashboard poll stamps read (portal.conditional).
+def cache_versions_changed(sender, instance, **kwargs):
+    from .cache_versions import bump_for
+    bump_for(instance)
+
+
+for _model in (Course, Enrollment, Attendance, Assignment, Submission, StudyMaterial, Schedule,
+               User, Profile, StaffMember, FeePayment, StudentPayout, FinancialTransaction, StaffAttendance):
+    post_save.connect(cache_versions_changed, sender=_model, dispatch_uid=f'cache_versions_save_{_model.__name__}')
+    post_delete.connect(cache_versions_changed, sender=_model, dispatch_uid=f'cache_versions_delete_{_model.__name__}')
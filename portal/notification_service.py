@@ -0,0 +1,317 @@
+"""
+Notification fan-out helpers.
+
+Every broadcast in the portal (schedule announcements, course messages,
+admin notices, chatbot escalations) goes through ``dispatch`` so that the
+recipient list is resolved with one query and the rows are written with
+chunked ``bulk_create`` calls inside a single transaction.
+
+The title and body of a broadcast are stored once in ``NotificationMessage``;
+each recipient only gets a thin ``Notification`` delivery row pointing at it.
+
+Unread counts are kept in the cache per user. Single-row changes adjust the
+cached value in place; bulk changes drop it so the next read recounts from
+the database. New notifications touch the counter only once the outermost
+transaction commits: a recount before that would cache the old count, and
+a rolled-back delivery would leave it too high. ``reconcile_unread_counts``
+repairs any drift.
+
+After the transaction commits, each recipient's WebSocket group (see
+``portal.consumers``) is sent the new notification, with the id of that
+user's delivery row so the client can mark it read or delete it. The sends
+run on a background thread, ``PUSH_CONCURRENCY`` at a time, so a course-wide
+or role-wide broadcast does not hold up the response that triggered it. At
+most ``MAX_QUEUED_PUSHES`` messages wait for that thread; beyond that a push
+is dropped, and clients pick the notification up when they next poll.
+"""
+
+import asyncio
+import atexit
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, QuerySet
+
+from .consumers import notification_group
+from .models import Notification, NotificationMessage
+
+
+# Rows per INSERT statement. Large enough to keep round-trips low for a
+# 20k-student broadcast, small enough to stay under max_allowed_packet.
+DEFAULT_BATCH_SIZE = 1000
+
+UNREAD_KEY = 'notifications:unread:{}'
+READ_VERSION_KEY = 'notifications:readver:{}'
+UNREAD_TTL = 60 * 60 * 24
+
+# group_send calls in flight at once while pushing one message
+PUSH_CONCURRENCY = 100
+
+# Messages waiting to be pushed before further pushes are dropped
+MAX_QUEUED_PUSHES = 200
+
+# One worker keeps pushes in commit order
+_push_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-push')
+_push_slots = threading.BoundedSemaphore(MAX_QUEUED_PUSHES)
+# finish the queued pushes before the process exits
+atexit.register(_push_executor.shutdown)
+
+
+def course_recipients(course, include_teacher=True):
+    """Users enrolled in ``course`` (plus the course teacher when requested)."""
+    condition = Q(profile__enrollment__course=course)
+    if include_teacher:
+        condition |= Q(profile__course=course)
+    return User.objects.filter(condition)
+
+
+def role_recipients(roles):
+    """Users whose profile role is one of ``roles``."""
+    if isinstance(roles, str):
+        roles = [roles]
+    return User.objects.filter(profile__role__in=list(roles))
+
+
+def profile_recipients(profile_ids):
+    """Users owning the given Profile ids (ids may be strings from a form)."""
+    ids = []
+    for pid in profile_ids:
+        try:
+            ids.append(int(pid))
+        except (TypeError, ValueError):
+            continue
+    return User.objects.filter(profile__id__in=ids)
+
+
+def resolve_user_ids(recipients):
+    """Return a de-duplicated list of user ids for ``recipients``.
+
+    ``recipients`` may be a User queryset (resolved with a single
+    ``SELECT DISTINCT id``), or an iterable of User instances / user ids.
+    """
+    if isinstance(recipients, QuerySet) and recipients.model is User:
+        return list(recipients.order_by().values_list('id', flat=True).distinct())
+
+    seen = set()
+    ids = []
+    for r in recipients:
+        uid = getattr(r, 'pk', r)
+        if uid is None or uid in seen:
+            continue
+        seen.add(uid)
+        ids.append(uid)
+    return ids
+
+
+def dispatch(recipients, title, message, batch_size=DEFAULT_BATCH_SIZE, sender=None):
+    """Deliver one message to every recipient and return the delivered count.
+
+    The message row and all delivery batches are written in one transaction
+    so a broadcast is either fully delivered or not delivered at all.
+    """
+    user_ids = resolve_user_ids(recipients)
+    if not user_ids:
+        return 0
+
+    deliveries = {}
+    with transaction.atomic():
+        msg = NotificationMessage.objects.create(
+            title=title, body=message, sender=sender, recipient_count=len(user_ids)
+        )
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            created = Notification.objects.bulk_create(
+                [Notification(user_id=uid, message=msg, is_read=False) for uid in chunk],
+                batch_size=batch_size,
+            )
+            deliveries.update((n.user_id, n.pk) for n in created)
+        transaction.on_commit(lambda: forget_unread_counts(user_ids))
+        transaction.on_commit(lambda: push(_delivery_ids(msg, deliveries), msg))
+    return len(user_ids)
+
+
+def _delivery_ids(msg, deliveries):
+    """User id -> Notification id of ``msg``; read back where bulk_create returns no pks (MySQL)."""
+    if deliveries and None not in deliveries.values():
+        return deliveries
+    return dict(Notification.objects.filter(message=msg).values_list('user_id', 'id'))
+
+
+def notify(user, title, message, sender=None):
+    """Create a single notification for ``user`` and return it."""
+    with transaction.atomic():
+        msg = NotificationMessage.objects.create(title=title, body=message, sender=sender, recipient_count=1)
+        notification = Notification.objects.create(user=user, message=msg, is_read=False)
+        transaction.on_commit(lambda: _adjust_unread(user.pk, 1))
+        transaction.on_commit(lambda: push({user.pk: notification.pk}, msg))
+    return notification
+
+
+def mark_read(user, notification_id):
+    """Mark one of ``user``'s notifications read. Returns False if it is not theirs."""
+    qs = Notification.objects.filter(id=notification_id, user=user)
+    if qs.filter(is_read=False).update(is_read=True):
+        _adjust_unread(user.pk, -1)
+        bump_read_version(user.pk)
+        return True
+    return qs.exists()
+
+
+def mark_all_read(user):
+    """Mark every unread notification of ``user`` read and return how many changed."""
+    updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    cache.set(unread_cache_key(user.pk), 0, UNREAD_TTL)
+    if updated:
+        bump_read_version(user.pk)
+    return updated
+
+
+def delete_notification(user, notification_id):
+    """Delete one of ``user``'s notifications. Returns False if it is not theirs."""
+    qs = Notification.objects.filter(id=notification_id, user=user)
+    is_read = qs.values_list('is_read', flat=True).first()
+    if is_read is None:
+        return False
+    qs.delete()
+    if not is_read:
+        _adjust_unread(user.pk, -1)
+    bump_read_version(user.pk)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# WebSocket push
+# ---------------------------------------------------------------------------
+
+def push(deliveries, msg):
+    """Queue ``msg`` for the WebSocket group of every user in ``deliveries`` (user id -> Notification id).
+
+    Returns the Future of the push at once; the sends happen on the push
+    thread. Returns None when there is no channel layer or the queue is full.
+    Delivery is best-effort: the rows are already committed and clients that
+    miss a push pick the notification up from the page or the polling API.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return None
+    if not _push_slots.acquire(blocking=False):
+        print(f'Notification push queue full; message {msg.pk} not pushed')
+        return None
+    notification = {
+        'message_id': msg.pk,
+        'title': msg.title,
+        'message': msg.body,
+        'created_at': msg.created_at.isoformat(),
+    }
+    try:
+        return _push_executor.submit(_send_all, layer, list(deliveries.items()), notification)
+    except RuntimeError:
+        # the executor is shut down (interpreter exit)
+        _push_slots.release()
+        return None
+
+
+def _send_all(layer, deliveries, notification):
+    async def send_all():
+        for start in range(0, len(deliveries), PUSH_CONCURRENCY):
+            await asyncio.gather(*(
+                layer.group_send(notification_group(uid), {
+                    'type': 'notification.message',
+                    'notification': {'id': notification_id, **notification},
+                })
+                for uid, notification_id in deliveries[start:start + PUSH_CONCURRENCY]
+            ))
+
+    try:
+        async_to_sync(send_all)()
+    except Exception:
+        traceback.print_exc()
+    finally:
+        _push_slots.release()
+
+
+def wait_for_pushes(timeout=None):
+    """Block until every push queued so far has been sent (tests, shutdown hooks)."""
+    _push_executor.submit(lambda: None).result(timeout)
+
+
+# ---------------------------------------------------------------------------
+# Unread counter
+# ---------------------------------------------------------------------------
+
+def unread_cache_key(user_id):
+    return UNREAD_KEY.format(user_id)
+
+
+def exact_unread_count(user_id):
+    """Unread count straight from the database."""
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def unread_count(user):
+    """Cached unread count for ``user``; recounted from the database on a miss."""
+    user_id = getattr(user, 'pk', user)
+    key = unread_cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = exact_unread_count(user_id)
+        cache.set(key, count, UNREAD_TTL)
+    return max(count, 0)
+
+
+def _adjust_unread(user_id, delta):
+    try:
+        cache.incr(unread_cache_key(user_id), delta)
+    except ValueError:
+        # Not cached yet; the next read recounts.
+        pass
+
+
+def forget_unread_counts(user_ids):
+    """Drop cached counts so they are recounted on next read."""
+    keys = [unread_cache_key(uid) for uid in user_ids]
+    for start in range(0, len(keys), DEFAULT_BATCH_SIZE):
+        cache.delete_many(keys[start:start + DEFAULT_BATCH_SIZE])
+
+
+# ---------------------------------------------------------------------------
+# Read-state version
+# ---------------------------------------------------------------------------
+#
+# A per-user token that changes whenever a notification is read or deleted.
+# Together with the newest notification id it identifies the state a polling
+# client has seen (see api_views.get_student_notifications). If the key is
+# evicted it restarts from the current time, which still differs from any
+# version a client holds.
+
+def _read_version_key(user_id):
+    return READ_VERSION_KEY.format(user_id)
+
+
+def read_version(user_id):
+    key = _read_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), UNREAD_TTL)
+        version = cache.get(key)
+    return version
+
+
+def bump_read_version(user_id):
+    try:
+        cache.incr(_read_version_key(user_id))
+    except ValueError:
+        cache.set(_read_version_key(user_id), int(time.time() * 1000), UNREAD_TTL)
+
+
+def latest_notification_id(user_id):
+    """Newest notification id for the user (0 when there are none)."""
+    return (Notification.objects.filter(user_id=user_id).select_related(None)
+            .order_by('-id').values_list('id', flat=True).first()) or 0
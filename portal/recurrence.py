@@ -0,0 +1,112 @@
+"""
+Expansion of Schedule recurrence rules into ScheduleOccurrence rows.
+
+A schedule with ``is_recurring`` and an RFC 5545 ``recurrence_rule`` (for
+example ``FREQ=WEEKLY;BYDAY=MO,WE``) repeats from its ``date``; any other
+schedule occurs once, on its ``date``. ``regenerate`` rewrites the
+occurrences of one schedule from the start of the current week up to
+``HORIZON_DAYS`` ahead; a one-off schedule gets its occurrence however far
+ahead it is dated, so it is listed from the day it is created. Earlier rows
+are kept as history. The post_save
+signal of Schedule calls it, so an edit only touches its own series. Code
+that writes schedules in bulk (``QuerySet.update``) must call
+``regenerate_many`` itself. The ``materialize_schedules`` command, run daily,
+moves the horizon forward for every series.
+"""
+
+import traceback
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dateutil.rrule import rrulestr
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Schedule, ScheduleOccurrence
+
+
+HORIZON_DAYS = 180
+# Upper bound per series and window, so a FREQ=MINUTELY rule cannot flood the table
+MAX_OCCURRENCES = 1000
+
+
+def window(today=None):
+    """``(start, end)`` dates that ``regenerate`` materializes."""
+    today = today or timezone.localdate()
+    return today - timedelta(days=today.weekday()), today + timedelta(days=HORIZON_DAYS)
+
+
+def occurrence_dates(schedule, start, end):
+    """Dates on which ``schedule`` occurs between ``start`` and ``end`` (inclusive).
+
+    ``end`` only bounds recurring series: a one-off date on or after
+    ``start`` is always returned. An unparsable rule is reported and the
+    schedule treated as a one-off.
+    """
+    rule = (schedule.recurrence_rule or '').strip()
+    if schedule.is_recurring and rule:
+        try:
+            dtstart = datetime.combine(schedule.date, time.min)
+            dates = []
+            for dt in rrulestr(rule, dtstart=dtstart, ignoretz=True):
+                if dt.date() > end or len(dates) >= MAX_OCCURRENCES:
+                    break
+                if dt.date() >= start and (not dates or dates[-1] != dt.date()):
+                    dates.append(dt.date())
+            return dates
+        except (ValueError, TypeError):
+            print(f"Invalid recurrence rule on schedule {schedule.pk}: {rule!r}")
+            traceback.print_exc()
+    return [schedule.date] if schedule.date >= start else []
+
+
+def _zone(schedule):
+    try:
+        return ZoneInfo(schedule.timezone) if schedule.timezone else timezone.get_current_timezone()
+    except (ValueError, ZoneInfoNotFoundError):
+        return timezone.get_current_timezone()
+
+
+def remind_at(schedule, day):
+    """When the reminder for the occurrence on ``day`` is due, or None if the schedule sends none.
+
+    Occurrences without a start time count as starting at midnight in the
+    schedule's time zone.
+    """
+    if not schedule.notify_students or schedule.reminder_minutes is None or schedule.reminder_minutes < 0:
+        return None
+    starts = datetime.combine(day, schedule.start_time or time.min).replace(tzinfo=_zone(schedule))
+    return starts - timedelta(minutes=schedule.reminder_minutes)
+
+
+def regenerate(schedule, today=None):
+    """Rewrite the occurrences of one schedule inside the current window. Returns the number written.
+
+    A reminder already sent stays sent unless the edit moved its due time.
+    """
+    start, end = window(today)
+    dates = occurrence_dates(schedule, start, end) if schedule.is_active else []
+    with transaction.atomic():
+        existing = ScheduleOccurrence.objects.filter(schedule=schedule, date__gte=start)
+        sent = {(day, due): at for day, due, at in
+                existing.filter(reminder_sent_at__isnull=False).values_list('date', 'remind_at', 'reminder_sent_at')}
+        existing.delete()
+        rows = []
+        for day in dates:
+            due = remind_at(schedule, day)
+            rows.append(ScheduleOccurrence(
+                schedule=schedule, date=day, start_time=schedule.start_time, end_time=schedule.end_time,
+                course_id=schedule.course_id, is_public=schedule.is_public,
+                remind_at=due, reminder_sent_at=sent.get((day, due)),
+            ))
+        ScheduleOccurrence.objects.bulk_create(rows)
+    return len(dates)
+
+
+def regenerate_many(schedules, today=None):
+    """``regenerate`` every schedule of an iterable or queryset; returns the total written."""
+    from .cache_versions import bump, table_scope
+
+    written = sum(regenerate(schedule, today) for schedule in schedules)
+    bump(table_scope(Schedule))
+    return written
@@ -0,0 +1,140 @@
+"""
+Schedule reminders.
+
+Every ScheduleOccurrence of a schedule with ``notify_students`` has a
+``remind_at``, which is its start minus ``Schedule.reminder_minutes`` (see
+``portal.recurrence``). ``ReminderScheduler`` keeps the reminders due in the
+next ``LOOKAHEAD`` in a heap ordered by due time and sleeps until the
+earliest one. It reloads the heap from the database every
+``REFRESH_SECONDS`` so that new and edited schedules are picked up.
+
+Sending is at most once. A batch of due occurrences is claimed by stamping
+``reminder_sent_at`` in one transaction before anything is sent, and only
+rows that were still unclaimed are sent. A restarted scheduler, or a
+second one, therefore never sends a reminder again. A crash between the
+claim and the send loses that batch's reminders instead. Reminders more
+than ``MAX_LATENESS`` overdue (say, after downtime) are skipped.
+
+The ``send_schedule_reminders`` command runs the loop.
+"""
+
+import heapq
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ScheduleOccurrence
+from .notification_service import course_recipients, dispatch, role_recipients
+
+
+LOOKAHEAD = timedelta(minutes=10)
+REFRESH_SECONDS = 30
+MAX_LATENESS = timedelta(minutes=15)
+BATCH_SIZE = 200
+
+
+def pending(now, until):
+    """Unsent reminders due between ``now - MAX_LATENESS`` and ``until``."""
+    return ScheduleOccurrence.objects.filter(
+        reminder_sent_at__isnull=True, remind_at__gte=now - MAX_LATENESS, remind_at__lte=until,
+    )
+
+
+def claim(ids, now):
+    """Mark the still-unsent, due occurrences among ``ids`` as sent and return them."""
+    with transaction.atomic():
+        rows = list(pending(now, now).filter(id__in=ids)
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .select_related('schedule__course'))
+        ScheduleOccurrence.objects.filter(id__in=[r.id for r in rows]).update(reminder_sent_at=now)
+    return rows
+
+
+def reminder_text(occurrence):
+    schedule = occurrence.schedule
+    title = f"⏰ Reminder: {schedule.title}"
+    message = f"{schedule.title} on {occurrence.date}"
+    if occurrence.start_time:
+        message += f" at {occurrence.start_time.strftime('%H:%M')}"
+    if schedule.location:
+        message += f" in {schedule.location}"
+    message += f" ({schedule.course.code})" if schedule.course else " (Public Event)"
+    return title, message
+
+
+def send(occurrence):
+    """Deliver one reminder; returns the number of recipients."""
+    schedule = occurrence.schedule
+    if schedule.course:
+        targets = course_recipients(schedule.course, include_teacher=True)
+    elif occurrence.is_public:
+        targets = role_recipients(['student', 'teacher'])
+    else:
+        return 0
+    title, message = reminder_text(occurrence)
+    return dispatch(targets, title, message)
+
+
+class ReminderScheduler:
+    """Priority queue of upcoming reminders.
+
+    ``clock`` returns the current aware datetime and ``sleep`` waits a
+    number of seconds; tests pass fakes for both.
+    """
+
+    def __init__(self, clock=timezone.now, sleep=time.sleep, batch_size=BATCH_SIZE, stdout=None):
+        self.clock = clock
+        self.sleep = sleep
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.heap = []
+        self.next_refresh = None
+        self.sent = 0
+
+    def refresh(self):
+        now = self.clock()
+        rows = pending(now, now + LOOKAHEAD).values_list('remind_at', 'id')
+        self.heap = list(rows)
+        heapq.heapify(self.heap)
+        self.next_refresh = now + timedelta(seconds=REFRESH_SECONDS)
+
+    def run_pending(self):
+        """Send every reminder due now, a batch at a time. Returns the number of reminders sent."""
+        now = self.clock()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[1])
+        sent = 0
+        for start in range(0, len(due), self.batch_size):
+            for occurrence in claim(due[start:start + self.batch_size], now):
+                try:
+                    send(occurrence)
+                    sent += 1
+                except Exception:
+                    traceback.print_exc()
+        self.sent += sent
+        if sent and self.stdout:
+            self.stdout.write(f'{now:%Y-%m-%d %H:%M:%S} sent {sent} reminder(s)')
+        return sent
+
+    def seconds_until_next(self):
+        now = self.clock()
+        wake = self.next_refresh
+        if self.heap and self.heap[0][0] < wake:
+            wake = self.heap[0][0]
+        return max((wake - now).total_seconds(), 0)
+
+    def tick(self):
+        """One loop step: refresh when due, send what is due, then sleep until the next event."""
+        if self.next_refresh is None or self.clock() >= self.next_refresh:
+            self.refresh()
+        self.run_pending()
+        self.sleep(self.seconds_until_next())
+
+    def run(self, until=None):
+        """Loop until the clock passes ``until`` (forever when None)."""
+        while until is None or self.clock() < until:
+            self.tick()
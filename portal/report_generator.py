@@ -215,7 +215,7 @@ class EnhancedStudentReportGenerator:
     
     def _create_attendance_section(self, story, components):
         """Create comprehensive attendance analytics section."""
-        from .models import Enrollment, Attendance
+        from .student_stats import StudentStats
         
         Paragraph = components['platypus'].Paragraph
         Spacer = components['platypus'].Spacer
@@ -228,9 +228,9 @@ class EnhancedStudentReportGenerator:
         story.append(Paragraph('Attendance Summary', section_style))
         story.append(Spacer(1, 0.15*inch))
         
-        enrollments = Enrollment.objects.filter(student=self.student).select_related('course')
+        course_stats = StudentStats(self.student).courses
         
-        if not enrollments.exists():
+        if not course_stats:
             story.append(Paragraph('No course enrollments found.', self.styles['Normal']))
             story.append(Spacer(1, 0.3*inch))
             return
@@ -240,19 +240,12 @@ class EnhancedStudentReportGenerator:
         total_classes = 0
         total_present = 0
         
-        for enrollment in enrollments:
-            course = enrollment.course
-            total = Attendance.objects.filter(
-                student=self.student, 
-                course=course
-            ).count()
-            present = Attendance.objects.filter(
-                student=self.student, 
-                course=course, 
-                status=True
-            ).count()
-            absent = total - present
-            percentage = (present / total * 100) if total > 0 else 0
+        for stats in course_stats:
+            course = stats.course
+            total = stats.total
+            present = stats.present
+            absent = stats.absent
+            percentage = stats.percentage
             
             total_classes += total
             total_present += present
@@ -0,0 +1,170 @@
+"""
+Time-bucketed series for dashboard charts.
+
+``series(queryset, field, start, end, bucket)`` returns one metric (or
+several) per day, week or month between two dates. It uses a single
+``GROUP BY Trunc(field)`` query and fills buckets that have no rows with
+zeros. With ``points`` set, long ranges are merged down to at most that
+many buckets on the server.
+
+Chart endpoints accept ``range`` (for example ``7d``, ``12w``, ``6m``, ``1y``
+or ``2025-01-01:2025-03-31``) and ``points`` through ``from_request``.
+"""
+
+import math
+import re
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Count, DateField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+
+BUCKETS = ('day', 'week', 'month')
+MAX_RANGE_DAYS = 366 * 5
+LABEL_FORMATS = {'day': '%b %d', 'week': '%b %d', 'month': '%b %Y'}
+
+_RELATIVE = re.compile(r'^(\d+)([dwmy])$')
+
+
+def parse_range(value, today=None):
+    """Return ``(start, end)`` dates, inclusive, for a ``range`` parameter.
+
+    Raises ValueError for anything it does not understand.
+    """
+    today = today or timezone.localdate()
+    value = (value or '').strip().lower()
+    match = _RELATIVE.match(value)
+    if match:
+        n, unit = int(match.group(1)), match.group(2)
+        if n < 1:
+            raise ValueError('range must be at least 1')
+        if unit == 'd':
+            start = today - timedelta(days=n - 1)
+        elif unit == 'w':
+            # like months, weeks are whole calendar weeks ending with the current one
+            start = bucket_start(today, 'week') - timedelta(weeks=n - 1)
+        else:
+            months = n * 12 if unit == 'y' else n
+            start = _add_months(today.replace(day=1), -(months - 1))
+        end = today
+    elif ':' in value:
+        first, last = value.split(':', 1)
+        start, end = date.fromisoformat(first), date.fromisoformat(last)
+    else:
+        raise ValueError(f'Unrecognised range: {value!r}')
+    if start > end:
+        raise ValueError('range start is after its end')
+    if (end - start).days > MAX_RANGE_DAYS:
+        raise ValueError(f'range is longer than {MAX_RANGE_DAYS} days')
+    return start, end
+
+
+def auto_bucket(start, end):
+    """Daily up to three months, weekly up to two years, monthly beyond."""
+    days = (end - start).days + 1
+    if days <= 92:
+        return 'day'
+    if days <= 731:
+        return 'week'
+    return 'month'
+
+
+def from_request(request, default_range, bucket=None):
+    """``(start, end, bucket, points)`` from the ``range``/``bucket``/``points`` query parameters.
+
+    ``bucket`` fixes the bucket size (the ``bucket`` parameter is then
+    ignored); otherwise it is taken from the request or chosen from the
+    range length. Raises ValueError on invalid input.
+    """
+    start, end = parse_range(request.GET.get('range') or default_range)
+    if bucket is None:
+        bucket = request.GET.get('bucket') or auto_bucket(start, end)
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    points = request.GET.get('points')
+    if points:
+        points = int(points)
+        if points < 1:
+            raise ValueError('points must be at least 1')
+    return start, end, bucket, points or None
+
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1)
+
+
+def bucket_starts(start, end, bucket):
+    """Every bucket start date from the bucket holding ``start`` to the one holding ``end``."""
+    current, last = bucket_start(start, bucket), bucket_start(end, bucket)
+    starts = []
+    while current <= last:
+        starts.append(current)
+        current = _add_months(current, 1) if bucket == 'month' else current + timedelta(days=7 if bucket == 'week' else 1)
+    return starts
+
+
+def series(queryset, field, start, end, bucket='day', points=None, **metrics):
+    """Bucketed metrics of ``queryset`` between ``start`` and ``end`` (dates, inclusive).
+
+    ``field`` is the date or datetime column to bucket on (datetimes are
+    bucketed in the current time zone). ``metrics`` are aggregate
+    expressions by name; the default is ``count=Count('pk')``. Returns a
+    list of ``{'start': date, <metric>: value, ...}`` with every bucket
+    present. With ``points``, consecutive buckets are summed so that at most
+    ``points`` remain; each keeps the start date of its first bucket.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    metrics = metrics or {'count': Count('pk')}
+
+    model_field = queryset.model._meta.get_field(field)
+    if model_field.get_internal_type() == 'DateTimeField':
+        tz = timezone.get_current_timezone()
+        lower = timezone.make_aware(datetime.combine(start, time.min), tz)
+        upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+        queryset = queryset.filter(**{f'{field}__gte': lower, f'{field}__lt': upper})
+    else:
+        queryset = queryset.filter(**{f'{field}__gte': start, f'{field}__lte': end})
+
+    rows = (queryset.order_by()
+            .annotate(period=Trunc(field, bucket, output_field=DateField()))
+            .values('period')
+            .annotate(**metrics))
+    found = {row.pop('period'): row for row in rows}
+
+    result = []
+    for day in bucket_starts(start, end, bucket):
+        row = found.get(day, {})
+        result.append({'start': day, **{name: row.get(name) or 0 for name in metrics}})
+    return downsample(result, points) if points else result
+
+
+def downsample(buckets, points):
+    """Merge consecutive buckets (summing their metrics) down to at most ``points``."""
+    if len(buckets) <= points:
+        return buckets
+    size = math.ceil(len(buckets) / points)
+    merged = []
+    for i in range(0, len(buckets), size):
+        group = buckets[i:i + size]
+        combined = {'start': group[0]['start']}
+        for name in group[0]:
+            if name != 'start':
+                combined[name] = sum(b[name] for b in group)
+        merged.append(combined)
+    return merged
+
+
+def labels(buckets, bucket, fmt=None):
+    fmt = fmt or LABEL_FORMATS[bucket]
+    return [b['start'].strftime(fmt) for b in buckets]
@@ -0,0 +1,92 @@
+"""
+Per-student attendance and marks statistics.
+
+``StudentStats(student)`` reads the student's StudentCourseSummary rows (one
+per course, maintained by ``portal.course_summary``) and the enrollments they
+belong to: two queries, regardless of how much attendance or submission
+history the student has. Views that used to count per course in a loop read
+from here instead.
+"""
+
+from .models import Enrollment, StudentCourseSummary
+
+
+class CourseStats:
+    """Attendance and marks of one student in one enrolled course."""
+
+    __slots__ = ('enrollment', 'course', 'total', 'present', 'graded_count', 'marks_sum')
+
+    def __init__(self, enrollment, summary=None):
+        self.enrollment = enrollment
+        self.course = enrollment.course
+        self.total = summary.total if summary else 0
+        self.present = summary.present if summary else 0
+        self.graded_count = summary.graded_count if summary else 0
+        self.marks_sum = summary.marks_sum if summary else 0
+
+    @property
+    def absent(self):
+        return self.total - self.present
+
+    @property
+    def percentage(self):
+        return (self.present / self.total * 100) if self.total else 0
+
+    @property
+    def avg_marks(self):
+        return (self.marks_sum / self.graded_count) if self.graded_count else None
+
+
+class StudentStats:
+    """Lazily loaded statistics for one student Profile."""
+
+    def __init__(self, student):
+        self.student = student
+        self._summaries = None
+        self._enrollments = None
+        self._courses = None
+
+    @property
+    def summaries(self):
+        """All StudentCourseSummary rows of the student, keyed by course id."""
+        if self._summaries is None:
+            self._summaries = {s.course_id: s for s in StudentCourseSummary.objects.filter(student=self.student)}
+        return self._summaries
+
+    @property
+    def enrollments(self):
+        """The student's enrollments with course and teacher, in enrollment order."""
+        if self._enrollments is None:
+            self._enrollments = list(Enrollment.objects.filter(student=self.student)
+                                     .select_related('course__teacher__user').order_by('id'))
+        return self._enrollments
+
+    @property
+    def courses(self):
+        """CourseStats for every enrollment, in enrollment order."""
+        if self._courses is None:
+            self._courses = [CourseStats(e, self.summaries.get(e.course_id)) for e in self.enrollments]
+        return self._courses
+
+    @property
+    def attendance_total(self):
+        return sum(s.total for s in self.summaries.values())
+
+    @property
+    def attendance_present(self):
+        return sum(s.present for s in self.summaries.values())
+
+    @property
+    def attendance_percentage(self):
+        total = self.attendance_total
+        return (self.attendance_present / total * 100) if total else 0
+
+    @property
+    def graded_count(self):
+        return sum(s.graded_count for s in self.summaries.values())
+
+    @property
+    def avg_marks(self):
+        """Average of all graded submissions, or None when nothing is graded."""
+        graded = self.graded_count
+        return (sum(s.marks_sum for s in self.summaries.values()) / graded) if graded else None
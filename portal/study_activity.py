@@ -0,0 +1,243 @@
+"""
+Study analytics from page and API activity.
+
+Requests are not written to the database as they happen.
+``StudyActivityMiddleware`` calls ``record``, which appends the event to a
+buffer in the cache: a sequence counter plus one key per event, two cache
+round-trips and no SQL. ``flush`` (the ``flush_study_activity`` command,
+run every minute) moves buffered events into StudyEvent with
+``bulk_create``. It then rebuilds the StudyHour rollups of the hours those
+events touched. ``analytics`` answers ``get_analytics`` from the rollups
+alone.
+
+The buffer has to be visible to the flush process, so it needs a cache
+shared by every process (Redis, via ``REDIS_URL``). With the local-memory
+or dummy backend ``record`` does nothing and logs a warning once: events
+kept in a web worker's private memory would never be flushed, and would
+evict that worker's other cache entries.
+
+Sessions are runs of events no more than ``SESSION_GAP`` apart. Active time
+is the time between consecutive events of a session. The last event of a
+session counts for ``LAST_EVENT_SECONDS``.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from .models import StudyEvent, StudyHour
+
+
+SEQ_KEY = 'studybuf:seq'
+FLUSHED_KEY = 'studybuf:flushed'
+LOCK_KEY = 'studybuf:lock'
+ENTRY_KEY = 'studybuf:{}'
+# Long enough to survive a missed flush or two
+ENTRY_TTL = 60 * 60 * 6
+# A missing entry this close to the head may still be in flight (counter
+# taken, value not yet stored); the flush stops there and retries next time.
+IN_FLIGHT = 100
+FLUSH_BATCH = 1000
+
+SESSION_GAP = timedelta(minutes=30)
+LAST_EVENT_SECONDS = 60
+
+SKIP_PREFIXES = ('/static/', '/media/', '/admin/', '/favicon.ico')
+
+# Per-process backends: a buffer there is invisible to flush_study_activity
+UNSHARED_BACKENDS = (LocMemCache, DummyCache)
+
+logger = logging.getLogger(__name__)
+_warned_unshared = False
+
+
+# ---------------------------------------------------------------------------
+# Write path: the cache buffer
+# ---------------------------------------------------------------------------
+
+def classify(request, response):
+    """'page' for HTML page views, 'action' for writes, None for anything not recorded.
+
+    JSON GETs are left out: dashboards poll them every few seconds whether
+    or not anyone is looking.
+    """
+    if response.status_code >= 400 or request.path.startswith(SKIP_PREFIXES):
+        return None
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE'):
+        return 'action'
+    if request.method == 'GET' and response.get('Content-Type', '').startswith('text/html'):
+        return 'page'
+    return None
+
+
+def buffer_available():
+    """True when the default cache is shared between processes, so the flush can see the buffer."""
+    return not isinstance(caches['default'], UNSHARED_BACKENDS)
+
+
+def record(user_id, kind, path, at=None):
+    """Append one event to the buffer; a no-op without a shared cache."""
+    global _warned_unshared
+    if not buffer_available():
+        if not _warned_unshared:
+            _warned_unshared = True
+            logger.warning('Study activity is not recorded: the default cache (%s) is not shared between '
+                           'processes. Set REDIS_URL to enable it.', type(caches['default']).__name__)
+        return
+    try:
+        n = cache.incr(SEQ_KEY)
+    except ValueError:
+        cache.add(SEQ_KEY, 0, None)
+        n = cache.incr(SEQ_KEY)
+    cache.set(ENTRY_KEY.format(n), (user_id, kind, path[:200], at or time.time()), ENTRY_TTL)
+
+
+def buffered():
+    """Number of events recorded but not flushed yet."""
+    return max((cache.get(SEQ_KEY) or 0) - (cache.get(FLUSHED_KEY) or 0), 0)
+
+
+# ---------------------------------------------------------------------------
+# Flush and rollups
+# ---------------------------------------------------------------------------
+
+def _hour(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def flush(batch_size=FLUSH_BATCH):
+    """Move buffered events into StudyEvent and refresh the affected rollups.
+
+    Returns the number of events written. Only one flush runs at a time;
+    a concurrent call returns 0 at once.
+    """
+    if not cache.add(LOCK_KEY, 1, 300):
+        return 0
+    try:
+        written = 0
+        last = cache.get(FLUSHED_KEY) or 0
+        head = cache.get(SEQ_KEY) or 0
+        if head < last:
+            # the counter was evicted and restarted
+            last = 0
+        while last < head:
+            upto = min(head, last + batch_size)
+            keys = [ENTRY_KEY.format(n) for n in range(last + 1, upto + 1)]
+            found = cache.get_many(keys)
+            for n, key in enumerate(keys, start=last + 1):
+                if key not in found and n > head - IN_FLIGHT:
+                    upto = n - 1
+                    keys = keys[:n - last - 1]
+                    break
+            events = [
+                StudyEvent(user_id=uid, kind=kind, path=path, created_at=datetime.fromtimestamp(ts, dt_timezone.utc))
+                for uid, kind, path, ts in (found[k] for k in keys if k in found)
+            ]
+            with transaction.atomic():
+                StudyEvent.objects.bulk_create(events, batch_size=batch_size)
+                rebuild_rollups(events)
+            cache.set(FLUSHED_KEY, upto, None)
+            cache.delete_many(keys)
+            written += len(events)
+            if upto == last:
+                break
+            last = upto
+        return written
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def rebuild_rollups(events):
+    """Recompute the StudyHour rows that ``events`` (just written) can change.
+
+    An event changes its own hour and, by extending or joining a session,
+    the active time of the hours up to ``SESSION_GAP`` before it.
+    """
+    if not events:
+        return 0
+    user_ids = {e.user_id for e in events}
+    start = _hour(min(e.created_at for e in events) - SESSION_GAP)
+    end = _hour(max(e.created_at for e in events)) + timedelta(hours=1)
+    rows = (StudyEvent.objects
+            .filter(user_id__in=user_ids, created_at__gte=start - SESSION_GAP, created_at__lt=end)
+            .order_by('user_id', 'created_at')
+            .values_list('user_id', 'created_at'))
+
+    hours = {}
+    previous = {}
+    for uid, at in rows:
+        prev = previous.get(uid)
+        if prev is not None:
+            gap = at - prev
+            seconds = gap.total_seconds() if gap <= SESSION_GAP else LAST_EVENT_SECONDS
+            if prev >= start:
+                hours[(uid, _hour(prev))]['active_seconds'] += int(seconds)
+        if at >= start:
+            bucket = hours.setdefault((uid, _hour(at)), {'events': 0, 'active_seconds': 0, 'sessions': 0})
+            bucket['events'] += 1
+            if prev is None or at - prev > SESSION_GAP:
+                bucket['sessions'] += 1
+        previous[uid] = at
+    # The newest event of each user has no successor yet
+    for uid, at in previous.items():
+        if at >= start:
+            hours[(uid, _hour(at))]['active_seconds'] += LAST_EVENT_SECONDS
+
+    StudyHour.objects.bulk_create(
+        [StudyHour(user_id=uid, hour=hour, **values) for (uid, hour), values in hours.items()],
+        update_conflicts=True,
+        unique_fields=['user', 'hour'] if connection.features.supports_update_conflicts_with_target else None,
+        update_fields=['events', 'active_seconds', 'sessions'],
+    )
+    return len(hours)
+
+
+def prune(days):
+    """Delete StudyEvent rows older than ``days`` (the rollups are kept); returns the count."""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = list(StudyEvent.objects.filter(created_at__lt=cutoff).order_by('created_at').values_list('id', flat=True)[:FLUSH_BATCH])
+        if not ids:
+            return deleted
+        deleted += StudyEvent.objects.filter(id__in=ids).delete()[0]
+
+
+# ---------------------------------------------------------------------------
+# Read path
+# ---------------------------------------------------------------------------
+
+def _clock(hour):
+    return datetime(2000, 1, 1, hour % 24).strftime('%I %p').lstrip('0')
+
+
+def analytics(user, now=None, days=28):
+    """Peak study hours, average session and the last week's total, from StudyHour."""
+    now = now or timezone.now()
+    recent = StudyHour.objects.filter(user=user, hour__gte=_hour(now) - timedelta(days=days))
+    totals = recent.aggregate(active=Sum('active_seconds'), sessions=Sum('sessions'))
+    week = recent.filter(hour__gte=now - timedelta(days=7)).aggregate(active=Sum('active_seconds'))['active'] or 0
+
+    by_hour = {row['h']: row['active'] for row in
+               recent.annotate(h=ExtractHour('hour')).values('h').annotate(active=Sum('active_seconds')).order_by()}
+    if by_hour:
+        # the best two consecutive hours of the day, starting with the busier one
+        best = max(range(24), key=lambda h: (by_hour.get(h, 0) + by_hour.get((h + 1) % 24, 0), by_hour.get(h, 0)))
+        peak_hours = f'{_clock(best)} - {_clock(best + 2)}'
+    else:
+        peak_hours = 'Not enough data'
+
+    active, sessions = totals['active'] or 0, totals['sessions'] or 0
+    return {
+        'peak_hours': peak_hours,
+        'avg_session': round(active / sessions / 3600, 1) if sessions else 0,
+        'weekly_total': round(week / 3600, 1),
+    }
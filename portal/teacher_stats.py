@@ -0,0 +1,100 @@
+"""
+Per-teacher course statistics.
+
+``TeacherStats(teacher)`` answers the teacher dashboard, its live-updates
+endpoint and the teacher profile page from a fixed number of queries:
+courses with their enrollment counts (one annotated query), attendance and
+marks per course from the StudentCourseSummary totals (one grouped query),
+distinct students, pending assignments and top students (one query each).
+The number of courses does not change the count.
+"""
+
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .course_summary import course_totals
+from .models import Assignment, Course, Enrollment, Profile
+
+
+class TeacherCourseStats:
+    """Enrollment, attendance and marks totals of one course."""
+
+    __slots__ = ('course', 'student_count', 'total', 'present', 'graded_count', 'marks_sum')
+
+    def __init__(self, course, totals=None):
+        self.course = course
+        self.student_count = course.student_count
+        totals = totals or {}
+        self.total = totals.get('total') or 0
+        self.present = totals.get('present') or 0
+        self.graded_count = totals.get('graded_count') or 0
+        self.marks_sum = totals.get('marks_sum') or 0
+
+    @property
+    def attendance_percentage(self):
+        return (self.present / self.total * 100) if self.total else 0
+
+    @property
+    def avg_marks(self):
+        return (self.marks_sum / self.graded_count) if self.graded_count else None
+
+
+class TeacherStats:
+    """Lazily loaded statistics for one teacher Profile."""
+
+    def __init__(self, teacher):
+        self.teacher = teacher
+        self._courses = None
+        self._total_students = None
+
+    @property
+    def courses(self):
+        """TeacherCourseStats for every course the teacher owns, in course order."""
+        if self._courses is None:
+            courses = list(Course.objects.filter(teacher=self.teacher)
+                           .annotate(student_count=Count('enrollment')).order_by('id'))
+            totals = course_totals(c.id for c in courses) if courses else {}
+            self._courses = [TeacherCourseStats(c, totals.get(c.id)) for c in courses]
+        return self._courses
+
+    @property
+    def course_ids(self):
+        return [c.course.id for c in self.courses]
+
+    @property
+    def total_students(self):
+        """Distinct students enrolled in any of the teacher's courses."""
+        if self._total_students is None:
+            self._total_students = (Enrollment.objects.filter(course__teacher=self.teacher)
+                                    .values('student').distinct().count())
+        return self._total_students
+
+    @property
+    def avg_attendance(self):
+        """Mean attendance percentage of the courses that have any attendance."""
+        rates = [c.attendance_percentage for c in self.courses if c.total]
+        return sum(rates) / len(rates) if rates else 0.0
+
+    @property
+    def top_course(self):
+        """The course with the most enrollments, or None."""
+        if not self.courses:
+            return None
+        return max(self.courses, key=lambda c: c.student_count).course
+
+    def pending_assignments(self, today=None):
+        """Assignments due today or later, plus those without a due date."""
+        today = today or timezone.localdate()
+        return Assignment.objects.filter(course__teacher=self.teacher).filter(Q(due_date__gte=today) | Q(due_date__isnull=True))
+
+    def top_students(self, limit=5):
+        """Students with the best average mark across the teacher's courses, with ``avg_marks`` annotated."""
+        # filtering before annotating restricts the sums to the teacher's courses
+        return (Profile.objects
+                .filter(course_summaries__course__teacher=self.teacher)
+                .annotate(marks=Sum('course_summaries__marks_sum'), graded=Sum('course_summaries__graded_count'))
+                .filter(graded__gt=0)
+                .annotate(avg_marks=Cast('marks', FloatField()) / F('graded'))
+                .select_related('user')
+                .order_by('-avg_marks', 'id')[:limit])
@@ -1,6 +1,16 @@
-from django.test import TestCase, Client
+import os
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from .models import Profile
+from .student_stats import StudentStats
 
 
 class StudentCRUDBasicTests(TestCase):
@@ -58,3 +68,1682 @@ class StudentCRUDBasicTests(TestCase):
         resp = self.client.post(delete_url, follow=True)
         self.assertEqual(resp.status_code, 200)
         self.assertFalse(User.objects.filter(username='teststudent').exists())
+
+
+class NotificationDispatchTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Course, Enrollment
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='password')
+        teacher.profile.role = 'teacher'
+        teacher.profile.save()
+        self.teacher = teacher
+        self.course = Course.objects.create(name='Course', code='C101', teacher=teacher.profile)
+        self.students = []
+        for i in range(5):
+            u = User.objects.create_user(username=f'student{i}', password='password')
+            u.profile.role = 'student'
+            u.profile.save()
+            Enrollment.objects.create(student=u.profile, course=self.course)
+            self.students.append(u)
+
+    def test_course_broadcast_includes_teacher_once(self):
+        from .models import Notification
+        from .notification_service import course_recipients, dispatch
+
+        sent = dispatch(course_recipients(self.course), 'Title', 'Body')
+        self.assertEqual(sent, 6)
+        self.assertEqual(Notification.objects.filter(user=self.teacher).count(), 1)
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 6)
+
+    def test_dispatch_is_batched(self):
+        from .notification_service import course_recipients, dispatch
+
+        # recipients SELECT, savepoint, message INSERT, three delivery batches, release
+        with self.assertNumQueries(7):
+            sent = dispatch(course_recipients(self.course, include_teacher=False), 'T', 'B', batch_size=2)
+        self.assertEqual(sent, 5)
+
+    def test_send_message_view_uses_dispatcher(self):
+        self.client.login(username='teacher', password='password')
+        resp = self.client.post('/teacher/send-message/', {'course_id': self.course.id, 'message': 'Hello'})
+        self.assertEqual(resp.json(), {'success': True, 'sent': 5})
+
+    def test_broadcast_body_stored_once(self):
+        from .models import Notification, NotificationMessage
+        from .notification_service import course_recipients, dispatch
+
+        dispatch(course_recipients(self.course), 'Exam', 'Room 4', sender=self.teacher)
+        msg = NotificationMessage.objects.get()
+        self.assertEqual((msg.body, msg.recipient_count, msg.sender), ('Room 4', 6, self.teacher))
+        self.assertEqual(msg.deliveries.count(), 6)
+        notif = Notification.objects.filter(user=self.students[0]).get()
+        self.assertEqual((notif.title, notif.body), ('Exam', 'Room 4'))
+
+    def test_student_notification_reads(self):
+        from .notification_service import course_recipients, dispatch
+
+        dispatch(course_recipients(self.course), 'Exam', 'Room 4')
+        self.client.login(username='student0', password='password')
+        data = self.client.get('/api/student/notifications/').json()
+        self.assertEqual(data['notifications'][0]['message'], 'Room 4')
+        resp = self.client.get('/notifications/')
+        self.assertContains(resp, 'Room 4')
+        self.assertEqual(resp.context['unread_count'], 1)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='password')
+        self.client.login(username='reader', password='password')
+
+    def test_counter_follows_read_and_delete(self):
+        from .models import Notification
+        from .notification_service import dispatch, notify, unread_count
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch([self.user], 'A', 'a')
+            first = notify(self.user, 'B', 'b')
+        self.assertEqual(unread_count(self.user), 2)
+        # cached: no query on the second read
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.user, 'C', 'c')
+        self.client.post('/notifications/mark-as-read/', {'notif_id': first.id})
+        self.client.post('/notifications/mark-as-read/', {'notif_id': first.id})
+        self.assertEqual(unread_count(self.user), 2)
+
+        other = Notification.objects.filter(is_read=False).first()
+        self.client.post('/notifications/delete/', {'notif_id': other.id})
+        self.assertEqual(unread_count(self.user), 1)
+
+        self.client.post('/notifications/mark-all-read/')
+        self.assertEqual(unread_count(self.user), 0)
+
+    def test_counter_waits_for_outer_commit(self):
+        from django.core.cache import cache
+        from django.db import transaction
+        from .notification_service import dispatch, notify, unread_cache_key, unread_count
+
+        self.assertEqual(unread_count(self.user), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                notify(self.user, 'A', 'a')
+                dispatch([self.user], 'B', 'b')
+                # a concurrent read before the commit still finds the old count cached
+                self.assertEqual(cache.get(unread_cache_key(self.user.pk)), 0)
+        self.assertEqual(unread_count(self.user), 2)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    notify(self.user, 'C', 'c')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(cache.get(unread_cache_key(self.user.pk)), 2)
+
+    def test_schedule_badge_counts_schedule_notifications_only(self):
+        from .notification_service import notify
+
+        self.user.profile.role = 'teacher'
+        self.user.profile.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.user, 'New Schedule: Exam', 'Room 4')
+            notify(self.user, 'Fee reminder', 'Pay by Friday')
+        data = self.client.get('/api/schedule-notifications/').json()
+        self.assertEqual((data['count'], data['unread_count']), (1, 1))
+
+    def test_reconcile_repairs_drift(self):
+        from io import StringIO
+        from django.core.cache import cache
+        from django.core.management import call_command
+        from .models import Notification
+        from .notification_service import notify, unread_cache_key, unread_count
+
+        notify(self.user, 'A', 'a')
+        self.assertEqual(unread_count(self.user), 1)
+        Notification.objects.filter(user=self.user).update(is_read=True)  # bypasses the counter
+        call_command('reconcile_unread_counts', stdout=StringIO())
+        self.assertEqual(cache.get(unread_cache_key(self.user.pk)), 0)
+
+
+IN_MEMORY_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class NotificationPushTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='listener', password='password')
+
+    def test_broadcast_is_pushed_after_commit(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from .consumers import notification_group
+        from .models import Notification
+        from .notification_service import dispatch, wait_for_pushes
+
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(notification_group(self.user.pk), channel)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            dispatch([self.user], 'Exam', 'Room 4')
+        self.assertEqual(len(callbacks), 2)
+        wait_for_pushes(timeout=5)
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event['type'], 'notification.message')
+        self.assertEqual(event['notification']['message'], 'Room 4')
+        # the recipient's own delivery, ready for mark-read and delete
+        self.assertEqual(event['notification']['id'], Notification.objects.get(user=self.user).id)
+
+    def test_commit_does_not_wait_for_the_sends(self):
+        import asyncio
+        import threading
+        from unittest import mock
+        from .notification_service import dispatch, wait_for_pushes
+
+        class HeldLayer:
+            def __init__(self):
+                self.release = threading.Event()
+                self.sent = []
+
+            async def group_send(self, group, event):
+                while not self.release.is_set():
+                    await asyncio.sleep(0.01)
+                self.sent.append(group)
+
+        users = [User.objects.create_user(username=f'fan{i}') for i in range(250)]
+        layer = HeldLayer()
+        with mock.patch('portal.notification_service.get_channel_layer', return_value=layer):
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch(users, 'Exam', 'Room 4')
+        # the commit callbacks returned while every send is still held
+        self.assertEqual(layer.sent, [])
+        layer.release.set()
+        wait_for_pushes(timeout=5)
+        self.assertEqual(len(layer.sent), 250)
+
+    def test_push_queue_is_bounded(self):
+        import asyncio
+        import threading
+        from unittest import mock
+        from . import notification_service
+
+        class HeldLayer:
+            def __init__(self):
+                self.release = threading.Event()
+
+            async def group_send(self, group, event):
+                while not self.release.is_set():
+                    await asyncio.sleep(0.01)
+
+        layer = HeldLayer()
+        with mock.patch.object(notification_service, '_push_slots', threading.BoundedSemaphore(1)), \
+                mock.patch.object(notification_service, 'get_channel_layer', return_value=layer):
+            with self.captureOnCommitCallbacks() as callbacks:
+                notification_service.notify(self.user, 'First', 'a')
+                notification_service.notify(self.user, 'Second', 'b')
+            # counter and push callbacks per notification; the first push holds the only slot
+            first = callbacks[1]()
+            with mock.patch('builtins.print'):
+                self.assertIsNone(callbacks[3]())
+            layer.release.set()
+            first.result(timeout=5)
+
+    async def test_consumer_requires_login_and_forwards(self):
+        from channels.layers import get_channel_layer
+        from channels.testing import WebsocketCommunicator
+        from django.contrib.auth.models import AnonymousUser
+        from .consumers import NotificationConsumer, notification_group
+
+        anon = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+        anon.scope['user'] = AnonymousUser()
+        connected, _ = await anon.connect()
+        self.assertFalse(connected)
+
+        comm = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+        comm.scope['user'] = self.user
+        connected, _ = await comm.connect()
+        self.assertTrue(connected)
+        self.assertEqual(await comm.receive_json_from(), {'type': 'unread', 'unread_count': 0})
+
+        await get_channel_layer().group_send(notification_group(self.user.pk), {
+            'type': 'notification.message',
+            'notification': {'title': 'Hi', 'message': 'There'},
+        })
+        payload = await comm.receive_json_from()
+        self.assertEqual(payload['notification']['title'], 'Hi')
+        await comm.disconnect()
+
+
+class NotificationDeltaSyncTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='poller', password='password')
+        self.user.profile.role = 'student'
+        self.user.profile.save()
+        self.client.login(username='poller', password='password')
+
+    def test_since_cursor_etag_and_read_state(self):
+        from .notification_service import notify
+
+        first = notify(self.user, 'A', 'a')
+        resp = self.client.get('/api/student/notifications/')
+        data = resp.json()
+        etag = resp['ETag']
+        self.assertEqual(data['cursor'], first.id)
+
+        poll = {'since': data['cursor'], 'read_version': data['read_version']}
+        resp = self.client.get('/api/student/notifications/', poll, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = notify(self.user, 'B', 'b')
+        resp = self.client.get('/api/student/notifications/', poll, HTTP_IF_NONE_MATCH=etag)
+        data = resp.json()
+        self.assertEqual([n['id'] for n in data['notifications']], [second.id])
+        self.assertNotIn('unread_ids', data)
+
+        self.client.post('/notifications/mark-as-read/', {'notif_id': first.id})
+        poll = {'since': data['cursor'], 'read_version': data['read_version']}
+        resp = self.client.get('/api/student/notifications/', poll, HTTP_IF_NONE_MATCH=resp['ETag'])
+        data = resp.json()
+        self.assertEqual(data['notifications'], [])
+        self.assertEqual(data['unread_ids'], [second.id])
+        self.assertEqual(data['unread_count'], 1)
+
+    def test_since_pages_forward_through_a_backlog(self):
+        from .api_views import SINCE_PAGE_SIZE
+        from .models import Notification
+        from .notification_service import dispatch, notify
+
+        start = notify(self.user, 'Start', 's')
+        resp = self.client.get('/api/student/notifications/')
+        poll = {'since': resp.json()['cursor'], 'read_version': resp.json()['read_version']}
+        etag = resp['ETag']
+        for i in range(SINCE_PAGE_SIZE + 20):
+            dispatch([self.user], f'N{i}', 'body')
+        expected = list(Notification.objects.filter(user=self.user, id__gt=start.id).order_by('id').values_list('id', flat=True))
+
+        received = []
+        while True:
+            resp = self.client.get('/api/student/notifications/', poll, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            data = resp.json()
+            received += [n['id'] for n in data['notifications']]
+            self.assertEqual(data['cursor'], received[-1])
+            poll['since'], etag = data['cursor'], resp['ETag']
+            if not data['has_more']:
+                break
+        self.assertEqual(received, expected)
+        # caught up: the next poll is a 304
+        self.assertEqual(self.client.get('/api/student/notifications/', poll, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class NotificationArchiveTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='archivist', password='password')
+        self.client.login(username='archivist', password='password')
+
+    def test_archive_moves_old_read_rows_in_batches(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import Notification, NotificationArchive
+        from .notification_service import notify
+
+        for i in range(5):
+            notify(self.user, f'Old {i}', 'body')
+        recent = notify(self.user, 'Recent', 'body')
+        unread_old = notify(self.user, 'Unread', 'body')
+        old = timezone.now() - timedelta(days=200)
+        Notification.objects.exclude(pk=recent.pk).update(created_at=old)
+        Notification.objects.exclude(pk=unread_old.pk).update(is_read=True)
+
+        out = StringIO()
+        call_command('archive_notifications', '--days=90', '--dry-run', stdout=out)
+        self.assertIn('5 read notifications', out.getvalue())
+        self.assertEqual(NotificationArchive.objects.count(), 0)
+
+        out = StringIO()
+        call_command('archive_notifications', '--days=90', '--batch-size=2', stdout=out)
+        self.assertIn('Archived 5 notifications', out.getvalue())
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {recent.pk, unread_old.pk})
+        self.assertEqual(NotificationArchive.objects.filter(user=self.user).count(), 5)
+
+        resp = self.client.get('/notifications/?archived=1')
+        self.assertEqual(len(resp.context['notifications']), 5)
+        self.assertContains(resp, 'Old 0')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are checked with SQLite EXPLAIN QUERY PLAN')
+class HotQueryPlanTests(TestCase):
+    """The hot filters in views.py, api_views.py and live_updates.py must hit an index."""
+
+    def assertUsesIndex(self, qs, table, ordered_scan=False):
+        """Every access to ``table`` must be an index SEARCH.
+
+        ``ordered_scan`` allows walking an index in order, which is what a
+        "latest N rows" query with LIMIT should do.
+        """
+        plan = qs.explain()
+        lines = [line for line in plan.splitlines() if table in line]
+        self.assertTrue(lines, plan)
+        for line in lines:
+            self.assertIn('USING', line, f'full scan of {table}:\n{plan}')
+            if not ordered_scan:
+                self.assertIn('SEARCH', line, f'index scan instead of search on {table}:\n{plan}')
+
+    def test_notification_queries(self):
+        from .models import Notification
+        self.assertUsesIndex(Notification.objects.filter(user_id=1, is_read=False).values('id'), 'portal_notification')
+        self.assertUsesIndex(Notification.objects.filter(user_id=1).order_by('-created_at')[:10], 'portal_notification')
+
+    def test_attendance_queries(self):
+        from .models import Attendance
+        self.assertUsesIndex(Attendance.objects.filter(student_id=1, course_id=1, status=True), 'portal_attendance')
+        self.assertUsesIndex(Attendance.objects.filter(course_id=1, date=date(2025, 1, 1)), 'portal_attendance')
+        self.assertUsesIndex(Attendance.objects.filter(student_id=1, date__gte=date(2025, 1, 1)), 'portal_attendance')
+
+    def test_submission_queries(self):
+        from .models import Submission
+        self.assertUsesIndex(
+            Submission.objects.filter(student_id=1, marks_obtained__isnull=False).values('assignment_id', 'marks_obtained'),
+            'portal_submission',
+        )
+
+    def test_admin_dashboard_queries(self):
+        from .models import FinancialTransaction, Profile, StaffAttendance, StaffDailyAttendance
+        self.assertUsesIndex(StaffDailyAttendance.objects.filter(date=date(2025, 1, 1), status='absent').values('id'), 'portal_staffdailyattendance')
+        self.assertUsesIndex(FinancialTransaction.objects.order_by('-created_at')[:5], 'portal_financialtransaction', ordered_scan=True)
+        self.assertUsesIndex(Profile.objects.filter(role='student').values('id'), 'portal_profile')
+        since = timezone.now() - timedelta(days=1)
+        self.assertUsesIndex(StaffAttendance.objects.filter(timestamp__gte=since), 'portal_staffattendance')
+
+    def test_activity_feed_query(self):
+        from .models import ActivityEvent
+        self.assertUsesIndex(ActivityEvent.objects.filter(recipient_id=1).order_by('-created_at', '-id')[:11], 'portal_activityevent')
+
+
+    def test_schedule_occurrence_queries(self):
+        from .models import ScheduleOccurrence
+        self.assertUsesIndex(ScheduleOccurrence.objects.between(date(2025, 1, 6), date(2025, 1, 12)).filter(course_id__in=[1, 2]), 'portal_scheduleoccurrence')
+        self.assertUsesIndex(ScheduleOccurrence.objects.filter(date=date(2025, 1, 6), course_id__in=[1, 2]).values('id'), 'portal_scheduleoccurrence')
+
+    def test_reminder_queue_query(self):
+        from .reminders import pending
+        now = timezone.now()
+        self.assertUsesIndex(pending(now, now + timedelta(minutes=10)).values_list('remind_at', 'id'), 'portal_scheduleoccurrence')
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        from .models import Course, Enrollment
+        self.teacher = User.objects.create_user(username='tutor', password='password', first_name='Tina', last_name='Tutor')
+        self.teacher.profile.role = 'teacher'
+        self.teacher.profile.save()
+        self.student = User.objects.create_user(username='pupil', password='password', first_name='Pat')
+        self.student.profile.role = 'student'
+        self.student.profile.save()
+        course = Course.objects.create(name='Course', code='C201', teacher=self.teacher.profile)
+        Enrollment.objects.create(student=self.student.profile, course=course)
+        self.client.login(username='pupil', password='password')
+
+    def test_send_writes_thread_and_notifies(self):
+        import json
+        from .models import ChatMessage, Notification
+
+        resp = self.client.post('/api/chatbot/send-to-teacher/', json.dumps({'teacher_name': 'Tina Tutor', 'message': 'Hello'}),
+                                content_type='application/json')
+        self.assertTrue(resp.json()['success'])
+        self.assertEqual(ChatMessage.objects.get().body, 'Hello')
+        self.assertEqual(Notification.objects.filter(user=self.teacher).count(), 1)
+
+    def test_history_is_keyset_paginated(self):
+        from . import chat_service
+
+        for i in range(5):
+            chat_service.post_message(self.student, [self.teacher], f'm{i}')
+        url = '/api/chatbot/history/'
+        params = {'type': 'teacher', 'contact_id': self.teacher.profile.id, 'limit': 2}
+        # session, user, role check, contact, thread, one page of messages
+        with self.assertNumQueries(6):
+            first = self.client.get(url, params).json()
+        self.assertEqual([m['message'] for m in first['messages']], ['m4', 'm3'])
+        second = self.client.get(url, dict(params, before=first['next_before'])).json()
+        self.assertEqual([m['message'] for m in second['messages']], ['m2', 'm1'])
+        last = self.client.get(url, dict(params, before=second['next_before'])).json()
+        self.assertEqual([m['message'] for m in last['messages']], ['m0'])
+        self.assertIsNone(last['next_before'])
+
+
+class StudentStatsTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Assignment, Attendance, Course, Enrollment, Submission
+        cache.clear()
+        teacher = User.objects.create_user(username='statsteacher', password='password')
+        teacher.profile.role = 'teacher'
+        teacher.profile.save()
+        self.user = User.objects.create_user(username='statsstudent', password='password')
+        self.student = self.user.profile
+        self.student.role = 'student'
+        self.student.save()
+        for i in range(3):
+            course = Course.objects.create(name=f'Course {i}', code=f'S{i}', teacher=teacher.profile)
+            Enrollment.objects.create(student=self.student, course=course)
+            Attendance.objects.create(student=self.student, course=course, status=i != 0)
+            assignment = Assignment.objects.create(course=course, title='A', max_marks=100)
+            Submission.objects.create(assignment=assignment, student=self.student, marks_obtained=50 + i * 10)
+        self.client.login(username='statsstudent', password='password')
+
+    def test_stats_values_in_two_queries(self):
+        with self.assertNumQueries(2):
+            stats = StudentStats(self.student)
+            rows = [(c.course.code, c.total, c.present, c.avg_marks) for c in stats.courses]
+            overall = (stats.attendance_total, stats.attendance_present, stats.avg_marks)
+        self.assertEqual(rows, [('S0', 1, 0, 50.0), ('S1', 1, 1, 60.0), ('S2', 1, 1, 70.0)])
+        self.assertEqual(overall, (3, 2, 60.0))
+
+    def test_views_do_not_query_per_course(self):
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import Course, Enrollment
+
+        urls = ['/student/attendance/', '/api/student/attendance/', '/profile/', '/student-dashboard/']
+        before = {}
+        for url in urls:
+            self.client.get(url)  # warm up session/cache writes
+            cache.clear()  # measure cold response caches
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            before[url] = len(ctx)
+
+        teacher = Course.objects.first().teacher
+        for i in range(3, 8):
+            Enrollment.objects.create(student=self.student, course=Course.objects.create(name=f'C{i}', code=f'S{i}', teacher=teacher))
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(url)
+            self.assertEqual(len(ctx), before[url], url)
+
+    def test_summary_follows_writes_and_rebuild(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import Attendance, Course, StudentCourseSummary, Submission
+
+        course = Course.objects.get(code='S0')
+        summary = StudentCourseSummary.objects.get(student=self.student, course=course)
+        self.assertEqual((summary.present, summary.total, summary.graded_count, summary.marks_sum), (0, 1, 1, 50))
+        self.assertIsNotNone(summary.last_activity)
+
+        att = Attendance.objects.get(student=self.student, course=course)
+        att.status = True
+        att.save()
+        Submission.objects.filter(student=self.student, assignment__course=course).get().delete()
+        summary.refresh_from_db()
+        self.assertEqual((summary.present, summary.graded_count, summary.marks_sum), (1, 0, 0))
+
+        # Bulk writes bypass signals; the rebuild command repairs them.
+        Attendance.objects.filter(student=self.student).update(status=False)
+        call_command('rebuild_student_summaries', '--batch-size=1', stdout=StringIO())
+        self.assertEqual(StudentStats(self.student).attendance_present, 0)
+
+        course.delete()
+        self.assertFalse(StudentCourseSummary.objects.filter(course_id=course.pk).exists())
+
+
+class ActivityFeedTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Course, Enrollment
+        cache.clear()
+        self.teacher = User.objects.create_user(username='feedteacher', password='password')
+        self.teacher.profile.role = 'teacher'
+        self.teacher.profile.save()
+        self.students = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'feedstudent{i}', password='password')
+            user.profile.role = 'student'
+            user.profile.save()
+            self.students.append(user.profile)
+        self.course = Course.objects.create(name='Feeds', code='F101', teacher=self.teacher.profile)
+        for profile in self.students:
+            Enrollment.objects.create(student=profile, course=self.course)
+
+    def test_writes_fan_out_to_feeds(self):
+        from .models import ActivityEvent, Assignment, Attendance, StudyMaterial, Submission
+
+        assignment = Assignment.objects.create(course=self.course, title='Essay', max_marks=50, is_draft=True)
+        self.assertFalse(ActivityEvent.objects.exists())
+        assignment.is_draft = False
+        assignment.save()
+        StudyMaterial.objects.create(course=self.course, title='Notes', file='materials/notes.pdf')
+        att = Attendance.objects.create(student=self.students[0], course=self.course, status=True)
+        att.save()  # unchanged: no new event
+        sub = Submission.objects.create(assignment=assignment, student=self.students[0])
+        sub.marks_obtained = 40
+        sub.save()
+
+        kinds = lambda p: list(ActivityEvent.objects.filter(recipient=p).values_list('kind', flat=True))
+        self.assertEqual(kinds(self.students[0]), ['performance', 'attendance', 'material', 'assignment'])
+        self.assertEqual(kinds(self.students[1]), ['material', 'assignment'])
+        self.assertEqual(kinds(self.teacher.profile), ['submission', 'attendance', 'assignment'])
+        self.assertEqual(ActivityEvent.objects.get(kind='performance').score, 80.0)
+
+    def test_live_updates_read_one_keyset_page(self):
+        from django.core.cache import cache
+        from . import activity
+
+        student = self.students[0]
+        for i in range(5):
+            activity.record([student.pk], 'material', f'm{i}', course_id=self.course.pk)
+        self.client.login(username='feedstudent0', password='password')
+        url = '/api/live-updates/'
+        self.client.get(url)
+        cache.clear()
+        # session, user, profile, ETag stamp, enrolled courses (cache scopes), one feed page
+        with self.assertNumQueries(6):
+            first = self.client.get(url).json()
+        with self.assertNumQueries(4):  # cached until the student or one of their courses changes
+            self.assertEqual(self.client.get(url).json(), first)
+        self.assertEqual([u['title'] for u in first['updates']], ['m4', 'm3', 'm2', 'm1', 'm0'])
+        self.assertEqual(first['updates'][0]['type'], 'course')
+        self.assertIsNone(first['next_before'])
+
+        page, cursor = activity.feed(student, limit=2)
+        self.assertEqual([e.title for e in page], ['m4', 'm3'])
+        page, cursor = activity.feed(student, before=cursor, limit=2)
+        self.assertEqual([e.title for e in page], ['m2', 'm1'])
+        page, cursor = activity.feed(student, before=cursor, limit=2)
+        self.assertEqual(([e.title for e in page], cursor), (['m0'], None))
+
+    def test_teacher_updates_and_backfill(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import ActivityEvent, Attendance
+
+        Attendance.objects.bulk_create([Attendance(student=p, course=self.course, status=True) for p in self.students])
+        self.assertFalse(ActivityEvent.objects.exists())
+        call_command('backfill_activity', stdout=StringIO())
+        call_command('backfill_activity', stdout=StringIO())
+        self.assertEqual(ActivityEvent.objects.count(), 6)
+
+        self.client.login(username='feedteacher', password='password')
+        activities = self.client.get('/teacher/dashboard/updates/').json()['recent_activities']
+        self.assertEqual(len(activities), 3)
+        self.assertEqual(activities[0]['title'], 'Attendance recorded for F101')
+
+
+class StudentBootstrapTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Assignment, Course, Enrollment, StudyMaterial
+        cache.clear()
+        teacher = User.objects.create_user(username='bootteacher', password='password')
+        teacher.profile.role = 'teacher'
+        teacher.profile.save()
+        self.user = User.objects.create_user(username='bootstudent', password='password')
+        self.user.profile.role = 'student'
+        self.user.profile.save()
+        for i in range(2):
+            course = Course.objects.create(name=f'Boot {i}', code=f'B{i}', teacher=teacher.profile)
+            Enrollment.objects.create(student=self.user.profile, course=course)
+            Assignment.objects.create(course=course, title=f'Task {i}', due_date=date.today())
+            StudyMaterial.objects.create(course=course, title=f'Notes {i}', file='materials/notes.pdf')
+        self.client.login(username='bootstudent', password='password')
+
+    def test_sections_match_endpoints_and_share_enrollments(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/student/bootstrap/').json()
+        enrollment_queries = [q['sql'] for q in ctx.captured_queries if 'FROM "portal_enrollment"' in q['sql']]
+        # one for the ETag stamp, one to load them for every section
+        self.assertEqual(len(enrollment_queries), 2, enrollment_queries)
+
+        for name, url in [('tasks', '/api/student/tasks/'), ('courses', '/api/student/courses/'),
+                          ('attendance', '/api/student/attendance/'), ('latest_uploads', '/api/latest-uploads/')]:
+            self.assertEqual(data[name], self.client.get(url).json(), name)
+        self.assertEqual(data['live_updates']['updates'][0]['type'], 'course')
+
+    def test_section_selector_and_cache(self):
+        from .notification_service import notify
+
+        resp = self.client.get('/api/student/bootstrap/', {'sections': 'tasks,bogus'})
+        self.assertEqual(resp.status_code, 400)
+
+        url = '/api/student/bootstrap/?sections=courses,notifications'
+        first = self.client.get(url).json()
+        self.assertEqual(set(first), {'courses', 'notifications'})
+        self.assertEqual(first['notifications']['total_count'], 0)
+
+        # Cached sections skip their queries; notifications are keyed on their
+        # own version stamp and show a new notification immediately.
+        notify(self.user, 'Hello', 'World')
+        with self.assertNumQueries(4):  # session, user, profile, enrollment stamp
+            self.client.get('/api/student/bootstrap/?sections=courses')
+        second = self.client.get(url).json()
+        self.assertEqual(second['courses'], first['courses'])
+        self.assertEqual(second['notifications']['notifications'][0]['title'], 'Hello')
+
+
+class VersionedCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Course, Enrollment
+        cache.clear()
+        teacher = User.objects.create_user(username='cacheteacher', password='password')
+        teacher.profile.role = 'teacher'
+        teacher.profile.save()
+        self.student = User.objects.create_user(username='cachestudent', password='password').profile
+        self.student.role = 'student'
+        self.student.save()
+        self.course = Course.objects.create(name='Cached', code='C101', teacher=teacher.profile)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.login(username='cacheteacher', password='password')
+
+    def test_writes_invalidate_cached_teacher_payloads(self):
+        from .models import Assignment, Submission
+
+        url = f'/teacher/course/{self.course.id}/students-json/'
+        self.assertEqual(self.client.get(url).json()['students'][0]['avg_marks'], 0.0)
+        with self.assertNumQueries(4):  # session, user, profile, course access
+            self.client.get(url)
+
+        assignment = Assignment.objects.create(course=self.course, title='Quiz')
+        Submission.objects.create(assignment=assignment, student=self.student, marks_obtained=80)
+        self.assertEqual(self.client.get(url).json()['students'][0]['avg_marks'], 80.0)
+
+        updates = self.client.get('/teacher/dashboard/updates/').json()
+        self.assertEqual(updates['pending_tasks'], 1)
+        Assignment.objects.create(course=self.course, title='Quiz 2')
+        self.assertEqual(self.client.get('/teacher/dashboard/updates/').json()['pending_tasks'], 2)
+
+
+class ConditionalPollingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Course, Enrollment
+        cache.clear()
+        teacher = User.objects.create_user(username='pollteacher', password='password')
+        teacher.profile.role = 'teacher'
+        teacher.profile.save()
+        self.user = User.objects.create_user(username='pollstudent', password='password')
+        self.user.profile.role = 'student'
+        self.user.profile.save()
+        self.course = Course.objects.create(name='Polling', code='P101', teacher=teacher.profile)
+        Enrollment.objects.create(student=self.user.profile, course=self.course)
+        admin = User.objects.create_user(username='polladmin', password='password')
+        admin.profile.role = 'superadmin'
+        admin.profile.save()
+
+    def test_unchanged_poll_is_304_without_running_view(self):
+        from .models import Assignment
+
+        self.client.login(username='pollstudent', password='password')
+        url = '/api/student/tasks/'
+        first = self.client.get(url)
+        etag = first['ETag']
+        # session, user, profile, enrollment stamp, assignment stamp; the table version is a cache read
+        with self.assertNumQueries(5):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        assignment = Assignment.objects.create(course=self.course, title='New')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['count'], 1)
+        self.assertNotEqual(changed['ETag'], etag)
+
+        # an in-place edit changes neither the row count nor the max pk
+        etag = changed['ETag']
+        assignment.title = 'Renamed'
+        assignment.save()
+        edited = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(edited.status_code, 200)
+        self.assertNotEqual(edited['ETag'], etag)
+
+    def test_admin_endpoints_and_denied_responses(self):
+        from .models import StaffMember
+
+        self.client.login(username='polladmin', password='password')
+        for url in ['/superadmin/updates/', '/admin2/updates/', '/admin2/attendance/summary/', '/superadmin/staff-attendance/updates/']:
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304, url)
+
+        # whole-table stamps come from the table versions: no aggregate over the tables
+        from django.test.utils import CaptureQueriesContext
+        from .models import FeePayment
+        etag = self.client.get('/admin2/updates/')['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/admin2/updates/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'portal_feepayment' in q['sql'] or 'COUNT(' in q['sql']])
+        FeePayment.objects.create(student=self.user.profile, amount=100)
+        self.assertEqual(self.client.get('/admin2/updates/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get('/admin2/attendance/summary/')['ETag']
+        StaffMember.objects.create(profile=self.user.profile)
+        self.assertEqual(self.client.get('/admin2/attendance/summary/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Errors never carry an ETag
+        self.client.login(username='pollstudent', password='password')
+        resp = self.client.get('/admin2/updates/')
+        self.assertEqual(resp.status_code, 403)
+        self.assertFalse(resp.has_header('ETag'))
+
+
+class SeriesTests(TestCase):
+    def test_parse_range(self):
+        from . import series
+
+        today = date(2025, 3, 12)  # a Wednesday
+        self.assertEqual(series.parse_range('7d', today), (date(2025, 3, 6), today))
+        self.assertEqual(series.parse_range('2w', today), (date(2025, 3, 3), today))  # this week and last
+        self.assertEqual(series.parse_range('3m', today), (date(2025, 1, 1), today))
+        self.assertEqual(series.parse_range('2025-01-01:2025-01-31', today), (date(2025, 1, 1), date(2025, 1, 31)))
+        for bad in ['', 'soon', '0d', '2025-02-01:2025-01-01', '50y']:
+            with self.assertRaises(ValueError):
+                series.parse_range(bad, today)
+
+    def test_series_is_one_query_with_zero_fill_and_downsampling(self):
+        from .models import StaffDailyAttendance, StaffMember
+        from . import series
+
+        user = User.objects.create_user(username='seriesstaff', password='password')
+        staff = StaffMember.objects.create(profile=user.profile)
+        end = date(2025, 1, 30)
+        for offset in (0, 0, 3, 29):
+            other = StaffMember.objects.create(profile=User.objects.create_user(username=f's{offset}{StaffMember.objects.count()}').profile)
+            StaffDailyAttendance.objects.create(staff=other, date=end - timedelta(days=offset), status='absent')
+        StaffDailyAttendance.objects.create(staff=staff, date=end, status='present')
+
+        qs = StaffDailyAttendance.objects.filter(status='absent')
+        with self.assertNumQueries(1):
+            daily = series.series(qs, 'date', end - timedelta(days=29), end, 'day')
+        self.assertEqual(len(daily), 30)
+        self.assertEqual((daily[0]['count'], daily[-4]['count'], daily[-1]['count'], sum(b['count'] for b in daily)), (1, 1, 2, 4))
+
+        merged = series.series(qs, 'date', end - timedelta(days=29), end, 'day', points=7)
+        self.assertLessEqual(len(merged), 7)
+        self.assertEqual(sum(b['count'] for b in merged), 4)
+
+        monthly = series.series(qs, 'date', date(2024, 12, 1), end, 'month')
+        self.assertEqual([(b['start'], b['count']) for b in monthly], [(date(2024, 12, 1), 0), (date(2025, 1, 1), 4)])
+
+    def test_chart_views_accept_range(self):
+        from django.core.cache import cache
+        from .models import Attendance, Course
+
+        cache.clear()
+
+        admin = User.objects.create_user(username='seriesadmin', password='password')
+        admin.profile.role = 'superadmin'
+        admin.profile.save()
+        self.client.login(username='seriesadmin', password='password')
+        data = self.client.get('/superadmin/updates/', {'range': '14d'}).json()
+        self.assertEqual(len(data['signup_counts']), 14)
+        self.assertEqual(data['signup_counts'][-1], User.objects.count())
+        self.assertEqual(self.client.get('/superadmin/updates/', {'range': 'forever'}).status_code, 400)
+        trend = self.client.get('/admin2/attendance/ai-insights/', {'range': '3m', 'bucket': 'month'}).json()
+        self.assertEqual(len(trend['absent_trend']), 3)
+
+        student = User.objects.create_user(username='seriesstudent', password='password')
+        student.profile.role = 'student'
+        student.profile.save()
+        Attendance.objects.create(student=student.profile, course=Course.objects.create(name='S', code='SER1', teacher=admin.profile), status=True)
+        self.client.login(username='seriesstudent', password='password')
+        weekly = self.client.get('/api/student/attendance/').json()['weekly']
+        self.assertEqual([w['week'] for w in weekly], ['W5', 'W4', 'W3', 'W2', 'W1'])
+        self.assertEqual((weekly[-1]['present'], weekly[-1]['total'], weekly[-1]['percent']), (1, 1, 100.0))
+        self.assertEqual(len(self.client.get('/api/student/attendance/', {'range': '12w', 'points': 4}).json()['weekly']), 4)
+
+
+class ScheduleOccurrenceTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Course, Enrollment
+        cache.clear()
+        self.teacher = User.objects.create_user(username='calteacher', password='password').profile
+        self.teacher.role = 'teacher'
+        self.teacher.save()
+        self.student = User.objects.create_user(username='calstudent', password='password').profile
+        self.student.role = 'student'
+        self.student.save()
+        self.course = Course.objects.create(name='Calendars', code='CAL1', teacher=self.teacher)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.today = timezone.localdate()
+        self.monday = self.today - timedelta(days=self.today.weekday())
+
+    def _schedule(self, **kwargs):
+        from .models import Schedule
+        from datetime import time
+        fields = dict(title='Lecture', date=self.monday, start_time=time(9), end_time=time(10, 30), course=self.course, created_by=self.teacher)
+        fields.update(kwargs)
+        return Schedule.objects.create(**fields)
+
+    def test_rule_is_expanded_and_edits_touch_one_series(self):
+        from .recurrence import HORIZON_DAYS
+
+        weekly = self._schedule(is_recurring=True, recurrence_rule='FREQ=WEEKLY;BYDAY=MO,WE')
+        once = self._schedule(title='Exam', date=self.today + timedelta(days=3))
+        broken = self._schedule(title='Broken', is_recurring=True, recurrence_rule='FREQ=SOMETIMES')
+        dates = list(weekly.occurrences.values_list('date', flat=True))
+        self.assertEqual(dates[:3], [self.monday, self.monday + timedelta(days=2), self.monday + timedelta(days=7)])
+        self.assertLessEqual(dates[-1], self.today + timedelta(days=HORIZON_DAYS))
+        self.assertEqual(list(broken.occurrences.values_list('date', flat=True)), [self.monday])
+
+        once_ids = list(once.occurrences.values_list('id', flat=True))
+        weekly.recurrence_rule = 'FREQ=WEEKLY;BYDAY=FR;COUNT=2'
+        weekly.save()
+        self.assertEqual(list(weekly.occurrences.values_list('date', flat=True)),
+                         [self.monday + timedelta(days=4), self.monday + timedelta(days=11)])
+        self.assertEqual(list(once.occurrences.values_list('id', flat=True)), once_ids)
+
+        weekly.is_active = False
+        weekly.save()
+        self.assertFalse(weekly.occurrences.exists())
+
+    def test_calendar_reads_use_occurrences(self):
+        from django.core.management import call_command
+        from .models import ScheduleOccurrence
+
+        self._schedule(date=self.today, is_recurring=True, recurrence_rule='FREQ=DAILY;COUNT=3')
+        ScheduleOccurrence.objects.all().delete()
+        call_command('materialize_schedules', stdout=StringIO())
+        self.assertEqual(ScheduleOccurrence.objects.count(), 3)
+
+        self.client.login(username='calstudent', password='password')
+        upcoming = self.client.get('/api/student/schedules/').json()['schedules']
+        self.assertEqual([s['date'] for s in upcoming], [(self.today + timedelta(days=i)).isoformat() for i in range(3)])
+        timetable = self.client.get('/api/student/timetable/').json()['timetable']
+        self.assertEqual(timetable[0]['subject'], 'Calendars')
+        self.assertEqual(timetable[0]['time'], '9:00-10:30')
+        self.assertEqual(self.client.get('/api/student/timetable/', {'date': 'soon'}).status_code, 400)
+
+        self.client.login(username='calteacher', password='password')
+        self.assertEqual(self.client.get('/teacher-dashboard/').context['classes_today'], 1)
+
+    def test_one_off_schedules_beyond_the_horizon_are_listed(self):
+        from .recurrence import HORIZON_DAYS
+
+        far = self._schedule(title='Graduation', date=self.today + timedelta(days=HORIZON_DAYS + 200), is_public=True)
+        self.assertEqual(list(far.occurrences.values_list('date', flat=True)), [far.date])
+        self.client.login(username='calstudent', password='password')
+        self.assertIn('Graduation', [o.schedule.title for o in self.client.get('/schedules/').context['occurrences']])
+        self.assertIn('Graduation', [s['title'] for s in self.client.get('/api/student/schedules/').json()['schedules']])
+
+    def test_student_schedule_page_is_paginated(self):
+        from .views import STUDENT_SCHEDULES_PER_PAGE
+
+        self._schedule(date=self.today, is_recurring=True, recurrence_rule='FREQ=DAILY')
+        self.client.login(username='calstudent', password='password')
+        first = self.client.get('/schedules/')
+        self.assertEqual(len(first.context['occurrences']), STUDENT_SCHEDULES_PER_PAGE)
+        self.assertTrue(first.context['is_paginated'])
+        self.assertEqual(first.context['occurrences'][0].date, self.today)
+        second = self.client.get('/schedules/', {'page': 2})
+        self.assertEqual(second.context['occurrences'][0].date, self.today + timedelta(days=STUDENT_SCHEDULES_PER_PAGE))
+
+
+class FakeClock:
+    """Clock and sleep for ReminderScheduler: sleeping moves the time forward."""
+
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = 0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self.now += timedelta(seconds=seconds)
+
+
+class ScheduleReminderTests(TestCase):
+    def setUp(self):
+        from datetime import datetime, time
+        from .models import Course, Enrollment
+        teacher = User.objects.create_user(username='remindteacher', password='password').profile
+        teacher.role = 'teacher'
+        teacher.save()
+        self.course = Course.objects.create(name='Reminders', code='REM1', teacher=teacher)
+        for i in range(3):
+            Enrollment.objects.create(student=User.objects.create_user(username=f'remind{i}').profile, course=self.course)
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.start = datetime.combine(self.day, time(8), tzinfo=timezone.utc)
+
+    def _schedules(self, count, start_time, **kwargs):
+        from unittest import mock
+        from .models import Schedule
+        # skip the creation-time broadcast; only reminders are under test
+        with mock.patch('portal.notification_service.dispatch', return_value=0):
+            return [Schedule.objects.create(title=f'Class {i}', date=self.day, start_time=start_time, course=self.course,
+                                            notify_students=True, reminder_minutes=30, **kwargs)
+                    for i in range(count)]
+
+    def _reminders(self):
+        from .models import NotificationMessage
+        return NotificationMessage.objects.filter(title__startswith='⏰ Reminder')
+
+    def test_reminders_fire_on_time_in_batches(self):
+        from datetime import time
+        from django.test.utils import CaptureQueriesContext
+        from .models import ScheduleOccurrence
+        from .reminders import ReminderScheduler
+
+        self._schedules(120, time(9))  # all due at 08:30
+        for minute in range(10, 60, 5):  # due 08:40 .. 09:25
+            self._schedules(1, time(9, minute))
+
+        clock = FakeClock(self.start)
+        scheduler = ReminderScheduler(clock=clock, sleep=clock.sleep, batch_size=50)
+        with CaptureQueriesContext(connection) as ctx:
+            scheduler.run(until=self.start + timedelta(hours=2))
+
+        self.assertEqual(scheduler.sent, 130)
+        self.assertEqual(self._reminders().count(), 130)
+        self.assertEqual(self._reminders().first().recipient_count, 4)
+        for due, sent in ScheduleOccurrence.objects.values_list('remind_at', 'reminder_sent_at'):
+            self.assertLessEqual(sent - due, timedelta(seconds=1))
+        claims = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "portal_scheduleoccurrence"')]
+        self.assertEqual(len(claims), 3 + 10)  # 120 simultaneous reminders in batches of 50, then one each
+        # woken for refreshes and due times only, never busy-waiting
+        self.assertLessEqual(clock.sleeps, 2 * 60 * 60 / 30 + 11 + 2)
+
+    def test_restart_and_edits_never_double_send(self):
+        from datetime import time
+        from .reminders import ReminderScheduler
+
+        schedule, = self._schedules(1, time(9))
+        late, = self._schedules(1, time(7))  # due 06:30, long overdue at 08:00
+
+        clock = FakeClock(self.start + timedelta(minutes=29))
+        ReminderScheduler(clock=clock, sleep=clock.sleep).run(until=self.start + timedelta(minutes=31))
+        self.assertEqual(self._reminders().count(), 1)
+
+        # a restarted worker and an edit that keeps the time send nothing new
+        schedule.location = 'Room 2'
+        schedule.save()
+        ReminderScheduler(clock=clock, sleep=clock.sleep).run(until=clock.now + timedelta(minutes=5))
+        self.assertEqual(self._reminders().count(), 1)
+
+        # moving the class re-arms its reminder
+        schedule.start_time = time(9, 10)
+        schedule.save()
+        ReminderScheduler(clock=clock, sleep=clock.sleep).run(until=clock.now + timedelta(minutes=10))
+        self.assertEqual(self._reminders().count(), 2)
+        self.assertIn('Room 2', self._reminders().order_by('-id').first().body)
+
+
+# A backend shared between processes, as the study activity buffer requires
+SHARED_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'xplorehub-test-cache'),
+}}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class StudyActivityTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='studyuser', password='password')
+        self.user.profile.role = 'student'
+        self.user.profile.save()
+
+    def test_requests_are_buffered_not_inserted(self):
+        from django.test.utils import CaptureQueriesContext
+        from .models import StudyEvent
+        from . import study_activity
+
+        self.client.login(username='studyuser', password='password')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/student-dashboard/')
+            self.client.get('/api/student/tasks/')  # JSON polls are not study activity
+        self.assertFalse([q for q in ctx.captured_queries if 'portal_studyevent' in q['sql']])
+        self.assertEqual(study_activity.buffered(), 1)
+
+        self.assertEqual(study_activity.flush(), 1)
+        self.assertEqual(study_activity.buffered(), 0)
+        self.assertEqual(list(StudyEvent.objects.values_list('kind', 'path')), [('page', '/student-dashboard/')])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_records_nothing(self):
+        from unittest import mock
+        from . import study_activity
+
+        with mock.patch.object(study_activity, '_warned_unshared', False):
+            with self.assertLogs('portal.study_activity', 'WARNING'):
+                study_activity.record(self.user.pk, 'page', '/student-dashboard/')
+            study_activity.record(self.user.pk, 'page', '/student-dashboard/')
+        self.assertEqual(study_activity.buffered(), 0)
+
+    def test_rollups_feed_analytics(self):
+        from datetime import datetime
+        from django.core.cache import cache
+        from .models import StudyHour
+        from . import study_activity
+
+        day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+        at = lambda h, m: (day + timedelta(hours=h, minutes=m)).timestamp()
+        for minute in (0, 10, 20, 30):
+            study_activity.record(self.user.pk, 'page', '/student-dashboard/', at(9, minute))
+        study_activity.record(self.user.pk, 'page', '/student-dashboard/', at(14, 0))
+        # a counter taken whose value is not stored yet is left for the next flush
+        cache.incr(study_activity.SEQ_KEY)
+        self.assertEqual(study_activity.flush(), 5)
+        cache.set(study_activity.ENTRY_KEY.format(6), (self.user.pk, 'action', '/submit/', at(14, 20)))
+        self.assertEqual(study_activity.flush(), 1)
+
+        hours = {h.hour.hour: (h.events, h.active_seconds, h.sessions) for h in StudyHour.objects.filter(user=self.user)}
+        self.assertEqual(hours, {9: (4, 3 * 600 + 60, 1), 14: (2, 1200 + 60, 1)})
+
+        self.client.login(username='studyuser', password='password')
+        data = self.client.get('/api/analytics/').json()
+        self.assertEqual(data['peak_hours'], '9 AM - 11 AM')
+        self.assertEqual(data['weekly_total'], round((1860 + 1260) / 3600, 1))
+        self.assertEqual(data['avg_session'], round((1860 + 1260) / 2 / 3600, 1))
+
+
+class TeacherStatsTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.teacher = User.objects.create_user(username='statsteacher', password='password').profile
+        self.teacher.role = 'teacher'
+        self.teacher.save()
+        self.students = []
+        for i in range(3):
+            student = User.objects.create_user(username=f'statsstudent{i}').profile
+            student.role = 'student'
+            student.save()
+            self.students.append(student)
+        self.client.login(username='statsteacher', password='password')
+
+    def _add_course(self, n):
+        from .models import Assignment, Attendance, Course, Enrollment, Submission
+        course = Course.objects.create(name=f'Stats {n}', code=f'ST{n}', teacher=self.teacher)
+        assignment = Assignment.objects.create(course=course, title=f'Quiz {n}', due_date=date.today())
+        for i, student in enumerate(self.students[:n % 3 + 1]):
+            Enrollment.objects.create(student=student, course=course)
+            Attendance.objects.create(student=student, course=course, date=date.today(), status=i != 1)
+            Submission.objects.create(assignment=assignment, student=student, marks_obtained=90 - 10 * i)
+        return course
+
+    def _queries(self, url):
+        from django.core.cache import cache
+        from django.test.utils import CaptureQueriesContext
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_stats_values(self):
+        from .teacher_stats import TeacherStats
+
+        for n in range(3):
+            self._add_course(n)
+        stats = TeacherStats(self.teacher)
+        self.assertEqual([c.student_count for c in stats.courses], [1, 2, 3])
+        self.assertEqual(stats.total_students, 3)
+        self.assertEqual(round(stats.avg_attendance, 2), round((100 + 50 + 200 / 3) / 3, 2))
+        self.assertEqual(stats.top_course.code, 'ST2')
+        self.assertEqual(stats.pending_assignments().count(), 3)
+        top = list(stats.top_students())
+        self.assertEqual([(p.pk, p.avg_marks) for p in top],
+                         [(self.students[0].pk, 90.0), (self.students[1].pk, 80.0), (self.students[2].pk, 70.0)])
+
+    def test_views_do_not_query_per_course(self):
+        urls = ['/teacher-dashboard/', '/teacher/dashboard/updates/', '/profile/']
+        self._add_course(0)
+        few = [self._queries(url) for url in urls]
+        for n in range(1, 5):
+            self._add_course(n)
+        self.assertEqual([self._queries(url) for url in urls], few)
+
+        resp = self.client.get('/teacher-dashboard/')
+        self.assertEqual(resp.context['total_students'], 3)
+        self.assertEqual(resp.context['top_students'][0]['avg_marks'], 90.0)
+        self.assertEqual(self.client.get('/profile/').context['course_stats'][0]['students'], 1)
+
+
+class AttendanceMarkingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Course
+        cache.clear()
+        self.teacher = User.objects.create_user(username='markteacher', password='password').profile
+        self.teacher.role = 'teacher'
+        self.teacher.save()
+        self.course = Course.objects.create(name='Marking', code='MRK1', teacher=self.teacher)
+        self.students = []
+        self._enroll(4)
+        self.client.login(username='markteacher', password='password')
+
+    def _enroll(self, count):
+        from .models import Enrollment
+        for _ in range(count):
+            student = User.objects.create_user(username=f'mark{len(self.students)}').profile
+            Enrollment.objects.create(student=student, course=self.course)
+            self.students.append(student)
+
+    def _post(self, body):
+        import json
+        return self.client.post(f'/teacher/attendance/{self.course.id}/mark/', json.dumps(body), content_type='application/json')
+
+    def test_form_marks_whole_roster_and_keeps_derived_data(self):
+        from .models import ActivityEvent, Attendance, StudentCourseSummary
+
+        first, second = self.students[:2]
+        self.client.post(f'/teacher/attendance/{self.course.id}/', {f'student_{first.id}': 'present'})
+        self.assertEqual(dict(Attendance.objects.values_list('student_id', 'status')),
+                         {s.id: s == first for s in self.students})
+        self.assertEqual(StudentCourseSummary.objects.get(student=first, course=self.course).present, 1)
+        self.assertEqual(ActivityEvent.objects.filter(recipient=self.teacher).first().detail, '1 present, 3 absent')
+
+        # re-marking updates in place and only touches the students that changed
+        data = self._post({'present': f'{first.id},{second.id}'}).json()
+        self.assertEqual((data['present'], data['absent'], data['changed']), (2, 2, 1))
+        self.assertEqual(Attendance.objects.count(), 4)
+        self.assertEqual(StudentCourseSummary.objects.get(student=second, course=self.course).present, 1)
+        self.assertEqual(ActivityEvent.objects.filter(recipient=second).count(), 2)
+        self.assertEqual(ActivityEvent.objects.filter(recipient=first).count(), 1)
+
+    def test_json_api_validation_and_constant_queries(self):
+        from django.test.utils import CaptureQueriesContext
+        from .models import Attendance
+
+        ids = [s.id for s in self.students]
+        resp = self._post({'date': '2025-01-06', 'absent': ids[:1], 'rest': 'unchanged'})
+        self.assertEqual(resp.json()['changed'], 1)
+        self.assertEqual(Attendance.objects.filter(date=date(2025, 1, 6)).count(), 1)
+        self.assertEqual(self._post({'present': [ids[0], 999999]}).status_code, 400)
+        self.assertEqual(self._post({'present': ids[:1], 'absent': ids[:1]}).status_code, 400)
+        self.assertEqual(self._post({'rest': 'maybe'}).status_code, 400)
+        self.assertEqual(self._post(['not', 'an', 'object']).status_code, 400)
+
+        def queries(day):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self._post({'date': day, 'present': [s.id for s in self.students[::2]]}).status_code, 200)
+            return len(ctx.captured_queries)
+
+        small = queries('2025-02-03')
+        self._enroll(30)
+        self.assertEqual(queries('2025-02-04'), small)
+
+        other = User.objects.create_user(username='othermarker', password='password').profile
+        other.role = 'teacher'
+        other.save()
+        self.client.login(username='othermarker', password='password')
+        self.assertEqual(self._post({'present': ids}).status_code, 403)
+
+
+class GradebookTests(TestCase):
+    def setUp(self):
+        from .models import Assignment, Course, Enrollment, Submission
+        self.teacher = User.objects.create_user(username='gbteacher', password='password').profile
+        self.teacher.role = 'teacher'
+        self.teacher.save()
+        self.course = Course.objects.create(name='Grades', code='GRD1', teacher=self.teacher)
+        self.a1 = Assignment.objects.create(course=self.course, title='Essay', due_date=date(2025, 3, 1), max_marks=50)
+        self.a2 = Assignment.objects.create(course=self.course, title='Exam', due_date=date(2025, 4, 1))
+        self.students = []
+        for name, marks in (('ann', (40, 80)), ('bob', (20, None)), ('cid', (None, None))):
+            student = User.objects.create_user(username=name, last_name=name).profile
+            Enrollment.objects.create(student=student, course=self.course)
+            self.students.append(student)
+            for assignment, m in zip((self.a1, self.a2), marks):
+                if m is not None or name == 'bob':
+                    Submission.objects.create(assignment=assignment, student=student, marks_obtained=m)
+        self.client.login(username='gbteacher', password='password')
+
+    def test_matrix_and_statistics(self):
+        from .gradebook import Gradebook
+
+        with self.assertNumQueries(3):
+            gb = Gradebook(self.course)
+        self.assertEqual(gb.marks, [[40, 80], [20, None], [None, None]])
+        self.assertEqual(gb.row_stats[0], {'graded': 2, 'total': 120, 'mean': 60.0, 'percentage': 80.0})
+        self.assertEqual(gb.row_stats[2]['mean'], None)
+        self.assertEqual(gb.column_stats[0], {'submitted': 2, 'graded': 2, 'mean': 30.0, 'min': 20, 'max': 40})
+        # bob's ungraded exam counts as submitted, not graded
+        self.assertEqual((gb.column_stats[1]['submitted'], gb.column_stats[1]['graded']), (2, 1))
+        self.assertEqual(Gradebook(self.course, start=date(2025, 3, 15)).marks, [[80], [None], [None]])
+
+    def test_endpoint_formats_and_reports(self):
+        import csv as csvlib
+
+        url = f'/teacher/course/{self.course.id}/gradebook/'
+        data = self.client.get(url).json()
+        self.assertEqual([a['title'] for a in data['assignments']], ['Essay', 'Exam'])
+        self.assertEqual(data['students'][1]['marks'], [20, None])
+
+        resp = self.client.get(url, {'format': 'csv'})
+        self.assertTrue(resp.streaming)
+        rows = list(csvlib.reader(b''.join(resp.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:4], ['Username', 'Full name', 'Essay (/50)', 'Exam (/100)'])
+        self.assertEqual(rows[1][2:], ['40', '80', '2', '60.0', '80.0'])
+        self.assertEqual(rows[4][:4], ['Average', '', '30.0', '80.0'])
+        # without openpyxl the XLSX request falls back to CSV
+        self.assertIn(self.client.get(url, {'format': 'xlsx'})['Content-Type'],
+                      ('text/csv; charset=utf-8', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'))
+        self.assertEqual(self.client.get(url, {'format': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'soon'}).status_code, 400)
+
+        report = self.client.get(f'/teacher/course/{self.course.id}/report/').content.decode()
+        self.assertIn('ann,ann,,,,,60.0', report)
+        averages = self.client.get(f'/teacher/course/{self.course.id}/assignment-averages/').content.decode().splitlines()
+        self.assertEqual(averages[1].split(',')[3:], ['30.0', '2'])
+
+        other = User.objects.create_user(username='gbother', password='password').profile
+        other.role = 'teacher'
+        other.save()
+        self.client.login(username='gbother', password='password')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Assignment, Course, Option, Question
+        cache.clear()
+        self.teacher = User.objects.create_user(username='gradeteacher', password='password').profile
+        self.teacher.role = 'teacher'
+        self.teacher.save()
+        self.course = Course.objects.create(name='Quiz', code='QZ1', teacher=self.teacher)
+        self.assignment = Assignment.objects.create(course=self.course, title='Quiz 1', due_date=date(2025, 1, 10), max_marks=10)
+        self.q1 = Question.objects.create(assignment=self.assignment, order=0, qtype='mcq', text='2+2?', points=3)
+        self.right = Option.objects.create(question=self.q1, order=0, text='4', is_correct=True)
+        self.wrong = Option.objects.create(question=self.q1, order=1, text='5')
+        self.q2 = Question.objects.create(assignment=self.assignment, order=1, qtype='true_false', text='Sky is blue', points=1)
+        self.true = Option.objects.create(question=self.q2, order=0, text='True', is_correct=True)
+        self.false = Option.objects.create(question=self.q2, order=1, text='False')
+
+    def _submit(self, username, choices):
+        from .grading import save_answers
+        from .models import Enrollment, Submission
+        student = User.objects.create_user(username=username, password='password').profile
+        Enrollment.objects.create(student=student, course=self.course)
+        submission = Submission.objects.create(assignment=self.assignment, student=student)
+        save_answers(submission, choices)
+        return submission
+
+    def test_batch_grading_keeps_derived_data_and_teacher_marks(self):
+        from .grading import due_for_grading, grade
+        from .models import ActivityEvent, StudentCourseSummary, Submission
+
+        full = self._submit('g_full', {self.q1.id: self.right.id, self.q2.id: self.true.id})
+        part = self._submit('g_part', {self.q1.id: self.wrong.id, self.q2.id: self.true.id})
+        # an option of another question is ignored
+        blank = self._submit('g_blank', {self.q1.id: self.true.id})
+        manual = self._submit('g_manual', {self.q1.id: self.right.id})
+        Submission.objects.filter(pk=manual.pk).update(marks_obtained=7)
+
+        self.assertEqual(list(due_for_grading(date(2025, 1, 10))), [])
+        self.assertEqual(list(due_for_grading(date(2025, 1, 11))), [self.assignment])
+        self.assertEqual(grade(self.assignment), {'graded': 3, 'average': 4.33})
+        marks = dict(Submission.objects.values_list('id', 'marks_obtained'))
+        self.assertEqual([marks[s.id] for s in (full, part, blank, manual)], [10, 3, 0, 7])
+        self.assertEqual(StudentCourseSummary.objects.get(student=full.student).marks_sum, 10)
+        self.assertEqual(ActivityEvent.objects.get(recipient=part.student, kind='performance').score, 30.0)
+        self.assertEqual(ActivityEvent.objects.filter(recipient=self.teacher).first().detail, '3 submissions, average 4.3/10')
+        self.assertEqual(list(due_for_grading(date(2025, 1, 11))), [])
+
+        self.assertEqual(grade(self.assignment)['graded'], 0)
+        self.assertEqual(grade(self.assignment, regrade=True)['graded'], 4)
+        self.assertEqual(Submission.objects.get(pk=manual.pk).marks_obtained, 8)
+
+    def test_query_count_is_independent_of_submissions(self):
+        from django.test.utils import CaptureQueriesContext
+        from .grading import grade
+
+        def queries(count):
+            for i in range(count):
+                self._submit(f'g{count}_{i}', {self.q1.id: self.right.id, self.q2.id: self.false.id})
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(grade(self.assignment)['graded'], count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(3), queries(12))
+
+    def test_free_form_questions_and_endpoints(self):
+        from .models import Question, StudentAnswer, Submission
+
+        self.client.login(username='gradeteacher', password='password')
+        url = f'/teacher/assignment/{self.assignment.id}/autograde/'
+        self._submit('g_api', {self.q1.id: self.right.id})
+        self.assertEqual(self.client.post(url).json(), {'success': True, 'graded': 1, 'average': 8.0})
+
+        # students record their choices with the submission form
+        student = self._submit('g_form', {})
+        self.client.login(username='g_form', password='password')
+        self.client.post(f'/student/assignments/{self.assignment.id}/', {
+            'submission_text': 'done', f'question_{self.q1.id}': self.right.id, f'question_{self.q2.id}': 'x',
+        })
+        self.assertEqual(list(StudentAnswer.objects.filter(submission=student).values_list('question_id', 'option_id')),
+                         [(self.q1.id, self.right.id)])
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        Question.objects.create(assignment=self.assignment, order=2, qtype='essay', text='Why?')
+        self.client.login(username='gradeteacher', password='password')
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertIsNone(Submission.objects.get(pk=student.pk).marks_obtained)
+
+    def test_graded_answers_are_locked(self):
+        from .grading import AnswersLocked, grade, save_answers
+        from .models import StudentAnswer, Submission
+
+        submission = self._submit('g_lock', {self.q1.id: self.wrong.id, self.q2.id: self.true.id})
+        grade(self.assignment)
+        self.assertEqual(Submission.objects.get(pk=submission.pk).marks_obtained, 3)
+        submission.refresh_from_db()
+        with self.assertRaises(AnswersLocked):
+            save_answers(submission, {self.q1.id: self.right.id})
+
+        self.client.login(username='g_lock', password='password')
+        url = f'/student/assignments/{self.assignment.id}/'
+        self.client.post(url, {'submission_text': 'changed', f'question_{self.q1.id}': self.right.id})
+        submission.refresh_from_db()
+        self.assertEqual((submission.text, submission.marks_obtained), ('', 3))
+        self.assertEqual(StudentAnswer.objects.get(submission=submission, question=self.q1).option_id, self.wrong.id)
+
+        # resubmitting the graded answers (or none) still updates the text
+        self.client.post(url, {'submission_text': 'edited', f'question_{self.q1.id}': self.wrong.id})
+        submission.refresh_from_db()
+        self.assertEqual((submission.text, submission.marks_obtained), ('edited', 3))
+
+
+class AssignmentBuilderTests(TestCase):
+    def setUp(self):
+        from .models import Course
+        self.teacher = User.objects.create_user(username='buildteacher', password='password').profile
+        self.teacher.role = 'teacher'
+        self.teacher.save()
+        self.course = Course.objects.create(name='Source', code='SRC1', teacher=self.teacher)
+        self.targets = [Course.objects.create(name=f'Target {i}', code=f'TGT{i}', teacher=self.teacher) for i in range(2)]
+        self.client.login(username='buildteacher', password='password')
+
+    def _quiz(self, n):
+        import json
+        return json.dumps([
+            {'order': i, 'type': 'mcq' if i % 2 else 'true_false', 'text': f'Q{i}', 'points': 2,
+             'options': ['a', 'b', 'c'], 'correct_answer': 1 if i % 2 else 'false'}
+            for i in range(n)
+        ])
+
+    def test_create_saves_question_tree_in_bulk(self):
+        from django.test.utils import CaptureQueriesContext
+        from .models import Assignment, Option, Question
+
+        def create(n):
+            with CaptureQueriesContext(connection) as ctx:
+                data = self.client.post('/teacher/assignment/create/', {
+                    'course_id': self.course.id, 'title': f'Quiz {n}', 'questions': self._quiz(n),
+                }).json()
+            self.assertEqual(data['questions'], n)
+            return data['assignment_id'], len(ctx.captured_queries)
+
+        small_id, small = create(4)
+        _large_id, large = create(40)
+        self.assertEqual(small, large)
+        self.assertEqual(Question.objects.filter(assignment_id=small_id).count(), 4)
+        self.assertEqual(list(Option.objects.filter(question__assignment_id=small_id, is_correct=True)
+                              .values_list('question__qtype', 'text')),
+                         [('true_false', 'False'), ('mcq', 'b'), ('true_false', 'False'), ('mcq', 'b')])
+
+        # a malformed entry is rejected before anything is written
+        for questions in ('[{"text": "ok"}, "oops"]', '[{"text": "ok"'):
+            response = self.client.post('/teacher/assignment/create/', {
+                'course_id': self.course.id, 'title': 'Broken', 'questions': questions,
+            })
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        self.assertFalse(Assignment.objects.filter(title='Broken').exists())
+
+        # other invalid fields are a 400 as well and write nothing
+        response = self.client.post('/teacher/assignment/create/', {
+            'course_id': self.course.id, 'title': 'Half', 'max_marks': 'lots', 'questions': self._quiz(2),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Assignment.objects.filter(title='Half').exists())
+
+    def test_clone_copies_questions_and_shares_attachments(self):
+        from .assignment_builder import save_questions
+        from .models import Assignment, AssignmentAttachment, Course, Option
+        import json
+
+        source = Assignment.objects.create(course=self.course, title='Shared quiz', max_marks=20, due_date=date(2025, 5, 1))
+        save_questions(source, json.loads(self._quiz(3)))
+        AssignmentAttachment.objects.create(assignment=source, file='assignments/notes.pdf', uploaded_by=self.teacher)
+
+        url = f'/teacher/assignment/{source.id}/clone/'
+        ids = self.client.post(url, {'course_ids': f'{self.targets[0].id},{self.targets[1].id}'}).json()['assignment_ids']
+        copies = Assignment.objects.filter(id__in=ids).order_by('course_id')
+        self.assertEqual([c.course_id for c in copies], [t.id for t in self.targets])
+        for copy in copies:
+            self.assertEqual((copy.title, copy.max_marks, copy.due_date), ('Shared quiz', 20, date(2025, 5, 1)))
+            self.assertEqual(list(copy.questions.values_list('text', flat=True)), ['Q0', 'Q1', 'Q2'])
+            self.assertEqual(Option.objects.filter(question__assignment=copy).count(), 7)
+            self.assertEqual(list(copy.attachments.values_list('file', flat=True)), ['assignments/notes.pdf'])
+
+        other = Course.objects.create(name='Not mine', code='OTH1', teacher=User.objects.create_user(username='buildother').profile)
+        self.assertEqual(self.client.post(url, {'course_ids': other.id}).status_code, 403)
+        self.assertEqual(self.client.post(url, {'course_ids': 'x'}).status_code, 400)
+        self.assertEqual(Assignment.objects.count(), 3)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from .models import Assignment, Course, Enrollment
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        self.settings_override = override_settings(MEDIA_ROOT=os.path.join(root, 'media'), CHUNKED_UPLOAD_DIR=os.path.join(root, 'partial'))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.teacher = User.objects.create_user(username='upteacher', password='password').profile
+        self.teacher.role = 'teacher'
+        self.teacher.save()
+        self.course = Course.objects.create(name='Uploads', code='UPL1', teacher=self.teacher)
+        self.assignment = Assignment.objects.create(course=self.course, title='Report')
+        self.student = User.objects.create_user(username='upstudent', password='password').profile
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+    def _start(self, **fields):
+        import json
+        body = {'purpose': 'material', 'target_id': self.course.id, 'filename': 'notes.pdf',
+                'content_type': 'application/pdf', 'size': 10, **fields}
+        return self.client.post('/uploads/', json.dumps(body), content_type='application/json')
+
+    def _put(self, upload_id, offset, chunk, checksum=None):
+        import hashlib
+        return self.client.put(f'/uploads/{upload_id}/', chunk, content_type='application/octet-stream', headers={
+            'Upload-Offset': str(offset), 'Upload-Checksum': f'sha256 {checksum or hashlib.sha256(chunk).hexdigest()}',
+        })
+
+    def test_resumable_material_upload_is_moved_into_place(self):
+        import json
+        from .chunked_upload import partial_path
+        from .models import StudyMaterial, UploadSession
+
+        self.client.login(username='upteacher', password='password')
+        upload_id = self._start().json()['upload_id']
+        self.assertEqual(self._put(upload_id, 0, b'%PDF-').json()['offset'], 5)
+        # a resend of the same range after a dropped response, and a corrupted chunk
+        resent = self._put(upload_id, 0, b'%PDF-')
+        self.assertEqual((resent.status_code, resent.json()['offset']), (409, 5))
+        self.assertEqual(self._put(upload_id, 5, b'1.7\n', checksum='0' * 64).status_code, 422)
+        self.assertEqual(self.client.get(f'/uploads/{upload_id}/').json()['offset'], 5)
+        self.assertEqual(self.client.post(f'/uploads/{upload_id}/complete/', '{}', content_type='application/json').status_code, 409)
+        self.assertEqual(self._put(upload_id, 5, b'1.7\n%').json()['offset'], 10)
+        self.assertEqual(self._put(upload_id, 10, b'x').status_code, 413)
+
+        inode = os.stat(partial_path(UploadSession.objects.get())).st_ino
+        resp = self.client.post(f'/uploads/{upload_id}/complete/', json.dumps({'title': 'Notes'}), content_type='application/json')
+        material = StudyMaterial.objects.get(id=resp.json()['id'])
+        self.assertEqual((material.title, material.course_id, material.uploaded_by_id), ('Notes', self.course.id, self.teacher.id))
+        with material.file.open('rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.7\n%')
+        self.assertEqual(os.stat(material.file.path).st_ino, inode)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(settings.CHUNKED_UPLOAD_DIR)), [])
+
+    def test_early_rejection_and_submissions(self):
+        import json
+        from .models import Submission, UploadSession
+
+        self.client.login(username='upteacher', password='password')
+        self.assertEqual(self._start(size=60 * 1024 * 1024).status_code, 413)
+        self.assertEqual(self._start(content_type='application/x-msdownload', filename='a.exe').status_code, 415)
+        self.assertEqual(self._start(purpose='submission', target_id=self.assignment.id).status_code, 403)
+        upload_id = self._start().json()['upload_id']
+        self.assertEqual(self._put(upload_id, 0, b'MZ\x90\x00').status_code, 415)
+        self.assertEqual(self.client.delete(f'/uploads/{upload_id}/').status_code, 200)
+        self.assertFalse(UploadSession.objects.exists())
+
+        self.client.login(username='upstudent', password='password')
+        self.assertEqual(self._start().status_code, 403)
+        self.assertEqual(self._start(purpose='submission', target_id=999999).status_code, 404)
+        upload_id = self._start(purpose='submission', target_id=self.assignment.id, filename='../../answer.txt',
+                                content_type='text/plain', size=6).json()['upload_id']
+        self._put(upload_id, 0, b'answer')
+        self.client.post(f'/uploads/{upload_id}/complete/', json.dumps({'text': 'see file'}), content_type='application/json')
+        submission = Submission.objects.get(student=self.student)
+        self.assertEqual((submission.text, os.path.basename(submission.file.name)), ('see file', 'answer.txt'))
+
+        # another user cannot see or drive someone else's upload
+        upload_id = self._start(purpose='submission', target_id=self.assignment.id, content_type='text/plain', size=1).json()['upload_id']
+        self.client.login(username='upteacher', password='password')
+        self.assertEqual(self.client.get(f'/uploads/{upload_id}/').status_code, 404)
+
+    def test_chunk_is_read_before_the_session_is_locked(self):
+        import hashlib
+        import io
+        from django.test.utils import CaptureQueriesContext
+        from . import chunked_upload
+        from .models import UploadSession
+
+        self.client.login(username='upteacher', password='password')
+        session = UploadSession.objects.get(id=self._start().json()['upload_id'])
+        chunk = b'%PDF-' + b'x' * (3 * chunked_upload.READ_SIZE)
+        session.size = len(chunk)
+        session.save()
+
+        queries_at_read = []
+
+        class Body(io.BytesIO):
+            def read(self, size=-1):
+                queries_at_read.append(len(ctx.captured_queries))
+                return super().read(size)
+
+        with CaptureQueriesContext(connection) as ctx:
+            offset = chunked_upload.append(session, 0, len(chunk), hashlib.sha256(chunk).hexdigest(), Body(chunk))
+        self.assertEqual(offset, len(chunk))
+        # the whole body was read before the session row was locked
+        self.assertEqual(set(queries_at_read), {0})
+        self.assertTrue(ctx.captured_queries)
+
+        os.remove(chunked_upload.partial_path(session))
+        session.refresh_from_db()
+        session.size += 1
+        session.save()
+        gone = self._put(str(session.id), session.offset, b'!')
+        self.assertEqual(gone.status_code, 410)
+        UploadSession.objects.filter(pk=session.pk).update(size=session.offset)
+        done = self.client.post(f'/uploads/{session.id}/complete/', '{"title": "Notes"}', content_type='application/json')
+        self.assertEqual(done.status_code, 410)
+
+
+class FileServingTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.core.files.base import ContentFile
+        from .models import Course, Enrollment, StudyMaterial
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        media = override_settings(MEDIA_ROOT=root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        teacher = User.objects.create_user(username='fsteacher').profile
+        self.course = Course.objects.create(name='Files', code='FS1', teacher=teacher)
+        self.student = User.objects.create_user(username='fsstudent', password='password').profile
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.video = StudyMaterial.objects.create(course=self.course, title='Lecture',
+                                                  file=ContentFile(b'0123456789', name='lecture.mp4'))
+        self.client.login(username='fsstudent', password='password')
+
+    def test_parse_range(self):
+        from .file_serving import parse_range
+        self.assertEqual(parse_range('bytes=2-5', 10), (2, 5))
+        self.assertEqual(parse_range('bytes=7-', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=5-50', 10), (5, 9))
+        self.assertEqual(parse_range('bytes=10-', 10), ())
+        self.assertEqual(parse_range('bytes=6-2', 10), ())
+        self.assertIsNone(parse_range('bytes=0-1,4-5', 10))
+        self.assertIsNone(parse_range(None, 10))
+
+    def test_streaming_ranges_and_etags(self):
+        url = f'/materials/view/{self.video.id}/'
+        resp = self.client.get(url)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(b''.join(resp.streaming_content), b'0123456789')
+        self.assertEqual((resp['Content-Type'], resp['Accept-Ranges'], resp['Content-Length']), ('video/mp4', 'bytes', '10'))
+        self.assertTrue(resp['Content-Disposition'].startswith('inline'))
+        etag = resp['ETag']
+
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        part = self.client.get(url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual((part.status_code, part['Content-Range']), (206, 'bytes 2-5/10'))
+        self.assertEqual(b''.join(part.streaming_content), b'2345')
+        self.assertEqual(self.client.get(url, headers={'Range': 'bytes=20-'}).status_code, 416)
+        self.assertEqual(self.client.get(url, headers={'Range': 'bytes=2-5', 'If-Range': '"stale"'}).status_code, 200)
+
+        download = self.client.get(f'/materials/download/{self.video.id}/')
+        self.assertTrue(download['Content-Disposition'].startswith('attachment'))
+
+        with override_settings(FILE_SERVING_OFFLOAD='x-accel'):
+            offloaded = self.client.get(url)
+        self.assertEqual(offloaded['X-Accel-Redirect'], f'/protected-media/{self.video.file.name}')
+        self.assertEqual(offloaded.content, b'')
+
+        other = User.objects.create_user(username='fsoutsider', password='password')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_only_safe_types_are_inline(self):
+        from django.core.files.base import ContentFile
+        from .file_serving import is_inline_safe
+        from .models import StudyMaterial
+
+        svg = StudyMaterial.objects.create(course=self.course, title='Diagram',
+                                           file=ContentFile(b'<svg onload="alert(1)"/>', name='evil.svg'))
+        resp = self.client.get(f'/materials/view/{svg.id}/')
+        self.assertEqual(resp['Content-Type'], 'image/svg+xml')
+        self.assertTrue(resp['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(resp['X-Content-Type-Options'], 'nosniff')
+
+        for content_type in ('application/pdf', 'image/png', 'image/webp', 'video/webm', 'audio/mpeg'):
+            self.assertTrue(is_inline_safe(content_type), content_type)
+        for content_type in ('image/svg+xml', 'text/html', 'text/xml', 'application/xhtml+xml', 'text/plain'):
+            self.assertFalse(is_inline_safe(content_type), content_type)
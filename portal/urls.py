@@ -64,11 +64,16 @@ urlpatterns = [
     path('materials/download/<int:material_id>/', views.download_material, name='download_material'),
     path('materials/view/<int:material_id>/', views.view_material, name='view_material'),
     path('materials/delete/<int:material_id>/', views.delete_material, name='delete_material'),
+    # Resumable chunked uploads (materials, submissions, assignment attachments)
+    path('uploads/', views.start_upload, name='start_upload'),
+    path('uploads/<uuid:upload_id>/', views.upload_session, name='upload_session'),
+    path('uploads/<uuid:upload_id>/complete/', views.complete_upload, name='complete_upload'),
     path('course/<int:course_id>/feedback/', views.submit_feedback, name='submit_feedback'),
 
     # API endpoints
     path('api/live-updates/', api_views.get_live_updates, name='get_live_updates'),
     path('api/analytics/', api_views.get_analytics, name='get_analytics'),
+    path('api/student/bootstrap/', api_views.get_student_bootstrap, name='api_student_bootstrap'),
     path('api/student/tasks/', api_views.get_student_tasks, name='api_student_tasks'),
     path('api/student/materials/', api_views.get_student_materials, name='api_student_materials'),
     path('api/student/timetable/', api_views.get_student_timetable, name='api_student_timetable'),
@@ -91,6 +96,7 @@ urlpatterns = [
 
     # Attendance
     path('teacher/attendance/<int:course_id>/', views.take_attendance, name='take_attendance'),
+    path('teacher/attendance/<int:course_id>/mark/', views.mark_attendance_json, name='mark_attendance_json'),
     path('student/attendance/', views.view_attendance, name='view_attendance'),
 
     # Schedules / Events
@@ -106,12 +112,15 @@ urlpatterns = [
     path('teacher/assignment/new/', views.render_create_assignment, name='render_create_assignment'),
     path('teacher/assignment/import-url/', views.import_from_url, name='import_from_url'),
     path('teacher/assignment/<int:assignment_id>/', views.assignment_detail, name='assignment_detail'),
+    path('teacher/assignment/<int:assignment_id>/autograde/', views.autograde_assignment, name='autograde_assignment'),
+    path('teacher/assignment/<int:assignment_id>/clone/', views.clone_assignment, name='clone_assignment'),
     path('teacher/assignment/<int:assignment_id>/download/', views.download_assignment_report, name='download_assignment_report'),
     path('teacher/course/<int:course_id>/report/', views.generate_course_report, name='generate_course_report'),
     path('teacher/course/<int:course_id>/report/pdf/', views.generate_course_report_pdf, name='generate_course_report_pdf'),
     path('teacher/course/<int:course_id>/students-json/', views.course_students_json, name='course_students_json'),
     path('teacher/course/<int:course_id>/student/<int:student_id>/report/', views.teacher_student_report, name='teacher_student_report'),
     path('teacher/course/<int:course_id>/assignment-averages/', views.generate_assignment_averages, name='generate_assignment_averages'),
+    path('teacher/course/<int:course_id>/gradebook/', views.course_gradebook, name='course_gradebook'),
     path('teacher/send-message/', views.send_message, name='send_message'),
 
 
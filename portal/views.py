@@ -7,11 +7,11 @@ from .views_profile import update_profile_photo
 from .api_views import get_live_updates
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Count, Avg, Min, Max, Sum, Q, F
-from django.core.cache import cache
 from django.views.decorators.http import require_http_methods
 from .models import Profile, Course, Attendance, Assignment, Enrollment, StaffMember, SalaryRecord, FeePayment, StudentPayout, FinancialTransaction, StaffAttendance, StaffDailyAttendance, AssignmentAttachment
-from .models import Schedule
+from .models import Schedule, ScheduleOccurrence
 from datetime import datetime, date, timedelta
 from django.utils import timezone
 from .ml_predictor import PerformancePredictor
@@ -20,9 +20,16 @@ from django.http import JsonResponse
 from django.conf import settings
 from .report_generator import download_student_report, StudentReportGenerator
 from .teacher_report_generator import TeacherReportGenerator
-from .models import Submission, Notification
+from .models import Submission, Notification, NotificationMessage, NotificationArchive, StudentCourseSummary, StudentAnswer
 from .forms import ScheduleForm
-from .models import StudyMaterial, Feedback
+from . import notification_service
+from .student_stats import StudentStats
+from .teacher_stats import TeacherStats
+from .gradebook import Gradebook
+from . import activity, assignment_builder, attendance_marking, chunked_upload, file_serving, grading
+from .conditional import conditional_json, table_stamp, version_stamp
+from . import cache_versions, series
+from .models import StudyMaterial, Feedback, UploadSession
 from django.contrib.auth.models import User
 from django.http import Http404
 from io import BytesIO
@@ -331,22 +338,61 @@ def take_attendance(request, course_id):
     enrollments = Enrollment.objects.filter(course=course)
 
     if request.method == 'POST':
-        attendance_date = date.today()
-        for enrollment in enrollments:
-            student = enrollment.student
-            status = request.POST.get(f'student_{student.id}') == 'present'
-            Attendance.objects.update_or_create(
-                student=student,
-                course=course,
-                date=attendance_date,
-                defaults={'status': status}
-            )
+        # the whole roster in one transaction; students not ticked present are absent
+        present = [key[len('student_'):] for key, value in request.POST.items()
+                   if key.startswith('student_') and value == 'present']
+        try:
+            attendance_marking.mark(course, attendance_marking.parse_ids(present))
+        except attendance_marking.RosterError as e:
+            messages.error(request, str(e))
+            return redirect('take_attendance', course_id=course.id)
         messages.success(request, 'Attendance marked successfully!')
         return redirect('teacher_dashboard')
 
     return render(request, 'attendance/take_attendance.html', {'course': course, 'enrollments': enrollments, 'today': date.today()})
 
 
+@login_required
+@require_http_methods(["POST"])
+def mark_attendance_json(request, course_id):
+    """Mark a course's attendance from a JSON body, for mobile marking apps.
+
+    Body: ``{"date": "YYYY-MM-DD", "present": [ids], "absent": [ids], "rest": "absent"}``.
+    Ids are student profile ids, as a list or a comma-separated string.
+    ``date`` defaults to today. ``rest`` is ``"absent"`` (default: everyone
+    not listed as present is absent) or ``"unchanged"`` (only the listed
+    students are written). The whole roster is written in one transaction.
+    """
+    profile = getattr(request.user, 'profile', None)
+    course = Course.objects.filter(id=course_id).first()
+    if course is None:
+        return JsonResponse({'error': 'Course not found'}, status=404)
+    if not is_admin_role(profile) and course.teacher_id != getattr(profile, 'id', None):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    try:
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise TypeError('body must be an object')
+        day = date.fromisoformat(data['date']) if data.get('date') else None
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid JSON body or date'}, status=400)
+    rest = data.get('rest', 'absent')
+    if rest not in ('absent', 'unchanged'):
+        return JsonResponse({'error': 'rest must be "absent" or "unchanged"'}, status=400)
+
+    try:
+        result = attendance_marking.mark(
+            course,
+            attendance_marking.parse_ids(data.get('present')),
+            attendance_marking.parse_ids(data.get('absent')),
+            day=day, rest_absent=rest == 'absent',
+        )
+    except attendance_marking.RosterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'success': True, **result})
+
+
 @role_required('teacher')
 def upload_schedule(request):
     """Teacher-facing schedule/event upload page."""
@@ -429,31 +475,33 @@ def delete_schedule(request, schedule_id):
     return render(request, 'schedules/delete_schedule.html', {'schedule': schedule})
 
 
+STUDENT_SCHEDULES_PER_PAGE = 24
+
+
 @role_required('student')
 def student_schedules(request):
     """Student-facing list of upcoming schedules/events relevant to the student."""
     profile = getattr(request.user, 'profile', None)
     # Schedules that are public OR tied to one of the student's courses
-    enrollments = Enrollment.objects.filter(student=profile).values_list('course_id', flat=True)
-    today = date.today()
-    schedules = Schedule.objects.filter(
-        Q(is_public=True) | Q(course_id__in=list(enrollments)),
-        date__gte=today
-    ).order_by('date', 'start_time')
-    return render(request, 'schedules/student_schedules.html', {'schedules': schedules})
+    # (one entry per upcoming occurrence, so recurring schedules show every date)
+    occurrences = ScheduleOccurrence.objects.upcoming_for_student(profile).select_related('schedule__course')
+    # a daily schedule alone has ~180 occurrences in the horizon
+    page_obj = Paginator(occurrences, STUDENT_SCHEDULES_PER_PAGE).get_page(request.GET.get('page'))
+    return render(request, 'schedules/student_schedules.html', {
+        'occurrences': page_obj.object_list,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+    })
 
 
 @role_required('student')
 def view_attendance(request):
 
-    student = request.user.profile
-    enrollments = Enrollment.objects.filter(student=student)
-    attendance_data = []
-    for enrollment in enrollments:
-        total = Attendance.objects.filter(student=student, course=enrollment.course).count()
-        present = Attendance.objects.filter(student=student, course=enrollment.course, status=True).count()
-        percentage = (present / total * 100) if total > 0 else 0
-        attendance_data.append({'course': enrollment.course, 'total': total, 'present': present, 'absent': total - present, 'percentage': round(percentage, 2)})
+    stats = StudentStats(request.user.profile)
+    attendance_data = [
+        {'course': c.course, 'total': c.total, 'present': c.present, 'absent': c.absent, 'percentage': round(c.percentage, 2)}
+        for c in stats.courses
+    ]
 
     return render(request, 'attendance/view_attendance.html', {'attendance_data': attendance_data})
 
@@ -461,18 +509,24 @@ def view_attendance(request):
 # Notifications
 @login_required
 def notifications_view(request):
+    """List the user's notifications; ``?archived=1`` pages through archived ones."""
     notifications = Notification.objects.filter(user=request.user)
     if request.method == 'POST':
         notif_id = request.POST.get('notif_id')
-        try:
-            notification = Notification.objects.get(id=notif_id, user=request.user)
-            notification.is_read = True
-            notification.save()
-        except Notification.DoesNotExist:
+        if not notification_service.mark_read(request.user, notif_id):
             messages.error(request, 'Notification not found')
         return redirect('notifications')
 
-    context = {'notifications': notifications, 'unread_count': notifications.filter(is_read=False).count()}
+    context = {'notifications': notifications, 'unread_count': notification_service.unread_count(request.user)}
+    if request.GET.get('archived') == '1':
+        paginator = Paginator(NotificationArchive.objects.filter(user=request.user), 25)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        context.update({
+            'notifications': page_obj.object_list,
+            'page_obj': page_obj,
+            'is_paginated': page_obj.has_other_pages(),
+            'archived': True,
+        })
     return render(request, 'notifications.html', context)
 
 
@@ -482,12 +536,9 @@ def mark_as_read(request):
         return redirect('notifications')
 
     notif_id = request.POST.get('notif_id')
-    try:
-        notification = Notification.objects.get(id=notif_id, user=request.user)
-        notification.is_read = True
-        notification.save()
+    if notification_service.mark_read(request.user, notif_id):
         messages.success(request, 'Marked as read')
-    except Notification.DoesNotExist:
+    else:
         messages.error(request, 'Notification not found')
 
     return redirect('notifications')
@@ -499,18 +550,16 @@ def delete_notification(request):
         return redirect('notifications')
 
     notif_id = request.POST.get('notif_id')
-    try:
-        notification = Notification.objects.get(id=notif_id, user=request.user)
-        notification.delete()
+    if notification_service.delete_notification(request.user, notif_id):
         messages.success(request, 'Notification deleted')
-    except Notification.DoesNotExist:
+    else:
         messages.error(request, 'Notification not found')
 
     return redirect('notifications')
 
 
 def create_notification(user, title, message):
-    Notification.objects.create(user=user, title=title, message=message)
+    notification_service.notify(user, title, message)
 
 
 @role_required(['teacher', 'admin2', 'superadmin'])
@@ -534,7 +583,7 @@ def mark_all_read(request):
         return redirect('notifications')
 
     try:
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        notification_service.mark_all_read(request.user)
         messages.success(request, 'All notifications marked as read')
     except Exception:
         messages.error(request, 'Could not mark notifications as read')
@@ -641,6 +690,23 @@ def role_redirect(request):
         return redirect('login')
 
 
+def _signup_series(request, strict=False):
+    """(labels, counts) of user signups for the dashboard chart.
+
+    Honours ``range``/``bucket``/``points``; invalid values fall back to the
+    last 7 days unless ``strict``, in which case ValueError propagates.
+    """
+    try:
+        start, end, bucket, points = series.from_request(request, '7d')
+    except ValueError:
+        if strict:
+            raise
+        start, end = series.parse_range('7d')
+        bucket, points = 'day', None
+    buckets = series.series(User.objects.all(), 'date_joined', start, end, bucket, points)
+    return series.labels(buckets, bucket), [b['count'] for b in buckets]
+
+
 # Admin Dashboard
 @login_required
 def admin_dashboard(request):
@@ -665,14 +731,8 @@ def admin_dashboard(request):
 
     other_count = max(0, total_users - (total_students + total_teachers))
 
-    # recent registrations for the last 7 days
-    today = timezone.now().date()
-    signup_labels = []
-    signup_counts = []
-    for i in range(6, -1, -1):
-        d = today - timedelta(days=i)
-        signup_labels.append(d.strftime('%b %d'))
-        signup_counts.append(User.objects.filter(date_joined__date=d).count())
+    # recent registrations (last 7 days unless ?range= asks otherwise)
+    signup_labels, signup_counts = _signup_series(request)
 
     context = {
         'total_students': total_students,
@@ -710,7 +770,12 @@ def admin2_dashboard(request):
     return render(request, 'dashboards/admin2_dashboard.html', context)
 
 
+def _admin2_updates_stamp(request):
+    return version_stamp(Profile, StaffMember, FeePayment, FinancialTransaction, StudentPayout)
+
+
 @login_required
+@conditional_json(_admin2_updates_stamp)
 def admin2_updates(request):
     """Return a small JSON payload for the admin2 dashboard live updates."""
     user_profile = getattr(request.user, 'profile', None)
@@ -1128,8 +1193,6 @@ def admin2_notifications(request):
         messages.error(request, 'Access denied!')
         return redirect('role_redirect')
     # Show recent notifications for admins and allow sending to selected students
-    from django.db.models import Count, Max
-
     if request.method == 'POST':
         # Support both regular form POST and AJAX POST
         title = request.POST.get('title') or request.POST.get('title')
@@ -1144,17 +1207,11 @@ def admin2_notifications(request):
                 student_ids = [s for s in raw.split(',') if s.strip()]
 
         if title and message_text and student_ids:
-            # Create a Notification entry per recipient (no schema changes / no extra migrations)
-            created = 0
-            for sid in student_ids:
-                try:
-                    # students in this project are stored as Profile with role='student'
-                    prof = Profile.objects.filter(id=int(sid)).select_related('user').first()
-                    if prof and getattr(prof, 'user', None):
-                        Notification.objects.create(user=prof.user, title=title, message=message_text)
-                        created += 1
-                except Exception:
-                    continue
+            # students in this project are stored as Profile with role='student'
+            created = notification_service.dispatch(
+                notification_service.profile_recipients(student_ids), title, message_text,
+                sender=request.user,
+            )
 
             # If AJAX (fetch) request, return JSON
             if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.META.get('CONTENT_TYPE','').startswith('application/json'):
@@ -1163,11 +1220,8 @@ def admin2_notifications(request):
             messages.success(request, f'Notification sent to {created} recipients')
             return redirect('admin2_notifications')
 
-    # Build grouped recent notifications: group by title+message and count recipients
-    grouped = (Notification.objects
-               .values('title', 'message')
-               .annotate(recipients_count=Count('id'), last_sent=Max('created_at'))
-               .order_by('-last_sent')[:50])
+    # Recent broadcasts: one NotificationMessage row per send, newest first
+    sent_messages = NotificationMessage.objects.order_by('-created_at')[:50]
 
     # Load students and teachers (only id, name, email, department) for the selection UI
     students_qs = Profile.objects.filter(role='student').select_related('user').order_by('user__username')
@@ -1186,8 +1240,8 @@ def admin2_notifications(request):
 
     # Normalize grouped entries into a list of dicts
     notifications = []
-    for g in grouped:
-        notifications.append({'title': g['title'], 'message': g['message'], 'recipients_count': g['recipients_count'], 'created_at': g['last_sent']})
+    for m in sent_messages:
+        notifications.append({'title': m.title, 'message': m.body, 'recipients_count': m.recipient_count, 'created_at': m.created_at})
 
     return render(request, 'dashboards/admin2_notifications.html', {'notifications': notifications, 'students': students, 'teachers': teachers})
 
@@ -1587,7 +1641,12 @@ def superadmin_attendance_live(request):
     return render(request, 'dashboards/superadmin_attendance_live.html', {'live_checkins': live_checkins})
 
 
+def _superadmin_updates_stamp(request):
+    return version_stamp(User, Profile, Course)
+
+
 @login_required
+@conditional_json(_superadmin_updates_stamp)
 def superadmin_updates(request):
     """Return JSON used by superadmin dashboard for live updates.
 
@@ -1611,14 +1670,11 @@ def superadmin_updates(request):
     for u in recent_qs:
         recent.append({'id': u.id, 'username': u.username, 'email': u.email or '', 'role': getattr(getattr(u, 'profile', None), 'role', ''), 'joined': u.date_joined.strftime('%Y-%m-%d')})
 
-    # signups last 7 days
-    today = timezone.now().date()
-    labels = []
-    counts = []
-    for i in range(6, -1, -1):
-        d = today - timedelta(days=i)
-        labels.append(d.strftime('%b %d'))
-        counts.append(User.objects.filter(date_joined__date=d).count())
+    # signups (last 7 days unless ?range= asks otherwise)
+    try:
+        labels, counts = _signup_series(request, strict=True)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
     data = {
         'total_students': total_students,
@@ -1796,10 +1852,11 @@ def one_click_attendance(request):
     staff_qs = StaffMember.objects.select_related('profile__user')
 
     # attendance records captured by webcam/recognition for today
-    sa_qs = StaffAttendance.objects.filter(timestamp__date=today_date)
+    day_start, day_end = _day_bounds(today_date, today_date)
+    sa_qs = StaffAttendance.objects.filter(timestamp__gte=day_start, timestamp__lt=day_end, staff__isnull=False)
 
     # Map staff_id -> present
-    present_staff_ids = set(sa.staff.id for sa in sa_qs if sa.staff and sa.staff.id)
+    present_staff_ids = set(sa_qs.values_list('staff_id', flat=True))
 
     created = 0
     updated = 0
@@ -1827,17 +1884,15 @@ def one_click_attendance(request):
             leave_count += 1
 
     # Notify absentees (in-app notification and optional email)
-    absentees = StaffDailyAttendance.objects.filter(date=today_date, status='absent').select_related('staff__profile__user')
+    absentees = User.objects.filter(profile__staffmember__staffdailyattendance__date=today_date, profile__staffmember__staffdailyattendance__status='absent')
     notif_title = f"Attendance marked for {today_date.strftime('%Y-%m-%d')}"
-    for rec in absentees:
-        user = getattr(getattr(rec, 'staff', None), 'profile', None) and getattr(rec.staff.profile, 'user', None)
-        if user:
-            message = f"You are marked Absent on {today_date.strftime('%Y-%m-%d')}. If this is incorrect, please contact admin."
-            Notification.objects.create(user=user, title=notif_title, message=message)
-            # optional email (best-effort)
+    message = f"You are marked Absent on {today_date.strftime('%Y-%m-%d')}. If this is incorrect, please contact admin."
+    notification_service.dispatch(absentees, notif_title, message, sender=request.user)
+    # optional email (best-effort)
+    if getattr(settings, 'EMAIL_HOST', None):
+        for email in absentees.exclude(email='').values_list('email', flat=True).distinct():
             try:
-                if getattr(settings, 'EMAIL_HOST', None):
-                    send_mail(subject=notif_title, message=message, from_email=settings.DEFAULT_FROM_EMAIL, recipient_list=[user.email], fail_silently=True)
+                send_mail(subject=notif_title, message=message, from_email=settings.DEFAULT_FROM_EMAIL, recipient_list=[email], fail_silently=True)
             except Exception:
                 pass
 
@@ -1845,7 +1900,19 @@ def one_click_attendance(request):
     return JsonResponse({'success': True, 'summary': data})
 
 
+def _attendance_summary_stamp(request):
+    try:
+        qdate = date.fromisoformat(request.GET.get('date') or '')
+    except ValueError:
+        qdate = timezone.now().date()
+    return [
+        *version_stamp(StaffMember),
+        table_stamp(StaffDailyAttendance.objects.filter(date=qdate), 'timestamp'),
+    ]
+
+
 @role_required(['superadmin','admin2'])
+@conditional_json(_attendance_summary_stamp)
 def admin2_attendance_summary(request):
     """Return JSON summary for attendance (counts for date). Query param 'date' optional (YYYY-MM-DD)."""
     user_profile = getattr(request.user, 'profile', None)
@@ -1933,6 +2000,18 @@ def admin2_export_attendance(request):
     return resp
 
 
+def _day_bounds(first_day, last_day):
+    """Aware [start, end) datetimes covering ``first_day``..``last_day`` in the current timezone.
+
+    Filtering on a range instead of ``__date`` lets the database use the
+    timestamp index.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()), tz)
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), datetime.min.time()), tz)
+    return start, end
+
+
 @role_required(['superadmin','admin2'])
 def admin2_attendance_ai_insights(request):
     """Basic heuristic AI insights for attendance: top punctual staff and 30-day absentee trend."""
@@ -1940,22 +2019,21 @@ def admin2_attendance_ai_insights(request):
     if not is_admin_role(user_profile):
         return JsonResponse({'error': 'Access denied'}, status=403)
 
-    # last 30 days
-    end = timezone.now().date()
-    start = end - timedelta(days=29)
+    # last 30 days unless ?range= asks otherwise
+    try:
+        start, end, bucket, points = series.from_request(request, '30d')
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    # absentee trend per day
-    trend = []
-    dates = []
-    for i in range(0, 30):
-        d = start + timedelta(days=i)
-        dates.append(d.isoformat())
-        absent = StaffDailyAttendance.objects.filter(date=d, status='absent').count()
-        trend.append(absent)
+    # absentee trend per bucket
+    buckets = series.series(StaffDailyAttendance.objects.filter(status='absent'), 'date', start, end, bucket, points)
+    dates = [b['start'].isoformat() for b in buckets]
+    trend = [b['count'] for b in buckets]
 
     # top punctual staff: use StaffAttendance earliest timestamp per day avg
     punctual_scores = {}
-    sa_qs = StaffAttendance.objects.filter(timestamp__date__gte=start, timestamp__date__lte=end).select_related('staff__profile__user')
+    range_start, range_end = _day_bounds(start, end)
+    sa_qs = StaffAttendance.objects.filter(timestamp__gte=range_start, timestamp__lt=range_end).select_related('staff__profile__user')
     # compute first-checkin per staff per day
     first_per_staff_day = {}
     for sa in sa_qs:
@@ -2102,7 +2180,13 @@ def staff_attendance_marked(request):
     return render(request, 'dashboards/staff_attendance_marked.html')
 
 
+def _staff_attendance_updates_stamp(request):
+    # the records show the staff member's username
+    return version_stamp(StaffAttendance, User)
+
+
 @role_required(['superadmin','admin2'])
+@conditional_json(_staff_attendance_updates_stamp)
 def superadmin_staff_attendance_updates(request):
     """Return recent staff attendance records as JSON for dashboard polling.
 
@@ -2138,63 +2222,35 @@ def superadmin_staff_attendance_updates(request):
 def teacher_dashboard(request):
     
     teacher_profile = request.user.profile
-    # annotate courses with enrolled student counts for display
-    courses = list(Course.objects.filter(teacher=teacher_profile))
+    stats = TeacherStats(teacher_profile)
+    courses = []
     course_stats = []
-    for c in courses:
-        student_count = Enrollment.objects.filter(course=c).count()
+    for c in stats.courses:
         # attach a helpful attribute so templates can show enrolled_students
-        setattr(c, 'enrolled_students', student_count)
-        course_stats.append({'course': c, 'student_count': student_count})
-
-    # total unique students taught by this teacher
-    total_students = Enrollment.objects.filter(course__teacher=teacher_profile).values('student').distinct().count()
-
-    # classes_today (not modeled) — placeholder 0
-    classes_today = 0
-
-    # average attendance across this teacher's courses
-    attendance_percentages = []
-    for c in courses:
-        total = Attendance.objects.filter(course=c).count()
-        present = Attendance.objects.filter(course=c, status=True).count()
-        if total > 0:
-            attendance_percentages.append((present / total) * 100)
-
-    avg_attendance = round(sum(attendance_percentages) / len(attendance_percentages), 2) if attendance_percentages else 0.0
-    # Determine top course by enrollment
-    top_course = None
-    if course_stats:
-        sorted_stats = sorted(course_stats, key=lambda x: x['student_count'], reverse=True)
-        top_course = sorted_stats[0]['course']
+        setattr(c.course, 'enrolled_students', c.student_count)
+        courses.append(c.course)
+        course_stats.append({'course': c.course, 'student_count': c.student_count})
+
+    # classes held today in this teacher's courses, recurring schedules included
+    classes_today = ScheduleOccurrence.objects.filter(date=timezone.localdate(), course_id__in=stats.course_ids).count()
 
     # Top students by average marks across this teacher's courses
-    from django.db.models import Avg
-    today = date.today()
-    top_students = []
     try:
-        avg_per_student = Submission.objects.filter(assignment__course__teacher=teacher_profile, marks_obtained__isnull=False).values('student').annotate(avg_marks=Avg('marks_obtained')).order_by('-avg_marks')[:5]
-        for entry in avg_per_student:
-            try:
-                student_profile = Profile.objects.get(id=entry['student'])
-                top_students.append({'student': student_profile, 'avg_marks': round(entry['avg_marks'] or 0.0, 2)})
-            except Profile.DoesNotExist:
-                continue
+        top_students = [{'student': p, 'avg_marks': round(p.avg_marks or 0.0, 2)} for p in stats.top_students(5)]
     except Exception:
         top_students = []
 
     # Upcoming assignments for this teacher's courses — include null due_date so drafts appear
-    from django.db.models import Q
-    upcoming_assignments = Assignment.objects.filter(course__teacher=teacher_profile).filter(Q(due_date__gte=today) | Q(due_date__isnull=True)).order_by('due_date')[:5]
+    upcoming_assignments = stats.pending_assignments().order_by('due_date')[:5]
 
     context = {
         'courses': courses,
         'total_courses': len(courses),
         'course_stats': course_stats,
-        'total_students': total_students,
+        'total_students': stats.total_students,
         'classes_today': classes_today,
-        'avg_attendance': avg_attendance,
-        'top_course': top_course,
+        'avg_attendance': round(stats.avg_attendance, 2),
+        'top_course': stats.top_course,
         'teacher_photo_url': getattr(teacher_profile, 'profile_pic', None).url if getattr(teacher_profile, 'profile_pic', None) else None,
         'teacher_email': request.user.email,
         'teacher_phone': getattr(teacher_profile, 'phone', ''),
@@ -2208,7 +2264,20 @@ def teacher_dashboard(request):
     return render(request, 'dashboards/teacher_dashboard.html', context)
 
 
+def _teacher_updates_stamp(request):
+    teacher = request.user.profile
+    return [
+        table_stamp(Course.objects.filter(teacher=teacher)),
+        table_stamp(Enrollment.objects.filter(course__teacher=teacher)),
+        table_stamp(Assignment.objects.filter(course__teacher=teacher)),
+        # attendance edits show up as summary updates; new events in the feed
+        table_stamp(StudentCourseSummary.objects.filter(course__teacher=teacher), 'updated_at'),
+        table_stamp(teacher.activity_events.all()),
+    ]
+
+
 @role_required('teacher')
+@conditional_json(_teacher_updates_stamp)
 def teacher_dashboard_updates(request):
     """Return small JSON payload used by the teacher dashboard for live updates.
 
@@ -2219,70 +2288,36 @@ def teacher_dashboard_updates(request):
         return JsonResponse({'error': 'Access denied'}, status=403)
 
     teacher_profile = request.user.profile
-    today = date.today()
+    course_ids = list(Course.objects.filter(teacher=teacher_profile).values_list('id', flat=True))
+    scopes = [cache_versions.teacher_scope(teacher_profile.id)] + [cache_versions.course_scope(c) for c in course_ids]
+    data = cache_versions.cached(
+        f'teacher:updates:{teacher_profile.id}', scopes,
+        lambda: _teacher_updates_payload(teacher_profile), daily=True,
+    )
+    return JsonResponse(data)
 
-    # Core counts
-    courses_qs = Course.objects.filter(teacher=teacher_profile)
-    total_courses = courses_qs.count()
-    total_students = Enrollment.objects.filter(course__teacher=teacher_profile).values('student').distinct().count()
+
+def _teacher_updates_payload(teacher_profile):
+    stats = TeacherStats(teacher_profile)
 
     # Pending assignments (due today or later). Include assignments with no due_date as pending.
     try:
-        from django.db.models import Q
-        pending_tasks = Assignment.objects.filter(course__teacher=teacher_profile).filter(Q(due_date__gte=today) | Q(due_date__isnull=True)).count()
+        pending_tasks = stats.pending_assignments().count()
     except Exception:
         pending_tasks = 0
 
-    # Average attendance across teacher's courses
-    attendance_percentages = []
-    for c in courses_qs:
-        total = Attendance.objects.filter(course=c).count()
-        present = Attendance.objects.filter(course=c, status=True).count()
-        if total > 0:
-            attendance_percentages.append((present / total) * 100)
-
-    avg_attendance = round(sum(attendance_percentages) / len(attendance_percentages), 2) if attendance_percentages else 0.0
-
-    # Recent activity: merge recent submissions, attendance entries and assignments
-    events = []
-    try:
-        subs = Submission.objects.filter(assignment__course__teacher=teacher_profile).select_related('student__user', 'assignment').order_by('-submission_date')[:5]
-        for s in subs:
-            uname = getattr(getattr(s, 'student', None), 'user', None)
-            uname = uname.username if uname else ''
-            events.append({'time': s.submission_date.isoformat(), 'title': f"{uname} submitted {s.assignment.title}", 'detail': ''})
-    except Exception:
-        pass
-
-    try:
-        atts = Attendance.objects.filter(course__teacher=teacher_profile).select_related('student__user', 'course').order_by('-date')[:5]
-        for a in atts:
-            uname = getattr(getattr(a, 'student', None), 'user', None)
-            uname = uname.username if uname else ''
-            events.append({'time': a.date.isoformat(), 'title': f"Attendance recorded for {a.course.code}", 'detail': f"{uname} - {'Present' if a.status else 'Absent'}"})
-    except Exception:
-        pass
-
-    try:
-        assigns = Assignment.objects.filter(course__teacher=teacher_profile).order_by('-created_at')[:5]
-        for asg in assigns:
-            time_iso = asg.created_at.isoformat() if getattr(asg, 'created_at', None) else today.isoformat()
-            events.append({'time': time_iso, 'title': f"Assignment created: {asg.title}", 'detail': f"For {asg.course.code}"})
-    except Exception:
-        pass
-
-    # Sort and limit
-    events_sorted = sorted(events, key=lambda x: x.get('time', ''), reverse=True)[:5]
+    # Recent activity: newest entries of the teacher's activity feed
+    events, _ = activity.feed(teacher_profile, limit=5)
+    events_sorted = [{'time': e.created_at.isoformat(), 'title': e.title, 'detail': e.detail} for e in events]
 
     data = {
-        'total_courses': total_courses,
-        'total_students': total_students,
+        'total_courses': len(stats.courses),
+        'total_students': stats.total_students,
         'pending_tasks': pending_tasks,
-        'avg_attendance': avg_attendance,
+        'avg_attendance': round(stats.avg_attendance, 2),
         'recent_activities': events_sorted,
     }
-
-    return JsonResponse(data)
+    return data
 
 
 
@@ -2362,86 +2397,46 @@ def create_assignment(request):
         except Exception:
             return JsonResponse({'error': 'Invalid due_date format. Use YYYY-MM-DD or a datetime-local value.'}, status=400)
 
-    # Create assignment
+    # Questions JSON: frontend sends a 'questions' field with a JSON array. It is parsed before
+    # anything is written so a malformed quiz is rejected instead of leaving an empty assignment.
+    questions_json = request.POST.get('questions')
+    question_tree = []
+    if questions_json:
+        try:
+            question_tree = assignment_builder.parse_questions(json.loads(questions_json))
+        except ValueError as e:
+            return JsonResponse({'error': f'Invalid questions: {e}'}, status=400)
+
+    # Create assignment, attachments and questions all-or-nothing
     try:
-        a = Assignment.objects.create(
-            course=course,
-            title=title,
-            description=request.POST.get('description', ''),
-            body=request.POST.get('body', '') or request.POST.get('description', ''),
-            due_date=due_date_obj,
-            max_marks=int(max_marks),
-            is_draft=(request.POST.get('is_draft') == 'true')
-        )
+        with transaction.atomic():
+            a = Assignment.objects.create(
+                course=course,
+                title=title,
+                description=request.POST.get('description', ''),
+                body=request.POST.get('body', '') or request.POST.get('description', ''),
+                due_date=due_date_obj,
+                max_marks=int(max_marks),
+                is_draft=(request.POST.get('is_draft') == 'true')
+            )
 
-        # Handle uploaded files (assignment_files input supports multiple)
-        try:
-            files = request.FILES.getlist('assignment_files') or []
-            for f in files:
+            # Handle uploaded files (assignment_files input supports multiple)
+            for f in request.FILES.getlist('assignment_files') or []:
                 AssignmentAttachment.objects.create(assignment=a, file=f, uploaded_by=request.user.profile)
-        except Exception:
-            # Continue even if attachments fail; don't block assignment creation
-            pass
 
-        # If imported_file_url provided (from import-from-url flow), record as a simple attachment placeholder
-        imported = request.POST.get('imported_file_url')
-        if imported:
-            # Keep a lightweight representation by saving as StudyMaterial-like file via remote fetch is out-of-scope here.
-            # Instead, store the URL in the assignment description for teachers/admins to manage later.
-            a.description = (a.description or '') + f"\nImported: {imported}"
-            a.save()
-
-        # Questions JSON parsing: frontend sends a 'questions' field with JSON array
-        questions_json = request.POST.get('questions')
-        if questions_json:
-            try:
-                import json
-                from .models import Question, Option
-
-                qlist = json.loads(questions_json)
-                for qdata in qlist:
-                    try:
-                        q_order = int(qdata.get('order') or 0)
-                    except Exception:
-                        q_order = 0
-                    qtype = qdata.get('type') or 'mcq'
-                    qtext = qdata.get('text') or ''
-                    try:
-                        qpoints = float(qdata.get('points') or 0)
-                    except Exception:
-                        qpoints = 0
-
-                    qobj = Question.objects.create(
-                        assignment=a,
-                        order=q_order,
-                        qtype=qtype,
-                        text=qtext,
-                        points=qpoints
-                    )
-
-                    # Save options for MCQ and True/False
-                    if qtype == 'mcq':
-                        opts = qdata.get('options') or []
-                        try:
-                            correct = int(qdata.get('correct_answer')) if qdata.get('correct_answer') is not None else None
-                        except Exception:
-                            correct = None
-                        for idx, opt_text in enumerate(opts):
-                            Option.objects.create(
-                                question=qobj,
-                                order=idx,
-                                text=opt_text,
-                                is_correct=(correct == idx)
-                            )
-                    elif qtype == 'true_false':
-                        ca = qdata.get('correct_answer')
-                        Option.objects.create(question=qobj, order=0, text='True', is_correct=(ca == 'true' or ca is True))
-                        Option.objects.create(question=qobj, order=1, text='False', is_correct=(ca == 'false' or ca is False))
-            except Exception:
-                # non-fatal: do not block assignment creation on question parsing errors
-                pass
+            # If imported_file_url provided (from import-from-url flow), record as a simple attachment placeholder
+            imported = request.POST.get('imported_file_url')
+            if imported:
+                # Keep a lightweight representation by saving as StudyMaterial-like file via remote fetch is out-of-scope here.
+                # Instead, store the URL in the assignment description for teachers/admins to manage later.
+                a.description = (a.description or '') + f"\nImported: {imported}"
+                a.save()
 
-        return JsonResponse({'success': True, 'assignment_id': a.id})
+            question_count = assignment_builder.save_tree(a, question_tree)
+
+        return JsonResponse({'success': True, 'assignment_id': a.id, 'questions': question_count})
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid assignment: {e}'}, status=400)
     except Exception as e:
         return JsonResponse({'error': f'Error creating assignment: {e}'}, status=500)
 
@@ -2496,10 +2491,64 @@ def assignment_detail(request, assignment_id):
         'submissions': submissions,
         'graded_count': graded_count,
         'avg_score': round(avg_score, 2),
+        # other courses of the same teacher, offered as clone targets
+        'clone_courses': Course.objects.filter(teacher=assignment.course.teacher_id).exclude(id=assignment.course_id).order_by('name'),
     }
     return render(request, 'assignments/assignment_detail.html', context)
 
 
+@login_required
+@require_http_methods(["POST"])
+def autograde_assignment(request, assignment_id):
+    """Auto-grade an assignment's multiple choice submissions now instead of waiting for the due date.
+
+    POST ``regrade=1`` also re-scores submissions that already have marks.
+    """
+    profile = getattr(request.user, 'profile', None)
+    assignment = Assignment.objects.select_related('course').filter(id=assignment_id).first()
+    if assignment is None:
+        return JsonResponse({'error': 'Assignment not found'}, status=404)
+    if not is_admin_role(profile) and assignment.course.teacher_id != getattr(profile, 'id', None):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    result = grading.grade(assignment, regrade=request.POST.get('regrade') in ('1', 'true'))
+    if result['graded'] is None:
+        return JsonResponse({'error': 'Only assignments whose questions are all multiple choice or true/false with a correct option can be auto-graded'}, status=400)
+    return JsonResponse({'success': True, **result})
+
+
+@login_required
+@require_http_methods(["POST"])
+def clone_assignment(request, assignment_id):
+    """Copy an assignment, with its questions and attachments, into other courses of the teacher.
+
+    POST ``course_ids``: repeated field or a comma-separated string. Admins
+    may copy into any course; teachers only into their own.
+    """
+    profile = getattr(request.user, 'profile', None)
+    assignment = Assignment.objects.select_related('course').filter(id=assignment_id).first()
+    if assignment is None:
+        return JsonResponse({'error': 'Assignment not found'}, status=404)
+    if not is_admin_role(profile) and assignment.course.teacher_id != getattr(profile, 'id', None):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    try:
+        course_ids = {int(v) for raw in request.POST.getlist('course_ids') for v in raw.split(',') if v.strip()}
+    except ValueError:
+        return JsonResponse({'error': 'course_ids must be integers'}, status=400)
+    if not course_ids:
+        return JsonResponse({'error': 'Select at least one course'}, status=400)
+    courses = Course.objects.filter(id__in=course_ids).order_by('id')
+    if not is_admin_role(profile):
+        courses = courses.filter(teacher=profile)
+    courses = list(courses)
+    if len(courses) != len(course_ids):
+        return JsonResponse({'error': 'Course not found or access denied'}, status=403)
+
+    copies = assignment_builder.clone(assignment, courses, uploaded_by=profile)
+    return JsonResponse({'success': True, 'assignment_ids': [c.id for c in copies]})
+
+
 @login_required
 def download_assignment_report(request, assignment_id):
     """Download CSV report for an assignment's submissions."""
@@ -2631,31 +2680,17 @@ def generate_course_report(request, course_id):
         end_date = None
 
     # Build CSV in-memory using a text buffer so encoding is correct.
-    import csv
-    import io
-
     si = io.StringIO()
     writer = csv.writer(si)
     # Include contact fields and photo URL so teachers have full details
     writer.writerow(['Username', 'Full name', 'Email', 'Phone', 'Department', 'Photo', 'Avg Marks'])
 
-    enrollments = Enrollment.objects.filter(course=course).select_related('student__user')
-    for e in enrollments:
-        student = e.student  # Profile instance
-        # Average marks for this student in this course (optionally filtered by assignment due_date range)
-        subs_qs = Submission.objects.filter(student=student, assignment__course=course, marks_obtained__isnull=False)
-        if start_date or end_date:
-            assigns = Assignment.objects.filter(course=course)
-            if start_date:
-                assigns = assigns.filter(due_date__gte=start_date)
-            if end_date:
-                assigns = assigns.filter(due_date__lte=end_date)
-            subs_qs = subs_qs.filter(assignment__in=assigns)
-        avg_marks = subs_qs.aggregate(Avg('marks_obtained'))['marks_obtained__avg']
-        avg_marks = round(avg_marks or 0.0, 2)
+    # Average marks per student come from the gradebook (optionally limited by assignment due_date range)
+    for student, _marks, stats in Gradebook(course, start_date, end_date).student_rows():
+        avg_marks = stats['mean'] or 0.0
 
         # Contact fields and photo
-        email = (student.user.email or '') if getattr(student, 'user', None) else ''
+        email = student.user.email or ''
         phone = getattr(student, 'phone', '') or ''
         department = getattr(student, 'department', '') or ''
         photo_url = ''
@@ -2667,8 +2702,8 @@ def generate_course_report(request, course_id):
             except Exception:
                 photo_url = ''
 
-        username = (student.user.username if getattr(student, 'user', None) else '')
-        full_name = (f"{student.user.first_name} {student.user.last_name}".strip() if getattr(student, 'user', None) else '')
+        username = student.user.username
+        full_name = f"{student.user.first_name} {student.user.last_name}".strip()
 
         writer.writerow([username, full_name, email, phone, department, photo_url, avg_marks])
 
@@ -2679,26 +2714,12 @@ def generate_course_report(request, course_id):
 
 
 
-@login_required
-@require_http_methods(["GET"])
-def course_students_json(request, course_id):
-    """
-    Return JSON list of enrolled students for a course.
-    """
-    course, error = check_course_access(request.user, course_id)
-    if error:
-        status_code = 404 if 'not found' in error else 403
-        return JsonResponse({'error': error}, status=status_code)
-
-    cache_key = f'course_{course_id}_students_json'
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return JsonResponse(cached_data)
-
+def _course_students_payload(course):
     enrollments = (Enrollment.objects
                    .filter(course=course)
                    .select_related('student__user')
                    .order_by('student__user__last_name'))
+    summaries = {s.student_id: s for s in StudentCourseSummary.objects.filter(course=course)}
 
     students = []
     for enrollment in enrollments:
@@ -2706,9 +2727,8 @@ def course_students_json(request, course_id):
         user = getattr(student, 'user', None)
         if not user:
             continue
-        avg_marks = (Submission.objects
-                     .filter(student=student, assignment__course=course, marks_obtained__isnull=False)
-                     .aggregate(avg=Avg('marks_obtained'))['avg'])
+        summary = summaries.get(student.id)
+        avg_marks = summary.avg_marks if summary else None
         students.append({
             'id': student.id,
             'username': user.username,
@@ -2716,9 +2736,25 @@ def course_students_json(request, course_id):
             'email': user.email or '',
             'avg_marks': round(avg_marks or 0.0, 2)
         })
+    return {'students': students, 'total': len(students)}
+
 
-    response_data = {'students': students, 'total': len(students)}
-    cache.set(cache_key, response_data, 300)
+@login_required
+@require_http_methods(["GET"])
+def course_students_json(request, course_id):
+    """
+    Return JSON list of enrolled students for a course.
+    """
+    course, error = check_course_access(request.user, course_id)
+    if error:
+        status_code = 404 if 'not found' in error else 403
+        return JsonResponse({'error': error}, status=status_code)
+
+    # Stale as soon as an enrollment, submission or attendance row of the course changes
+    response_data = cache_versions.cached(
+        f'course:students:{course.id}', [cache_versions.course_scope(course.id)],
+        lambda: _course_students_payload(course),
+    )
     return JsonResponse(response_data)
 
 
@@ -2832,33 +2868,13 @@ def generate_assignment_averages(request, course_id):
         messages.error(request, 'Access denied')
         return redirect('role_redirect')
 
-    start = request.GET.get('start')
-    end = request.GET.get('end')
-    assigns = Assignment.objects.filter(course=course).order_by('due_date')
-    if start:
-        try:
-            sdate = date.fromisoformat(start)
-            assigns = assigns.filter(due_date__gte=sdate)
-        except Exception:
-            pass
-    if end:
-        try:
-            edate = date.fromisoformat(end)
-            assigns = assigns.filter(due_date__lte=edate)
-        except Exception:
-            pass
-
-    import csv
-    import io
+    start_date, end_date, _errors = validate_date_range(request.GET.get('start'), request.GET.get('end'))
 
     si = io.StringIO()
     writer = csv.writer(si)
     writer.writerow(['Assignment ID', 'Title', 'Due Date', 'Avg Marks', 'Submission Count'])
-    for a in assigns:
-        stats = Submission.objects.filter(assignment=a, marks_obtained__isnull=False).aggregate(avg=Avg('marks_obtained'), cnt=Count('id'))
-        avg = round(stats['avg'] or 0.0, 2)
-        cnt = stats['cnt'] or 0
-        writer.writerow([a.id, a.title, a.due_date, avg, cnt])
+    for a, stats in Gradebook(course, start_date, end_date).assignment_columns():
+        writer.writerow([a.id, a.title, a.due_date, stats['mean'] or 0.0, stats['graded']])
 
     csv_bytes = si.getvalue().encode('utf-8')
     resp = HttpResponse(csv_bytes, content_type='text/csv; charset=utf-8')
@@ -2866,6 +2882,41 @@ def generate_assignment_averages(request, course_id):
     return resp
 
 
+@login_required
+@require_http_methods(["GET"])
+def course_gradebook(request, course_id):
+    """Students x assignments marks matrix of a course with row and column statistics.
+
+    GET params: ``format`` (``json`` default, ``csv`` streamed, ``xlsx``)
+    and ``start``/``end`` (YYYY-MM-DD) to limit assignments by due date.
+    XLSX needs openpyxl and falls back to CSV without it.
+    """
+    profile = getattr(request.user, 'profile', None)
+    course = Course.objects.filter(id=course_id).first()
+    if course is None:
+        return JsonResponse({'error': 'Course not found'}, status=404)
+    if not is_admin_role(profile) and course.teacher_id != getattr(profile, 'id', None):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+
+    fmt = request.GET.get('format', 'json')
+    if fmt not in ('json', 'csv', 'xlsx'):
+        return JsonResponse({'error': 'format must be json, csv or xlsx'}, status=400)
+    start_date, end_date, errors = validate_date_range(request.GET.get('start'), request.GET.get('end'))
+    if errors:
+        return JsonResponse({'error': ' '.join(errors)}, status=400)
+
+    gradebook = Gradebook(course, start_date, end_date)
+    if fmt == 'json':
+        return JsonResponse(gradebook.as_dict())
+
+    log_report_generation(request.user, f'gradebook_{fmt}', course.id, {'start': request.GET.get('start'), 'end': request.GET.get('end')})
+    if fmt == 'xlsx':
+        response = gradebook.xlsx_response()
+        if response is not None:
+            return response
+    return gradebook.csv_response()
+
+
 @login_required
 def generate_course_report_pdf(request, course_id):
     """Generate a PDF summary for a course: students, contact, avg marks, joined date, attendance."""
@@ -2987,14 +3038,12 @@ def send_message(request):
     except Exception:
         return JsonResponse({'error': 'Course not found or access denied'}, status=404)
 
-    enrollments = Enrollment.objects.filter(course=course).select_related('student__user')
-    sent = 0
-    for e in enrollments:
-        try:
-            Notification.objects.create(user=e.student.user, title=f'Message from {request.user.get_full_name() or request.user.username}', message=message)
-            sent += 1
-        except Exception:
-            continue
+    sent = notification_service.dispatch(
+        notification_service.course_recipients(course, include_teacher=False),
+        f'Message from {request.user.get_full_name() or request.user.username}',
+        message,
+        sender=request.user,
+    )
 
     return JsonResponse({'success': True, 'sent': sent})
 
@@ -3064,6 +3113,18 @@ def student_assignment_detail(request, assignment_id):
     submission = Submission.objects.filter(assignment=assignment, student=profile).first()
 
     if request.method == 'POST':
+        # Chosen options of the multiple choice questions, graded by portal.grading after the due date
+        choices = {}
+        for key, value in request.POST.items():
+            if key.startswith('question_'):
+                try:
+                    choices[int(key[len('question_'):])] = int(value)
+                except ValueError:
+                    continue
+        if submission and grading.answers_locked(submission, choices):
+            messages.error(request, 'Your answers have been graded and can no longer be changed')
+            return redirect('student_assignment_detail', assignment_id=assignment.id)
+
         # Simple text submission stored in the 'feedback' field (model already present).
         submission_text = request.POST.get('submission_text', '').strip()
         submission_file = request.FILES.get('submission_file')
@@ -3076,13 +3137,21 @@ def student_assignment_detail(request, assignment_id):
             submission.save()
             messages.success(request, 'Submission updated')
         else:
-            Submission.objects.create(assignment=assignment, student=profile, text=submission_text, file=submission_file)
+            submission = Submission.objects.create(assignment=assignment, student=profile, text=submission_text, file=submission_file)
             messages.success(request, 'Submitted successfully')
+        if choices:
+            grading.save_answers(submission, choices)
         return redirect('student_assignment_detail', assignment_id=assignment.id)
 
+    questions = list(assignment.questions.prefetch_related('options'))
+    chosen = dict(StudentAnswer.objects.filter(submission=submission).values_list('question_id', 'option_id')) if submission else {}
+    for question in questions:
+        question.chosen_option_id = chosen.get(question.id)
+
     context = {
         'assignment': assignment,
         'submission': submission,
+        'questions': questions,
     }
     return render(request, 'assignments/student_assignment_detail.html', context)
 
@@ -3095,46 +3164,36 @@ def student_dashboard(request):
         return redirect('role_redirect')
     
     student_profile = request.user.profile
-    enrollments = Enrollment.objects.filter(student=student_profile)
-    
-    # attendance and performance summaries
-    total_records = Attendance.objects.filter(student=student_profile).count()
-    present = Attendance.objects.filter(student=student_profile, status=True).count()
-    overall_attendance = (present / total_records * 100) if total_records > 0 else 0
+    stats = StudentStats(student_profile)
+    enrollments = stats.enrollments
     
     # Get live updates
     from .live_updates import get_student_live_updates
     live_updates = get_student_live_updates(student_profile)
 
-    # Get live updates
-    from .live_updates import get_student_live_updates
-    live_updates = get_student_live_updates(student_profile)
-
     # per-course average marks for this student
-    performance_labels = []
-    performance_values = []
-    for e in enrollments:
-        performance_labels.append(e.course.name[:20])
-        avg_marks = Submission.objects.filter(student=student_profile, assignment__course=e.course).aggregate(Avg('marks_obtained'))['marks_obtained__avg']
-        performance_values.append(float(avg_marks) if avg_marks is not None else 0.0)
+    performance_labels = [c.course.name[:20] for c in stats.courses]
+    performance_values = [float(c.avg_marks) if c.avg_marks is not None else 0.0 for c in stats.courses]
 
     # overall average
-    avg_marks_overall = Submission.objects.filter(student=student_profile).aggregate(Avg('marks_obtained'))['marks_obtained__avg']
-    avg_marks_overall = float(avg_marks_overall) if avg_marks_overall is not None else 0.0
+    avg_marks_overall = float(stats.avg_marks) if stats.avg_marks is not None else 0.0
 
-    # Attach materials for each enrollment so student template can show them
+    # Attach materials for each enrollment so student template can show them (one query)
+    enrolled_course_ids = [e.course_id for e in enrollments]
+    materials_by_course = {}
+    for m in StudyMaterial.objects.filter(course_id__in=enrolled_course_ids).order_by('-uploaded_at'):
+        materials_by_course.setdefault(m.course_id, []).append(m)
     for e in enrollments:
-        e.materials = StudyMaterial.objects.filter(course=e.course).order_by('-uploaded_at')
+        e.materials = materials_by_course.get(e.course_id, [])
 
     # Get latest materials across all enrolled courses
-    enrolled_courses = [e.course for e in enrollments]
-    latest_materials = StudyMaterial.objects.filter(course__in=enrolled_courses).order_by('-uploaded_at')[:5]
+    latest_materials = StudyMaterial.objects.filter(course_id__in=enrolled_course_ids).order_by('-uploaded_at')[:5]
 
     context = {
         'enrollments': enrollments,
-        'total_courses': enrollments.count(),
-        'overall_attendance': round(overall_attendance, 2),
-        'attendance_total': total_records,
+        'total_courses': len(enrollments),
+        'overall_attendance': round(stats.attendance_percentage, 2),
+        'attendance_total': stats.attendance_total,
         'avg_marks_overall': round(avg_marks_overall, 2),
         'performance_labels': performance_labels,
         'performance_values': performance_values,
@@ -3175,33 +3234,10 @@ def upload_material(request, course_id):
             messages.error(request, 'Title and file are required')
             return redirect('upload_material', course_id=course_id)
 
-        # Validate file type and size
-        # Allowed: PDF, Word (.doc/.docx), images (PNG/JPG) and common video types
-        allowed = (
-            'application/pdf',
-            'application/msword',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'image/png',
-            'image/jpeg',
-            'image/jpg',
-            # include some common video content-types for completeness
-            'video/mp4',
-            'video/quicktime',
-            'video/webm'
-        )
-        ctype = getattr(file, 'content_type', '').lower()
-        # Videos get a larger size cap
-        if ctype.startswith('video/'):
-            max_bytes = 500 * 1024 * 1024
-        else:
-            max_bytes = 50 * 1024 * 1024
-
-        if not (ctype in allowed or ctype.startswith('video/')):
-            messages.error(request, 'Only PDF, Word, image, and video files are allowed (PDF, DOC/DOCX, PNG, JPG, MP4, etc.)')
-            return redirect('upload_material', course_id=course_id)
-
-        if getattr(file, 'size', 0) > max_bytes:
-            messages.error(request, 'File too large (max 50MB for documents/images, 500MB for videos)')
+        # Validate file type and size (PDF, Word, PNG/JPG and video; videos get a larger cap)
+        error = chunked_upload.check_file('material', getattr(file, 'content_type', ''), getattr(file, 'size', 0))
+        if error:
+            messages.error(request, error)
             return redirect('upload_material', course_id=course_id)
 
         StudyMaterial.objects.create(course=course, uploaded_by=request.user.profile, title=title, description=description, file=file)
@@ -3211,6 +3247,96 @@ def upload_material(request, course_id):
     return render(request, 'materials/upload_material.html', {'course': course})
 
 
+def _upload_error(e):
+    payload = {'error': str(e)}
+    if e.offset is not None:
+        payload['offset'] = e.offset
+    return JsonResponse(payload, status=e.status)
+
+
+@login_required
+@require_http_methods(["POST"])
+def start_upload(request):
+    """Open a resumable chunked upload (see portal.chunked_upload).
+
+    Body: ``{"purpose": "material"|"submission"|"attachment", "target_id": id,
+    "filename": ..., "content_type": ..., "size": bytes}``; the target is a
+    course for materials and an assignment otherwise. The type, size and
+    access are checked here, before any file data is sent.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise TypeError('body must be an object')
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    try:
+        session = chunked_upload.start(request.user, data.get('purpose'), data.get('target_id'),
+                                       data.get('filename'), data.get('content_type'), data.get('size'))
+    except chunked_upload.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse({
+        'upload_id': str(session.id), 'offset': 0, 'size': session.size, 'chunk_size': chunked_upload.CHUNK_SIZE,
+    }, status=201)
+
+
+@login_required
+@require_http_methods(["GET", "PUT", "DELETE"])
+def upload_session(request, upload_id):
+    """GET the offset to resume from, PUT the next chunk, or DELETE to abort.
+
+    A chunk is the raw request body, with headers ``Upload-Offset`` (where
+    it starts) and ``Upload-Checksum`` (``sha256 <hex digest>``).
+    """
+    session = UploadSession.objects.filter(id=upload_id, owner=request.user).first()
+    if session is None:
+        return JsonResponse({'error': 'Upload not found'}, status=404)
+    if request.method == 'DELETE':
+        chunked_upload.discard(session)
+        return JsonResponse({'success': True})
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset and Content-Length are required'}, status=400)
+        algorithm, _, checksum = request.headers.get('Upload-Checksum', '').partition(' ')
+        if algorithm.lower() != 'sha256' or not checksum:
+            return JsonResponse({'error': 'Upload-Checksum must be "sha256 <hex digest>"'}, status=400)
+        try:
+            # read straight from the request stream; request.body would buffer the chunk
+            chunked_upload.append(session, offset, length, checksum, request)
+        except chunked_upload.UploadError as e:
+            return _upload_error(e)
+        session.refresh_from_db()
+    return JsonResponse({'upload_id': str(session.id), 'offset': session.offset, 'size': session.size})
+
+
+@login_required
+@require_http_methods(["POST"])
+def complete_upload(request, upload_id):
+    """Turn a fully received upload into its StudyMaterial, Submission or AssignmentAttachment.
+
+    Body: ``{"title": ..., "description": ...}`` for materials,
+    ``{"text": ...}`` (optional) for submissions.
+    """
+    session = UploadSession.objects.filter(id=upload_id, owner=request.user).first()
+    if session is None:
+        return JsonResponse({'error': 'Upload not found'}, status=404)
+    try:
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise TypeError('body must be an object')
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    try:
+        obj = chunked_upload.finish(session, request.user.profile, title=(data.get('title') or '').strip(),
+                                    description=data.get('description') or '', text=(data.get('text') or '').strip())
+    except chunked_upload.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse({'success': True, 'purpose': session.purpose, 'id': obj.id, 'url': obj.file.url})
+
+
 @login_required
 def teacher_manage_materials(request, course_id):
     """One-page teacher materials management: upload, list, and delete for their course."""
@@ -3233,30 +3359,10 @@ def teacher_manage_materials(request, course_id):
             messages.error(request, 'Title and file are required')
             return redirect('manage_materials', course_id=course_id)
 
-        # Validate file type and size
-        allowed = (
-            'application/pdf',
-            'application/msword',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'image/png',
-            'image/jpeg',
-            'image/jpg',
-            'video/mp4',
-            'video/quicktime',
-            'video/webm'
-        )
-        ctype = getattr(file, 'content_type', '').lower()
-        if ctype.startswith('video/'):
-            max_bytes = 500 * 1024 * 1024
-        else:
-            max_bytes = 50 * 1024 * 1024
-
-        if not (ctype in allowed or ctype.startswith('video/')):
-            messages.error(request, 'Only PDF, Word, image, and video files are allowed (PDF, DOC/DOCX, PNG, JPG, MP4, etc.)')
-            return redirect('manage_materials', course_id=course_id)
-
-        if getattr(file, 'size', 0) > max_bytes:
-            messages.error(request, 'File too large (max 50MB for documents/images, 500MB for videos)')
+        # Validate file type and size (PDF, Word, PNG/JPG and video; videos get a larger cap)
+        error = chunked_upload.check_file('material', getattr(file, 'content_type', ''), getattr(file, 'size', 0))
+        if error:
+            messages.error(request, error)
             return redirect('manage_materials', course_id=course_id)
 
         StudyMaterial.objects.create(course=course, uploaded_by=request.user.profile, title=title, description=description, file=file)
@@ -3318,30 +3424,10 @@ def admin_upload_material(request, course_id):
             messages.error(request, 'Title and file are required')
             return redirect('admin_upload_material', course_id=course_id)
 
-        # Validate file type and size
-        allowed = (
-            'application/pdf',
-            'application/msword',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'image/png',
-            'image/jpeg',
-            'image/jpg',
-            'video/mp4',
-            'video/quicktime',
-            'video/webm'
-        )
-        ctype = getattr(file, 'content_type', '').lower()
-        if ctype.startswith('video/'):
-            max_bytes = 500 * 1024 * 1024
-        else:
-            max_bytes = 50 * 1024 * 1024
-
-        if not (ctype in allowed or ctype.startswith('video/')):
-            messages.error(request, 'Only PDF, Word, image, and video files are allowed (PDF, DOC/DOCX, PNG, JPG, MP4, etc.)')
-            return redirect('admin_upload_material', course_id=course_id)
-
-        if getattr(file, 'size', 0) > max_bytes:
-            messages.error(request, 'File too large (max 50MB for documents/images, 500MB for videos)')
+        # Validate file type and size (PDF, Word, PNG/JPG and video; videos get a larger cap)
+        error = chunked_upload.check_file('material', getattr(file, 'content_type', ''), getattr(file, 'size', 0))
+        if error:
+            messages.error(request, error)
             return redirect('admin_upload_material', course_id=course_id)
 
         StudyMaterial.objects.create(course=course, uploaded_by=request.user.profile, title=title, description=description, file=file)
@@ -3385,14 +3471,15 @@ def download_material(request, material_id):
             messages.error(request, 'Access denied')
             return redirect('role_redirect')
 
-    response = HttpResponse(material.file, content_type='application/octet-stream')
-    response['Content-Disposition'] = f'attachment; filename="{material.file.name.split("/")[-1]}"'
-    return response
+    try:
+        return file_serving.serve(request, material.file)
+    except FileNotFoundError:
+        raise Http404('Material file is missing')
 
 
 @login_required
 def view_material(request, material_id):
-    """Serve material inline for PDFs (so the browser will render it) or fall back to attachment.
+    """Serve material inline for PDFs, images and video (so the browser will render it) or fall back to attachment.
 
     Students must be enrolled to view materials for their course.
     """
@@ -3408,18 +3495,11 @@ def view_material(request, material_id):
             messages.error(request, 'Access denied')
             return redirect('role_redirect')
 
-    # Determine if file is a PDF by extension
-    name = material.file.name.lower()
-    if name.endswith('.pdf'):
-        content_type = 'application/pdf'
-        disposition = 'inline'
-    else:
-        content_type = 'application/octet-stream'
-        disposition = 'attachment'
-
-    response = HttpResponse(material.file, content_type=content_type)
-    response['Content-Disposition'] = f'{disposition}; filename="{material.file.name.split("/")[-1]}"'
-    return response
+    # Inline only for the safe types of file_serving.INLINE_TYPES (PDF, raster images, video, audio); ranges let videos seek
+    try:
+        return file_serving.serve(request, material.file, inline=True)
+    except FileNotFoundError:
+        raise Http404('Material file is missing')
 
 
 @login_required
@@ -3,9 +3,10 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.files.storage import default_storage
-from django.db.models import Avg, Count
-from .models import Profile, Enrollment, Attendance, Submission, Course
+from .models import Profile
 from django.utils.text import slugify
+from .student_stats import StudentStats
+from .teacher_stats import TeacherStats
 import os
 
 @login_required
@@ -42,65 +43,39 @@ def view_profile(request, username=None):
 
     if profile.role == 'student':
         # Get student-specific stats
-        enrollments = Enrollment.objects.filter(student=profile)
-        
-        # Attendance stats
-        total_attendance = Attendance.objects.filter(student=profile).count()
-        present = Attendance.objects.filter(student=profile, status=True).count()
-        attendance_rate = (present / total_attendance * 100) if total_attendance > 0 else 0
-        
-        # Academic performance
-        submissions = Submission.objects.filter(student=profile)
-        avg_marks = submissions.aggregate(Avg('marks_obtained'))['marks_obtained__avg'] or 0
+        stats = StudentStats(profile)
         
         # Course performance breakdown
-        course_performance = []
-        for enrollment in enrollments:
-            course_submissions = submissions.filter(assignment__course=enrollment.course)
-            course_avg = course_submissions.aggregate(Avg('marks_obtained'))['marks_obtained__avg'] or 0
-            course_attendance = Attendance.objects.filter(student=profile, course=enrollment.course)
-            course_attendance_rate = (course_attendance.filter(status=True).count() / course_attendance.count() * 100) if course_attendance.exists() else 0
-            
-            course_performance.append({
-                'course': enrollment.course,
-                'avg_marks': round(course_avg, 2),
-                'attendance': round(course_attendance_rate, 2)
-            })
+        course_performance = [{
+            'course': c.course,
+            'avg_marks': round(c.avg_marks or 0, 2),
+            'attendance': round(c.percentage, 2)
+        } for c in stats.courses]
 
         context.update({
             'student_class': getattr(profile, 'student_class', ''),
             'roll_number': getattr(profile, 'roll_number', ''),
-            'attendance_rate': round(attendance_rate, 2),
-            'avg_marks': round(avg_marks, 2),
-            'total_courses': enrollments.count(),
+            'attendance_rate': round(stats.attendance_percentage, 2),
+            'avg_marks': round(stats.avg_marks or 0, 2),
+            'total_courses': len(stats.courses),
             'course_performance': course_performance
         })
 
     elif profile.role == 'teacher':
         # Get teacher-specific stats
-        courses = Course.objects.filter(teacher=profile)
-        total_students = Enrollment.objects.filter(course__teacher=profile).values('student').distinct().count()
-        
+        stats = TeacherStats(profile)
+
         # Teaching stats
-        course_stats = []
-        for course in courses:
-            enrollments = Enrollment.objects.filter(course=course)
-            attendance = Attendance.objects.filter(course=course)
-            attendance_rate = (attendance.filter(status=True).count() / attendance.count() * 100) if attendance.exists() else 0
-            
-            submissions = Submission.objects.filter(assignment__course=course)
-            avg_marks = submissions.aggregate(Avg('marks_obtained'))['marks_obtained__avg'] or 0
-            
-            course_stats.append({
-                'course': course,
-                'students': enrollments.count(),
-                'attendance_rate': round(attendance_rate, 2),
-                'avg_marks': round(avg_marks, 2)
-            })
+        course_stats = [{
+            'course': c.course,
+            'students': c.student_count,
+            'attendance_rate': round(c.attendance_percentage, 2),
+            'avg_marks': round(c.avg_marks or 0, 2)
+        } for c in stats.courses]
 
         context.update({
-            'total_courses': courses.count(),
-            'total_students': total_students,
+            'total_courses': len(stats.courses),
+            'total_students': stats.total_students,
             'course_stats': course_stats
         })
 
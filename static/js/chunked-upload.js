@@ -0,0 +1,111 @@
+// Resumable chunked uploads (server side: portal/chunked_upload.py)
+//
+//   const result = await ChunkedUpload.upload(file, {
+//       purpose: 'material', targetId: courseId, csrfToken: token,
+//       fields: {title: '...', description: '...'},
+//       onProgress: (sent, total) => {...},
+//   });
+//
+// The upload id is kept in localStorage per file, so retrying the same file
+// after a dropped connection or a page reload resumes from the server's offset.
+const ChunkedUpload = (function () {
+    const RETRIES = 5;
+
+    function storageKey(file, purpose, targetId) {
+        return `chunked-upload:${purpose}:${targetId}:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    async function sha256Hex(buffer) {
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function request(url, options, csrfToken) {
+        const headers = Object.assign({'X-CSRFToken': csrfToken}, options.headers || {});
+        const response = await fetch(url, Object.assign({}, options, {headers: headers, credentials: 'same-origin'}));
+        const data = await response.json().catch(() => ({}));
+        return {status: response.status, data: data};
+    }
+
+    async function open(file, opts) {
+        const key = storageKey(file, opts.purpose, opts.targetId);
+        const saved = localStorage.getItem(key);
+        if (saved) {
+            const resumed = await request(`/uploads/${saved}/`, {method: 'GET'}, opts.csrfToken);
+            if (resumed.status === 200) {
+                return {id: saved, offset: resumed.data.offset, chunkSize: opts.chunkSize || 8 * 1024 * 1024, key: key};
+            }
+            localStorage.removeItem(key);
+        }
+        const started = await request('/uploads/', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                purpose: opts.purpose, target_id: opts.targetId, filename: file.name,
+                content_type: file.type || 'application/octet-stream', size: file.size,
+            }),
+        }, opts.csrfToken);
+        if (started.status !== 201) {
+            throw new Error(started.data.error || 'Upload refused');
+        }
+        localStorage.setItem(key, started.data.upload_id);
+        return {id: started.data.upload_id, offset: 0, chunkSize: opts.chunkSize || started.data.chunk_size, key: key};
+    }
+
+    async function upload(file, opts) {
+        const session = await open(file, opts);
+        let offset = session.offset;
+        let failures = 0;
+        while (offset < file.size) {
+            const chunk = await file.slice(offset, offset + session.chunkSize).arrayBuffer();
+            let result;
+            try {
+                result = await request(`/uploads/${session.id}/`, {
+                    method: 'PUT',
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'Upload-Offset': String(offset),
+                        'Upload-Checksum': 'sha256 ' + await sha256Hex(chunk),
+                    },
+                    body: chunk,
+                }, opts.csrfToken);
+            } catch (networkError) {
+                result = {status: 0, data: {}};
+            }
+            if (result.status === 200) {
+                offset = result.data.offset;
+                failures = 0;
+                if (opts.onProgress) opts.onProgress(offset, file.size);
+                continue;
+            }
+            // 409 carries the server's offset; network errors and checksum mismatches are retried
+            if (typeof result.data.offset === 'number') {
+                offset = result.data.offset;
+            }
+            if (result.status >= 400 && result.status < 500 && result.status !== 409 && result.status !== 422) {
+                localStorage.removeItem(session.key);
+                throw new Error(result.data.error || 'Upload refused');
+            }
+            if (++failures > RETRIES) {
+                throw new Error('Upload interrupted; try again to resume');
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+        }
+        const done = await request(`/uploads/${session.id}/complete/`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(opts.fields || {}),
+        }, opts.csrfToken);
+        if (done.status !== 200) {
+            throw new Error(done.data.error || 'Upload could not be completed');
+        }
+        localStorage.removeItem(session.key);
+        return done.data;
+    }
+
+    function supported() {
+        return !!(window.fetch && window.crypto && crypto.subtle && window.localStorage && Blob.prototype.arrayBuffer);
+    }
+
+    return {upload: upload, supported: supported};
+})();
@@ -0,0 +1,68 @@
+// Notification push over WebSocket with a polling fallback.
+//
+// connectNotificationSocket({
+//     onNotification: fn(notification),   // called for every pushed notification:
+//                                          // {id, message_id, title, message, created_at}; id is
+//                                          // the delivery the mark-read and delete endpoints take
+//     onUnread: fn(count),                 // called with the unread count on connect
+//     poll: fn(),                          // fallback refresh when no socket is available
+//     pollInterval: 30000,
+// });
+function connectNotificationSocket(options) {
+    const opts = Object.assign({ pollInterval: 30000 }, options);
+    let pollTimer = null;
+    let retries = 0;
+
+    function startPolling() {
+        if (pollTimer || !opts.poll) return;
+        pollTimer = setInterval(opts.poll, opts.pollInterval);
+    }
+
+    function stopPolling() {
+        if (pollTimer) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    }
+
+    function open() {
+        if (!('WebSocket' in window)) {
+            startPolling();
+            return;
+        }
+
+        const scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        let socket;
+        try {
+            socket = new WebSocket(scheme + window.location.host + '/ws/notifications/');
+        } catch (e) {
+            startPolling();
+            return;
+        }
+
+        socket.onopen = function () {
+            retries = 0;
+            stopPolling();
+        };
+
+        socket.onmessage = function (event) {
+            const data = JSON.parse(event.data);
+            if (data.type === 'notification' && opts.onNotification) {
+                opts.onNotification(data.notification);
+            } else if (data.type === 'unread' && opts.onUnread) {
+                opts.onUnread(data.unread_count);
+            }
+        };
+
+        socket.onclose = function () {
+            // Poll while disconnected and retry the socket with backoff.
+            startPolling();
+            retries += 1;
+            if (retries <= 5) {
+                setTimeout(open, Math.min(30000, 1000 * Math.pow(2, retries)));
+            }
+        };
+    }
+
+    open();
+}
@@ -10,6 +10,7 @@ django.setup()
 from django.test import Client
 from django.contrib.auth.models import User
 from portal.models import Profile, Notification
+from portal.notification_service import notify
 import json
 
 print("=" * 60)
@@ -34,14 +35,10 @@ except Exception as e:
 
 # Create test notifications
 for i in range(3):
-    notif, created = Notification.objects.get_or_create(
-        user=user,
-        title=f"📅 Schedule: Test Schedule {i+1}",
-        message=f"Test notification message {i+1}",
-        is_read=False if i < 2 else True
-    )
-    if created:
-        print(f"✓ Notification {i+1} created")
+    notif = notify(user, f"📅 Schedule: Test Schedule {i+1}", f"Test notification message {i+1}")
+    if i >= 2:
+        Notification.objects.filter(pk=notif.pk).update(is_read=True)
+    print(f"✓ Notification {i+1} created")
 
 # Test API endpoint
 client = Client()
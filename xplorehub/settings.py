@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'channels',
     'portal', 
 ]
 
@@ -47,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'portal.middleware.StudyActivityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,6 +74,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'xplorehub.wsgi.application'
+ASGI_APPLICATION = 'xplorehub.asgi.application'
 
 
 # Database
@@ -107,6 +110,43 @@ DATABASES = {
     }
 }
 
+# Cache
+# Unread notification counters live here. The local-memory default is per
+# process, so set REDIS_URL when running more than one worker. The study
+# activity buffer (portal.study_activity) is only written with a shared cache,
+# since flush_study_activity runs in a process of its own.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Channel layer for WebSocket notification push. The in-memory layer only
+# reaches sockets served by the same process.
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -151,6 +191,14 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Partial files of resumable chunked uploads (portal.chunked_upload). Keep it on the
+# same filesystem as MEDIA_ROOT so a finished upload is moved into place, not copied.
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'upload_sessions'
+# Protected file downloads (portal.file_serving): '' streams from Django; 'x-accel'
+# (nginx, with an internal location at FILE_SERVING_ACCEL_PREFIX aliased to
+# MEDIA_ROOT) or 'x-sendfile' let the front proxy send the bytes.
+FILE_SERVING_OFFLOAD = os.environ.get('FILE_SERVING_OFFLOAD', '')
+FILE_SERVING_ACCEL_PREFIX = os.environ.get('FILE_SERVING_ACCEL_PREFIX', '/protected-media/')
 
 # Authentication redirects
 LOGIN_REDIRECT_URL = 'role_redirect'